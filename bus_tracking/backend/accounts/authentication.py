@@ -0,0 +1,122 @@
+"""
+Cached authentication for high-frequency polling.
+
+Live maps, the notification badge and the driver ping path hit the API every
+few seconds. Resolving the token or session and loading the user costs one or
+two queries per request, so resolved users are kept in a short-lived
+in-process cache.
+
+Logout, token deletion and every save of the user row (password, role,
+approval or active flag changes) record the time in Django's cache
+(``CACHES['default']``, shared by the worker processes). An entry loaded
+before that time is dropped by whichever worker holds it, which then runs
+Django's full checks again, session hash included. A hit costs one cache
+read and no queries. Session entries also keep the session's expiry date
+and are not served past it.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import TTLCache
+
+auth_cache = TTLCache(
+    max_entries=getattr(settings, 'AUTH_CACHE_MAX_ENTRIES', 2048),
+    ttl=getattr(settings, 'AUTH_CACHE_TTL', 30),
+)
+
+
+def _invalidated_key(user_id):
+    return f'auth-invalidated:{user_id}'
+
+
+def evict_user(user_id):
+    """Drop every cached token and session entry for a user, in every worker."""
+    auth_cache.evict_owner(user_id)
+
+    def mark():
+        # Outlives every entry loaded before it, so expiring loses nothing
+        cache.set(_invalidated_key(user_id), time.time(), auth_cache.ttl * 2)
+    # Once committed, so that a worker reloading the user sees the change
+    transaction.on_commit(mark)
+
+
+def _cached(key):
+    entry = auth_cache.get(key)
+    if entry is None:
+        return None
+    value, user_id, loaded_at, expires_at = entry
+    invalidated_at = cache.get(_invalidated_key(user_id))
+    if (invalidated_at is not None and invalidated_at >= loaded_at) or \
+            (expires_at is not None and expires_at <= timezone.now()):
+        auth_cache.delete(key)
+        return None
+    return value
+
+
+def _session_expiry(session):
+    """When ``session`` expires, as stored by the session backend."""
+    if hasattr(session, 'get_model_class'):
+        # Database-backed: the stored date, not one counted from now
+        stored = (session.get_model_class().objects
+                  .filter(session_key=session.session_key)
+                  .values_list('expire_date', flat=True).first())
+        if stored is not None:
+            return stored
+    return session.get_expiry_date()
+
+
+def evict_session(session_key):
+    if session_key:
+        auth_cache.delete(('session', session_key))
+
+
+def evict_token(key):
+    auth_cache.delete(('token', key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that remembers token -> user between requests."""
+
+    def authenticate_credentials(self, key):
+        cached = _cached(('token', key))
+        if cached is None:
+            loaded_at = time.time()
+            user, token = super().authenticate_credentials(key)
+            auth_cache.set(('token', key), ((user, token), user.pk, loaded_at, None), owner=user.pk)
+        else:
+            user, token = cached
+        # Hand out copies so views mutating request.user never touch the cache.
+        return copy.copy(user), copy.copy(token)
+
+
+def get_cached_user(request):
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        user = _cached(('session', session_key))
+        if user is not None:
+            return copy.copy(user)
+
+    loaded_at = time.time()
+    user = auth.get_user(request)
+    if session_key and user.is_authenticated:
+        entry = (user, user.pk, loaded_at, _session_expiry(request.session))
+        auth_cache.set(('session', session_key), entry, owner=user.pk)
+        user = copy.copy(user)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that resolves session -> user from the cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_user_address_user_nid_number"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="users_created_951310_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["role", "-created_at", "-id"], name="users_role_f92a3e_idx"
+            ),
+        ),
+    ]
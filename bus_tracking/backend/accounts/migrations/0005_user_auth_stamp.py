@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_user_users_created_951310_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="auth_stamp",
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
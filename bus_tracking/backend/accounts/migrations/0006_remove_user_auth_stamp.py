@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-19 14:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_user_auth_stamp"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="user",
+            name="auth_stamp",
+        ),
+    ]
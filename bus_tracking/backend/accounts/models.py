@@ -35,6 +35,10 @@ class User(AbstractUser):
     class Meta:
         db_table = 'users'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['role', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
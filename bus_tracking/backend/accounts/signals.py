@@ -0,0 +1,29 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import evict_user, evict_session, evict_token
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    """Password, role, approval and active changes all go through User.save()."""
+    # Logging in only touches last_login and leaves the other sessions valid
+    if update_fields is None or not set(update_fields) <= {'last_login'}:
+        evict_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    evict_token(instance.key)
+    evict_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def invalidate_cached_session(sender, request, user, **kwargs):
+    evict_session(request.session.session_key)
+    if user is not None:
+        evict_user(user.pk)
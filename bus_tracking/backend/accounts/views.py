@@ -7,6 +7,7 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from .forms import LoginForm, UserRegistrationForm, UserProfileForm
 from .models import User
+from core.pagination import keyset_paginate
 from buses.models import Bus, BusAssignment
 from schedules.models import Route, Schedule
 from issues.models import Issue
@@ -104,7 +105,7 @@ def user_list(request):
         messages.error(request, 'Access denied.')
         return redirect('accounts:dashboard')
     
-    users = User.objects.all().order_by('-created_at')
+    users = User.objects.all()
     
     # Filter by role
     role_filter = request.GET.get('role', '')
@@ -119,7 +120,7 @@ def user_list(request):
         users = users.filter(is_active=False)
     
     context = {
-        'users': users,
+        'users': keyset_paginate(request, users, per_page=25),
         'current_role': role_filter,
         'current_status': status_filter,
     }
@@ -261,8 +262,10 @@ def driver_list(request):
         messages.error(request, 'Access denied.')
         return redirect('accounts:dashboard')
     
-    drivers = User.objects.filter(role='driver').order_by('-created_at')
-    return render(request, 'accounts/driver_list.html', {'drivers': drivers})
+    drivers = User.objects.filter(role='driver')
+    return render(request, 'accounts/driver_list.html', {
+        'drivers': keyset_paginate(request, drivers, per_page=24)
+    })
 
 
 @login_required
@@ -10,6 +10,8 @@ class BusAdmin(admin.ModelAdmin):
 @admin.register(BusLocation)
 class BusLocationAdmin(admin.ModelAdmin):
     list_display = ('bus', 'latitude', 'longitude', 'speed', 'timestamp')
+    # Telemetry (core.routers): related rows are not joined
+    list_select_related = ()
     list_filter = ('bus', 'is_accurate')
     date_hierarchy = 'timestamp'
 
@@ -22,4 +24,6 @@ class BusAssignmentAdmin(admin.ModelAdmin):
 @admin.register(ETACalculation)
 class ETACalculationAdmin(admin.ModelAdmin):
     list_display = ('bus', 'stop', 'calculated_eta', 'is_delayed', 'delay_minutes')
+    # Telemetry (core.routers): related rows are not joined
+    list_select_related = ()
     list_filter = ('is_delayed',)
@@ -1,32 +1,127 @@
+import threading
+
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import Max, OuterRef, Subquery
 from django.utils import timezone
+from core.fieldsets import requested_fields, wants_compact, sparse_only
+from core.livefeed import KMH_TO_CMS, live_feed_response
+from core.mappers import RowMapper
+from core.renderers import LIVE_FEED_RENDERERS
+from core.routers import same_database, values_across
+from core.spatial import parse_nearby_params
+from core.upsert import bulk_upsert
+from locations.ingest import BUS_PIPELINE, IngestError, Ping
+from .bus_index import bus_index
 from .models import Bus, BusLocation, BusAssignment, ETACalculation
-from .serializers import BusSerializer, BusLocationSerializer, BusMapDataSerializer
+from .serializers import BusSerializer, BusLocationSerializer
+
+BUS_LOCATION_ROW = RowMapper(
+    ('id', 'bus_id'),
+    ('bus_number', 'bus__bus_number'),
+    ('latitude', 'latitude', float),
+    ('longitude', 'longitude', float),
+    ('route_name', ('bus__current_route__name',), lambda name: name or 'No Route'),
+    ('eta', (), lambda: 'Calculating...'),
+    ('speed', 'speed', float),
+    ('heading', 'heading', float),
+)
+
+
+class LatestLocationIds:
+    """
+    Id of the latest BusLocation of each bus, for when the locations are in
+    the telemetry database and cannot be joined to buses. Like the bus index
+    it follows the table by id: one grouped query per call folds in the rows
+    added since the call before last (the overlap catches rows committed out
+    of id order), so only a process's first call reads the whole table.
+    """
+
+    def __init__(self):
+        self._latest = {}
+        self._since = self._top = None
+        self._lock = threading.Lock()
+
+    def get(self, bus_ids):
+        with self._lock:
+            locations = BusLocation.objects.all()
+            if self._since is not None:
+                locations = locations.filter(id__gt=self._since)
+            rows = locations.order_by().values_list('bus_id').annotate(latest=Max('id'))
+            top = self._top or 0
+            for bus_id, latest in rows:
+                self._latest[bus_id] = max(latest, self._latest.get(bus_id, 0))
+                top = max(top, latest)
+            self._since, self._top = self._top or top, top
+            return [self._latest[bus_id] for bus_id in bus_ids if bus_id in self._latest]
+
+
+latest_location_ids = LatestLocationIds()
+
+
+def latest_bus_locations(columns):
+    """
+    ``columns`` (see ``values_across``) of the latest BusLocation of every
+    active bus, ordered by bus number.
+    """
+    buses = list(Bus.objects.filter(is_active=True).order_by('bus_number').values_list('id', flat=True))
+    if same_database(Bus, BusLocation):
+        latest = BusLocation.objects.order_by('-timestamp').values_list('id', flat=True)
+        latest_ids = Bus.objects.filter(is_active=True).values(
+            loc_id=Subquery(latest.filter(bus=OuterRef('pk'))[:1])
+        )
+    else:
+        # Locations are in the telemetry database, out of reach of a correlated subquery
+        latest_ids = latest_location_ids.get(buses)
+    order = {bus_id: position for position, bus_id in enumerate(buses)}
+    rows = values_across(BusLocation.objects.filter(id__in=latest_ids), ('bus_id', *columns))
+    rows.sort(key=lambda row: order[row[0]])
+    return [row[1:] for row in rows]
+
+
+def bus_feed_version():
+    """Changes whenever a location is recorded or a bus is edited."""
+    return (
+        BusLocation.objects.aggregate(latest=Max('id'))['latest'],
+        Bus.objects.aggregate(updated=Max('updated_at'))['updated'],
+    )
+
 
 @api_view(['GET'])
+@renderer_classes(LIVE_FEED_RENDERERS)
 @permission_classes([IsAuthenticated])
 def bus_locations(request):
-    buses = Bus.objects.filter(is_active=True).select_related('current_route')
-    data = []
+    mapper = BUS_LOCATION_ROW.select(requested_fields(request))
     
-    for bus in buses:
-        location = bus.latest_location
-        if location:
-            data.append({
-                'id': bus.id,
-                'bus_number': bus.bus_number,
-                'latitude': location.latitude,
-                'longitude': location.longitude,
-                'route_name': bus.current_route.name if bus.current_route else 'No Route',
-                'eta': 'Calculating...',
-                'speed': location.speed
-            })
+    def build_data():
+        rows = latest_bus_locations(mapper.columns)
+        if wants_compact(request):
+            return mapper.map_compact(rows)
+        return mapper.map_all(rows)
     
-    serializer = BusMapDataSerializer(data, many=True)
-    return Response(serializer.data)
+    def build_positions():
+        rows = latest_bus_locations(('bus_id', 'latitude', 'longitude', 'heading', 'speed', 'timestamp'))
+        return rows, KMH_TO_CMS
+    
+    return live_feed_response(request, 'bus_locations', bus_feed_version, build_data, build_positions)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def nearby_buses(request):
+    """The ``k`` closest live buses within ``radius`` km of ``lat``/``lng``."""
+    try:
+        lat, lng, k, radius = parse_nearby_params(request)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response([
+        {**bus, 'distance_km': round(distance, 3)}
+        for distance, bus in bus_index.nearest(lat, lng, k, radius)
+    ])
 
 
 @api_view(['POST'])
@@ -36,29 +131,20 @@ def update_location(request):
         return Response({'error': 'Only drivers can update location'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        assignment = BusAssignment.objects.get(driver=request.user, is_active=True)
-    except BusAssignment.DoesNotExist:
-        return Response({'error': 'No active assignment'}, status=status.HTTP_404_NOT_FOUND)
-    
-    lat = request.data.get('latitude')
-    lng = request.data.get('longitude')
-    spd = request.data.get('speed')
-    heading = request.data.get('heading')
-    
-    if not lat or not lng:
-        return Response({'error': 'Latitude and longitude required'}, status=status.HTTP_400_BAD_REQUEST)
+        ping = BUS_PIPELINE.run(Ping(request.user, request.data))
+    except IngestError as exc:
+        return Response(exc.detail, status=exc.status)
     
-    location = BusLocation.objects.create(
-        bus=assignment.bus,
-        latitude=lat,
-        longitude=lng,
-        speed=spd,
-        heading=heading
-    )
-    
-    update_etas_for_bus(assignment.bus, assignment.route)
-    
-    return Response({'status': 'Location updated', 'timestamp': location.timestamp})
+    if ping is None:
+        return Response({
+            'status': 'Duplicate location ignored',
+            'next_interval': getattr(settings, 'GPS_UPDATE_INTERVAL', 5),
+        })
+    return Response({
+        'status': 'Location updated',
+        'timestamp': ping.recorded_at,
+        'next_interval': ping.next_interval,
+    })
 
 
 @api_view(['POST'])
@@ -104,22 +190,29 @@ def bus_eta(request, bus_id, stop_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def bus_detail_api(request, pk):
+    buses = sparse_only(Bus.objects.select_related('current_route'), request, BusSerializer)
     try:
-        bus = Bus.objects.select_related('current_route').get(pk=pk)
+        bus = buses.get(pk=pk)
     except Bus.DoesNotExist:
         return Response({'error': 'Bus not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    serializer = BusSerializer(bus)
+    serializer = BusSerializer(bus, context={'request': request})
     return Response(serializer.data)
 
 
 def update_etas_for_bus(bus, route):
+    """Recompute the bus's stop ETAs; returns the latest location they used."""
     if not route:
-        return
+        return None
+    
+    location = bus.latest_location
+    if not location:
+        return None
     
     stops = route.stops.all()
+    etas = []
     for stop in stops:
-        result = ETACalculation.calculate_eta(bus, stop)
+        result = ETACalculation.calculate_eta(bus, stop, location=location)
         if result:
             eta, distance, minutes = result
             scheduled = timezone.now().replace(
@@ -130,14 +223,16 @@ def update_etas_for_bus(bus, route):
             is_delayed = eta > scheduled if stop.scheduled_time else False
             delay_mins = int((eta - scheduled).total_seconds() / 60) if is_delayed else 0
             
-            ETACalculation.objects.update_or_create(
+            etas.append(ETACalculation(
                 bus=bus,
                 stop=stop,
-                defaults={
-                    'calculated_eta': eta,
-                    'scheduled_time': scheduled,
-                    'distance_km': distance,
-                    'is_delayed': is_delayed,
-                    'delay_minutes': max(0, delay_mins)
-                }
-            )
+                calculated_eta=eta,
+                scheduled_time=scheduled,
+                distance_km=distance,
+                is_delayed=is_delayed,
+                delay_minutes=max(0, delay_mins)
+            ))
+    
+    # One INSERT ... ON CONFLICT for the whole route
+    bulk_upsert(ETACalculation, etas, ['bus', 'stop'])
+    return location
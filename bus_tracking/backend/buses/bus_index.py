@@ -0,0 +1,77 @@
+"""
+Spatial index of live bus positions for the nearby-buses endpoint.
+
+The index follows the BusLocation table incrementally: each refresh only
+reads rows newer than the last one it has seen, so it picks up pings written
+by every worker process. Refreshes are coalesced per process and happen at
+most once per ``LIVE_FEED_FRESHNESS`` seconds; positions older than
+``NEARBY_BUS_MAX_AGE`` seconds drop out.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.routers import values_across
+from core.singleflight import SingleFlight
+from core.spatial import GridIndex
+
+COLUMNS = (
+    'id', 'bus_id', 'bus__bus_number', 'bus__current_route__name',
+    'latitude', 'longitude', 'speed', 'heading', 'timestamp',
+)
+
+
+class BusIndex:
+    def __init__(self):
+        self.grid = GridIndex()
+        self.last_id = None
+        self._timestamps = {}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight(fresh_for=getattr(settings, 'LIVE_FEED_FRESHNESS', 1))
+
+    def refresh(self):
+        self._flights.do('refresh', self._refresh)
+
+    def _refresh(self):
+        from .api_views import latest_bus_locations
+        from .models import Bus, BusLocation
+
+        if self.last_id is None:
+            rows = latest_bus_locations(COLUMNS)
+        else:
+            active = Bus.objects.filter(is_active=True).values_list('id', flat=True)
+            rows = values_across(
+                BusLocation.objects.filter(id__gt=self.last_id, bus_id__in=list(active)).order_by('id'), COLUMNS
+            )
+
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'NEARBY_BUS_MAX_AGE', 120))
+        with self._lock:
+            for pk, bus_id, bus_number, route_name, lat, lng, speed, heading, timestamp in rows:
+                self.last_id = max(self.last_id or 0, pk)
+                if timestamp < cutoff or timestamp < self._timestamps.get(bus_id, timestamp):
+                    continue
+                self._timestamps[bus_id] = timestamp
+                self.grid.put(bus_id, lat, lng, {
+                    'id': bus_id,
+                    'bus_number': bus_number,
+                    'route_name': route_name or 'No Route',
+                    'latitude': float(lat),
+                    'longitude': float(lng),
+                    'speed': float(speed) if speed is not None else None,
+                    'heading': float(heading) if heading is not None else None,
+                    'timestamp': timestamp,
+                })
+            for bus_id in [b for b, seen in self._timestamps.items() if seen < cutoff]:
+                del self._timestamps[bus_id]
+                self.grid.remove(bus_id)
+            if self.last_id is None:
+                self.last_id = 0
+
+    def nearest(self, lat, lng, k=5, radius_km=2.0):
+        self.refresh()
+        return self.grid.nearest(lat, lng, k, radius_km)
+
+
+bus_index = BusIndex()
@@ -0,0 +1,59 @@
+"""
+Per-driver session context for the driver ping hot path.
+
+While a journey is running, the driver endpoints only need a handful of ids
+and labels (journey, bus, route, assignment). They are cached here on
+``start_journey`` and evicted on ``end_journey`` or whenever the journey or
+assignment changes, so pings skip the journey/assignment lookups entirely.
+Callers that find a context disagreeing with the database should call
+``forget_driver`` and rebuild it with ``get_driver_context``.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+
+from core.cache import TTLCache
+
+DriverContext = namedtuple('DriverContext', [
+    'journey_id', 'journey_start', 'bus_id', 'bus_number',
+    'route_id', 'route_name', 'assignment_id',
+])
+
+_contexts = TTLCache(
+    max_entries=getattr(settings, 'DRIVER_CONTEXT_MAX_ENTRIES', 1024),
+    ttl=getattr(settings, 'DRIVER_CONTEXT_TTL', 60),
+)
+
+
+def remember_journey(journey):
+    """Cache the context of an active journey and return it."""
+    context = DriverContext(
+        journey_id=journey.id,
+        journey_start=journey.start_time,
+        bus_id=journey.bus_id,
+        bus_number=journey.bus.bus_number,
+        route_id=journey.route_id,
+        route_name=journey.route.name,
+        assignment_id=journey.assignment_id,
+    )
+    _contexts.set(journey.driver_id, context)
+    return context
+
+
+def forget_driver(driver_id):
+    _contexts.delete(driver_id)
+
+
+def get_driver_context(driver):
+    """Return the driver's active journey context, or None if there is none."""
+    context = _contexts.get(driver.pk)
+    if context is not None:
+        return context
+
+    from .models import Journey
+    journey = Journey.objects.filter(
+        driver=driver, status='active'
+    ).select_related('bus', 'route').first()
+    if journey is None:
+        return None
+    return remember_journey(journey)
@@ -0,0 +1,103 @@
+"""
+Background ETA recomputation.
+
+GPS pings only enqueue their bus; a worker thread recomputes the stop ETAs
+and schedule adherence (schedules.adherence) of every queued bus once per
+``ETA_RECOMPUTE_INTERVAL`` seconds, so a burst of
+pings from one bus costs a single recomputation and the ping request never
+waits for it. The queue is per process and in memory: pending work is lost
+on restart and picked up again by the bus's next ping.
+
+``metrics()`` reports the queue depth and the freshness of the ETAs, i.e. how
+long after the oldest coalesced ping the recomputed ETAs were written.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def recompute_etas(bus_id, route_id):
+    """Distance-based stop ETAs, then the timetable-based LiveETAs of the journey."""
+    from schedules.adherence import adherence
+    from schedules.models import Route
+    from .api_views import update_etas_for_bus
+    from .models import Bus
+
+    location = update_etas_for_bus(Bus(pk=bus_id), Route(pk=route_id))
+    adherence.update_bus(bus_id, location)
+
+
+class ETARecomputeQueue:
+    def __init__(self, interval=1, window=1024):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._freshness = deque(maxlen=window)
+        self.enqueued = self.coalesced = self.recomputed = self.errors = 0
+
+    def enqueue(self, bus_id, route_id, pinged_at=None):
+        """Queue a recompute for ``bus_id``; ``pinged_at`` is the ping's epoch time."""
+        pinged_at = pinged_at or time.time()
+        with self._lock:
+            self.enqueued += 1
+            queued = self._pending.get(bus_id)
+            if queued is not None:
+                # Keep the oldest ping so freshness covers the whole wait
+                self.coalesced += 1
+                pinged_at = min(pinged_at, queued[1])
+            self._pending[bus_id] = (route_id, pinged_at)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='eta-recompute', daemon=True)
+                self._thread.start()
+
+    def drain(self):
+        """Recompute every queued bus once; returns how many were recomputed."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for bus_id, (route_id, pinged_at) in pending.items():
+            try:
+                recompute_etas(bus_id, route_id)
+            except Exception:
+                logger.exception('ETA recompute failed for bus %s', bus_id)
+                with self._lock:
+                    self.errors += 1
+                continue
+            with self._lock:
+                self.recomputed += 1
+                self._freshness.append(time.time() - pinged_at)
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            # This thread is not request-bound, so recycle connections ourselves
+            close_old_connections()
+            self.drain()
+
+    def metrics(self):
+        with self._lock:
+            freshness = sorted(self._freshness)
+            return {
+                'queue_depth': len(self._pending),
+                'enqueued': self.enqueued,
+                'coalesced': self.coalesced,
+                'recomputed': self.recomputed,
+                'errors': self.errors,
+                'freshness_ms': {
+                    'last': round(self._freshness[-1] * 1000, 1) if freshness else None,
+                    'avg': round(sum(freshness) / len(freshness) * 1000, 1) if freshness else None,
+                    'p95': round(freshness[int(len(freshness) * 0.95)] * 1000, 1) if freshness else None,
+                    'max': round(freshness[-1] * 1000, 1) if freshness else None,
+                },
+            }
+
+
+eta_queue = ETARecomputeQueue(interval=getattr(settings, 'ETA_RECOMPUTE_INTERVAL', 1))
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.jobs import periodic
+from .models import ETACalculation, Journey
+
+
+@periodic(seconds=60)
+def abort_stale_journeys():
+    """Abort active journeys whose driver has not pinged for JOURNEY_STALE_AFTER seconds."""
+    from locations.models import DriverLocation
+    from locations.odometer import odometer
+
+    now = timezone.now()
+    threshold = now - timedelta(seconds=getattr(settings, 'JOURNEY_STALE_AFTER', 1800))
+    # Live locations may be in the telemetry database (core.routers): no join
+    pinging = DriverLocation.objects.filter(last_updated__gte=threshold).values_list('driver_id', flat=True)
+    stale = Journey.objects.filter(status='active', start_time__lt=threshold).exclude(
+        driver_id__in=list(pinging)
+    )
+    for journey in stale:
+        journey.status = 'aborted'
+        journey.end_time = now
+        # save() so the driver context signal fires
+        journey.save(update_fields=['status', 'end_time'])
+        odometer.finish(journey)
+        DriverLocation.objects.filter(driver_id=journey.driver_id, journey=journey).update(
+            is_sharing=False, journey=None
+        )
+
+
+@periodic(seconds=300)
+def cleanup_etas():
+    """Delete ETAs that have not been recalculated within ETA_RETENTION seconds."""
+    threshold = timezone.now() - timedelta(seconds=getattr(settings, 'ETA_RETENTION', 3600))
+    ETACalculation.objects.filter(calculated_at__lt=threshold).delete()
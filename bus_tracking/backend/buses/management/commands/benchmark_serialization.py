@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from buses.api_views import BUS_LOCATION_ROW
+from buses.serializers import BusMapDataSerializer
+from core.renderers import FastJSONRenderer
+from locations.api_views import ACTIVE_LOCATION_ROW
+
+
+class Command(BaseCommand):
+    help = 'Compare serialization cost (microseconds per row) of the live feeds, legacy vs fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        now = timezone.now()
+
+        bus_rows = [
+            (i, f'BUS-{i:03d}', Decimal('23.8103320') + i, Decimal('90.4125180') + i,
+             f'Route {i % 12}', Decimal('32.50'), Decimal('180.00'))
+            for i in range(rows)
+        ]
+        # Same column order as ACTIVE_LOCATION_ROW.columns
+        driver_rows = [
+            (i, 'Driver', str(i), f'driver{i}', Decimal('23.8103320'), Decimal('90.4125180'),
+             180.0, 8.3, now, f'BUS-{i:03d}', f'Route {i % 12}', i % 12, i,
+             now - timedelta(minutes=20))
+            for i in range(rows)
+        ]
+
+        def legacy_buses():
+            data = [{
+                'id': r[0], 'bus_number': r[1], 'latitude': r[2], 'longitude': r[3],
+                'route_name': r[4], 'eta': 'Calculating...', 'speed': r[5],
+            } for r in bus_rows]
+            return JSONRenderer().render(BusMapDataSerializer(data, many=True).data)
+
+        def fast_buses():
+            return FastJSONRenderer().render(BUS_LOCATION_ROW.map_all(bus_rows))
+
+        def legacy_drivers():
+            data = [{
+                'driver_id': r[0], 'driver_name': f'{r[1]} {r[2]}'.strip() or r[3],
+                'latitude': float(r[4]), 'longitude': float(r[5]), 'heading': r[6],
+                'speed': r[7], 'last_updated': r[8].isoformat(), 'is_active': True,
+                'bus_number': r[9], 'route_name': r[10], 'route_id': r[11],
+                'journey_id': r[12], 'journey_start': r[13].isoformat(),
+            } for r in driver_rows]
+            return JSONRenderer().render(data)
+
+        def fast_drivers():
+            return FastJSONRenderer().render(ACTIVE_LOCATION_ROW.map_all(driver_rows))
+
+        self.stdout.write(f'{rows} rows x {repeat} runs')
+        for name, legacy, fast in (
+            ('bus_locations', legacy_buses, fast_buses),
+            ('get_active_locations', legacy_drivers, fast_drivers),
+        ):
+            before = self._per_row(legacy, rows, repeat)
+            after = self._per_row(fast, rows, repeat)
+            self.stdout.write(
+                f'{name:22s} before {before:7.2f} us/row  after {after:7.2f} us/row  '
+                f'({before / after:.1f}x)'
+            )
+
+    @staticmethod
+    def _per_row(func, rows, repeat):
+        func()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / (repeat * rows) * 1e6
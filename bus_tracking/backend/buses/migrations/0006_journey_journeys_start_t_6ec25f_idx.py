@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0005_journey"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="journey",
+            index=models.Index(
+                fields=["-start_time", "-id"], name="journeys_start_t_6ec25f_idx"
+            ),
+        ),
+    ]
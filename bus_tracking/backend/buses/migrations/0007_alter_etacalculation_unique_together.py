@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:49
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def delete_duplicate_etas(apps, schema_editor):
+    """Keep only the latest ETA per (bus, stop) before making the pair unique."""
+    ETACalculation = apps.get_model("buses", "ETACalculation")
+    latest = (
+        ETACalculation.objects.values("bus", "stop")
+        .annotate(keep=Max("id"))
+        .values_list("keep", flat=True)
+    )
+    ETACalculation.objects.exclude(id__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedules", "0005_schedule_bus_schedule_driver_alter_route_color"),
+        ("buses", "0006_journey_journeys_start_t_6ec25f_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_etas,
+            migrations.RunPython.noop,
+            hints={"model_name": "etacalculation"},
+        ),
+        migrations.AlterUniqueTogether(
+            name="etacalculation",
+            unique_together={("bus", "stop")},
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:50
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def close_duplicate_actives(apps, schema_editor):
+    """Keep only the newest active assignment per bus, driver and route, and
+    the newest active journey per driver, so the constraints can be added."""
+    BusAssignment = apps.get_model("buses", "BusAssignment")
+    Journey = apps.get_model("buses", "Journey")
+
+    for field in ("bus", "driver", "route"):
+        seen = set()
+        for pk, key in (
+            BusAssignment.objects.filter(is_active=True)
+            .order_by("-created_at", "-id")
+            .values_list("pk", f"{field}_id")
+        ):
+            if key in seen:
+                BusAssignment.objects.filter(pk=pk).update(
+                    is_active=False, ended_at=timezone.now()
+                )
+            seen.add(key)
+
+    seen = set()
+    for pk, driver_id in (
+        Journey.objects.filter(status="active")
+        .order_by("-start_time", "-id")
+        .values_list("pk", "driver_id")
+    ):
+        if driver_id in seen:
+            Journey.objects.filter(pk=pk).update(
+                status="aborted", end_time=timezone.now()
+            )
+        seen.add(driver_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0007_alter_etacalculation_unique_together"),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_actives, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="busassignment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_active", True)),
+                fields=("bus",),
+                name="unique_active_assignment_per_bus",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="busassignment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_active", True)),
+                fields=("driver",),
+                name="unique_active_assignment_per_driver",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="busassignment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_active", True)),
+                fields=("route",),
+                name="unique_active_assignment_per_route",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="journey",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "active")),
+                fields=("driver",),
+                name="unique_active_journey_per_driver",
+            ),
+        ),
+    ]
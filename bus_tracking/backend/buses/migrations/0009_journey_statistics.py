@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0008_busassignment_unique_active_assignment_per_bus_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="journey",
+            name="avg_speed_kmh",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=6, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="journey",
+            name="distance_km",
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name="journey",
+            name="idle_seconds",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="journey",
+            name="max_speed_kmh",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AddField(
+            model_name="journey",
+            name="point_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
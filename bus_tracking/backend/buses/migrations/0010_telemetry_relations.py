@@ -0,0 +1,45 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedules", "0006_liveeta_unique_bus_stop"),
+        ("buses", "0009_journey_statistics"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="buslocation",
+            name="bus",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="locations",
+                to="buses.bus",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="etacalculation",
+            name="bus",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="etas",
+                to="buses.bus",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="etacalculation",
+            name="stop",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="etas",
+                to="schedules.stop",
+            ),
+        ),
+    ]
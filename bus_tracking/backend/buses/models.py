@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from accounts.models import User
 import math
@@ -39,7 +39,8 @@ class Bus(models.Model):
 
 
 class BusLocation(models.Model):
-    bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='locations')
+    # Telemetry (core.routers): plain ids, cleaned up by buses.signals
+    bus = models.ForeignKey(Bus, on_delete=models.DO_NOTHING, db_constraint=False, related_name='locations')
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
     speed = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
@@ -73,75 +74,115 @@ class BusAssignment(models.Model):
     class Meta:
         db_table = 'bus_assignments'
         ordering = ['-created_at']
+        constraints = [
+            # One active assignment per bus, per driver and per route
+            models.UniqueConstraint(
+                fields=['bus'], condition=models.Q(is_active=True),
+                name='unique_active_assignment_per_bus'
+            ),
+            models.UniqueConstraint(
+                fields=['driver'], condition=models.Q(is_active=True),
+                name='unique_active_assignment_per_driver'
+            ),
+            models.UniqueConstraint(
+                fields=['route'], condition=models.Q(is_active=True),
+                name='unique_active_assignment_per_route'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.bus.bus_number} - {self.driver.username}"
 
-    def clean(self):
-        """Validate assignment rules."""
+    def _check_required(self):
         from django.core.exceptions import ValidationError
         
         # Both driver and route are required for a valid assignment
         if self.is_active:
-            if not self.driver:
+            if not self.driver_id:
                 raise ValidationError("A driver must be assigned for an active assignment.")
-            if not self.route:
+            if not self.route_id:
                 raise ValidationError("A route must be assigned for an active assignment.")
+
+    def conflict_error(self):
+        """
+        Return a ValidationError describing the active assignment this one
+        clashes with, or None.
+        """
+        from django.core.exceptions import ValidationError
         
-        if self.is_active and self.bus:
+        if not self.is_active:
+            return None
+        
+        active = BusAssignment.objects.filter(is_active=True).exclude(pk=self.pk).select_related(
+            'bus', 'driver', 'route'
+        )
+        
+        if self.bus_id:
             # Check if bus already has an active assignment
-            existing_bus = BusAssignment.objects.filter(
-                bus=self.bus, 
-                is_active=True
-            ).exclude(pk=self.pk)
-            
-            if existing_bus.exists():
-                existing_assignment = existing_bus.first()
-                raise ValidationError(
-                    f"Bus {self.bus.bus_number} already has an active assignment with driver "
+            existing_assignment = active.filter(bus_id=self.bus_id).first()
+            if existing_assignment:
+                return ValidationError(
+                    f"Bus {existing_assignment.bus.bus_number} already has an active assignment with driver "
                     f"{existing_assignment.driver.get_full_name() or existing_assignment.driver.username} "
                     f"on route {existing_assignment.route.name}. "
                     f"Please clear the existing assignment first."
                 )
         
-        if self.is_active and self.driver:
+        if self.driver_id:
             # Check if driver already has an active assignment on a different bus
-            existing = BusAssignment.objects.filter(
-                driver=self.driver, 
-                is_active=True
-            ).exclude(pk=self.pk)
-            
-            if existing.exists():
-                existing_assignment = existing.first()
-                raise ValidationError(
-                    f"Driver {self.driver.get_full_name() or self.driver.username} is already assigned to "
+            existing_assignment = active.filter(driver_id=self.driver_id).first()
+            if existing_assignment:
+                driver = existing_assignment.driver
+                return ValidationError(
+                    f"Driver {driver.get_full_name() or driver.username} is already assigned to "
                     f"Bus {existing_assignment.bus.bus_number} on route {existing_assignment.route.name}. "
                     f"Please deactivate the existing assignment first."
                 )
         
-        if self.is_active and self.route:
+        if self.route_id:
             # Check if route already has an active assignment with a different driver
-            existing_route = BusAssignment.objects.filter(
-                route=self.route, 
-                is_active=True
-            ).exclude(pk=self.pk)
-            
-            if existing_route.exists():
-                existing_assignment = existing_route.first()
-                raise ValidationError(
-                    f"Route '{self.route.name}' already has driver "
+            existing_assignment = active.filter(route_id=self.route_id).first()
+            if existing_assignment:
+                return ValidationError(
+                    f"Route '{existing_assignment.route.name}' already has driver "
                     f"{existing_assignment.driver.get_full_name() or existing_assignment.driver.username} "
                     f"assigned on Bus {existing_assignment.bus.bus_number}. "
                     f"A route can only have one driver at a time."
                 )
+        return None
+
+    def clean(self):
+        """Validate assignment rules."""
+        self._check_required()
+        error = self.conflict_error()
+        if error:
+            raise error
+
+    def validate_constraints(self, exclude=None):
+        # clean() already reports clashing active assignments with a
+        # friendlier message; excluding is_active skips the partial indexes
+        exclude = set(exclude or ()) | {'is_active'}
+        super().validate_constraints(exclude=exclude)
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        """
+        A single INSERT/UPDATE: the partial unique constraints reject a second
+        active assignment, and only then is the clash looked up for the error.
+        """
+        self._check_required()
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            error = self.conflict_error()
+            if error is None:
+                raise
+            raise error
 
 class ETACalculation(models.Model):
-    bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='etas')
-    stop = models.ForeignKey('schedules.Stop', on_delete=models.CASCADE, related_name='etas')
+    # Telemetry (core.routers): plain ids, cleaned up by buses.signals
+    bus = models.ForeignKey(Bus, on_delete=models.DO_NOTHING, db_constraint=False, related_name='etas')
+    stop = models.ForeignKey('schedules.Stop', on_delete=models.DO_NOTHING, db_constraint=False, related_name='etas')
     calculated_eta = models.DateTimeField()
     scheduled_time = models.DateTimeField()
     distance_km = models.DecimalField(max_digits=10, decimal_places=2)
@@ -152,6 +193,7 @@ class ETACalculation(models.Model):
     class Meta:
         db_table = 'eta_calculations'
         ordering = ['-calculated_at']
+        unique_together = ['bus', 'stop']
 
     def __str__(self):
         return f"ETA: {self.bus.bus_number} to {self.stop.name}"
@@ -170,8 +212,9 @@ class ETACalculation(models.Model):
         return R * c
 
     @classmethod
-    def calculate_eta(cls, bus, stop, avg_speed_kmh=30):
-        location = bus.latest_location
+    def calculate_eta(cls, bus, stop, avg_speed_kmh=30, location=None):
+        """Pass ``location`` to reuse an already loaded latest location."""
+        location = location or bus.latest_location
         if not location:
             return None
         
@@ -207,12 +250,27 @@ class Journey(models.Model):
     start_longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
     end_latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
     end_longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    # Running statistics kept by locations.odometer; avg speed is set when the journey ends
+    distance_km = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    avg_speed_kmh = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    max_speed_kmh = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    idle_seconds = models.PositiveIntegerField(default=0)
+    point_count = models.PositiveIntegerField(default=0)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'journeys'
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['-start_time', '-id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['driver'], condition=models.Q(status='active'),
+                name='unique_active_journey_per_driver'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.driver.get_full_name()} - {self.bus.bus_number} - {self.status}"
@@ -224,6 +282,10 @@ class Journey(models.Model):
             return int(delta.total_seconds() / 60)
         return None
 
+    @property
+    def idle_minutes(self):
+        return self.idle_seconds // 60
+
     @classmethod
     def get_active_journey(cls, driver):
         """Get the active journey for a driver."""
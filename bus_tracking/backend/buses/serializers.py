@@ -1,14 +1,15 @@
 from rest_framework import serializers
+from core.fieldsets import SparseFieldsMixin
 from .models import Bus, BusLocation, BusAssignment, ETACalculation
 
-class BusLocationSerializer(serializers.ModelSerializer):
+class BusLocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BusLocation
         fields = ['id', 'bus', 'latitude', 'longitude', 'speed', 'heading', 'timestamp']
         read_only_fields = ['id', 'timestamp']
 
 
-class BusSerializer(serializers.ModelSerializer):
+class BusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     latest_location = BusLocationSerializer(read_only=True)
     route_name = serializers.CharField(source='current_route.name', read_only=True)
 
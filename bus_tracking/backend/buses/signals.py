@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from schedules.models import Stop
+from .driver_context import forget_driver
+from .models import Bus, BusAssignment, BusLocation, ETACalculation, Journey
+
+
+@receiver(post_save, sender=Journey)
+@receiver(post_delete, sender=Journey)
+@receiver(post_save, sender=BusAssignment)
+@receiver(post_delete, sender=BusAssignment)
+def invalidate_driver_context(sender, instance, **kwargs):
+    forget_driver(instance.driver_id)
+
+
+# Telemetry rows only hold the ids of buses and stops (core.routers), so the
+# database does not cascade deletions to them
+@receiver(post_delete, sender=Bus)
+def delete_bus_telemetry(sender, instance, **kwargs):
+    BusLocation.objects.filter(bus_id=instance.pk).delete()
+    ETACalculation.objects.filter(bus_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Stop)
+def delete_stop_etas(sender, instance, **kwargs):
+    ETACalculation.objects.filter(stop_id=instance.pk).delete()
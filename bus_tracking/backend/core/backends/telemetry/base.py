@@ -0,0 +1,16 @@
+"""
+PostgreSQL for the telemetry database (core.routers).
+
+The telemetry tables refer to buses, stops, users and journeys kept in the
+default database, so their migrations must not create foreign keys there:
+the referenced tables do not exist on this side.
+"""
+from django.db.backends.postgresql import base, features
+
+
+class DatabaseFeatures(features.DatabaseFeatures):
+    supports_foreign_keys = False
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    features_class = DatabaseFeatures
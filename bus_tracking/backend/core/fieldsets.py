@@ -0,0 +1,104 @@
+"""
+Sparse fieldsets (``?fields=a,b``) and compact payloads (``?compact=1``).
+
+Compact responses are a header row of field names followed by one array of
+values per object, which drops the repeated keys from list payloads.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.serializers import BaseSerializer
+
+
+def requested_fields(request):
+    """Field names from ``?fields=``, or None when the client wants everything."""
+    raw = request.query_params.get('fields') if request is not None else None
+    if not raw:
+        return None
+    return [name for name in (part.strip() for part in raw.split(',')) if name]
+
+
+def wants_compact(request):
+    return request.query_params.get('compact', '').lower() in ('1', 'true', 'yes')
+
+
+def compact_rows(keys, items):
+    keys = list(keys)
+    return [keys] + [[item.get(key) for key in keys] for item in items]
+
+
+def serialized_list(request, serializer):
+    """Data of a ``many=True`` serializer, compacted when ``?compact=1``."""
+    if wants_compact(request):
+        return compact_rows(serializer.child.fields.keys(), serializer.data)
+    return serializer.data
+
+
+class SparseFieldsMixin:
+    """Serializer mixin dropping fields not listed in the request's ``?fields=``.
+
+    Only applies to the top-level serializer (or the child of a ``many=True``
+    list), never to nested serializers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields and set(fields) & set(self.fields):
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def sparse_only(queryset, request, serializer_class, extra=()):
+    """
+    Restrict ``queryset`` to the columns the serializer will read once pruned
+    by ``?fields=``, plus ``extra`` (e.g. the pagination ordering).
+
+    Foreign key columns are always kept (they are small and related managers
+    read them), ``select_related``/``prefetch_related`` lookups that are no
+    longer needed are dropped, and ``relation.field`` sources only load that
+    column of the related row. Sources that are properties or methods might
+    read any column, so the queryset is then left untouched.
+    """
+    if not requested_fields(request):
+        return queryset
+
+    serializer = serializer_class(context={'request': request})
+    opts = queryset.model._meta
+    columns = {opts.pk.name, *extra}
+    columns.update(f.name for f in opts.concrete_fields if f.is_relation)
+    relations, prefetches = set(), set()
+    for field in serializer.fields.values():
+        head, _, rest = field.source.partition('.')
+        if head.startswith('get_') and head.endswith('_display'):
+            head = head[len('get_'):-len('_display')]
+        try:
+            model_field = opts.get_field(head)
+        except FieldDoesNotExist:
+            return queryset
+        if model_field.one_to_many or model_field.many_to_many:
+            prefetches.add(head)
+            continue
+        if not model_field.concrete:
+            return queryset
+        columns.add(head)
+        if model_field.is_relation and (rest or isinstance(field, BaseSerializer)):
+            relations.add(head)
+            related_opts = model_field.related_model._meta
+            if rest and '.' not in rest and any(f.name == rest for f in related_opts.concrete_fields):
+                columns.add(f'{head}__{rest}')
+            else:
+                columns.add(f'{head}__*')
+
+    # A relation read through a method needs its whole row
+    whole_rows = {c[:-len('__*')] for c in columns if c.endswith('__*')}
+    columns = {c for c in columns if '__' not in c or c.split('__')[0] not in whole_rows}
+
+    lookups = [
+        lookup for lookup in queryset._prefetch_related_lookups
+        if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in prefetches
+    ]
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+    return queryset.only(*columns)
@@ -0,0 +1,204 @@
+"""
+Periodic housekeeping jobs.
+
+Apps register jobs in a ``jobs`` module, which is discovered like
+``admin.py``::
+
+    @periodic(seconds=30)
+    def expire_locations():
+        DriverLocation.expire_inactive()
+
+``JobRunner`` runs whatever is due every second, but only while it is the
+leader. On PostgreSQL leadership is a session-level advisory lock held by the
+runner's own connection, so it is released as soon as the process or the
+connection dies and another runner takes over. Other databases have no
+advisory locks; there the leader holds a lease row (``JobLease``) that it
+renews while running and that another runner takes over once it has gone
+``JOBS_LEASE_TTL`` seconds without renewal.
+
+Run the jobs as their own process with ``python manage.py run_jobs`` (the
+Procfile's ``worker``). ``JOBS_AUTOSTART`` instead starts a background runner
+in every web worker and leaves the election to the lock.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import JobLease
+
+logger = logging.getLogger(__name__)
+
+Job = namedtuple('Job', ['name', 'interval', 'func'])
+
+_registry = {}
+
+
+def periodic(seconds, name=None):
+    """Register the decorated function to run every ``seconds``."""
+    def decorator(func):
+        job_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[job_name] = Job(job_name, seconds, func)
+        return func
+    return decorator
+
+
+def registered_jobs():
+    autodiscover_modules('jobs')
+    return sorted(_registry.values(), key=lambda job: job.name)
+
+
+class AdvisoryLock:
+    """PostgreSQL advisory lock tied to the current thread's connection."""
+
+    def __init__(self, lock_id):
+        self.lock_id = lock_id
+
+    def acquire(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [self.lock_id])
+            return cursor.fetchone()[0]
+
+    def held(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted "
+                "AND pid = pg_backend_pid() AND classid = 0 AND objid = %s AND objsubid = 1",
+                [self.lock_id],
+            )
+            return cursor.fetchone() is not None
+
+    def release(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [self.lock_id])
+
+
+class LeaseLock:
+    """Lease on a ``JobLease`` row, taken and renewed by conditional UPDATEs."""
+
+    def __init__(self, lock_id, ttl=None):
+        self.lock_id = lock_id
+        self.ttl = timedelta(seconds=ttl or getattr(settings, 'JOBS_LEASE_TTL', 60))
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._renew_at = None
+
+    def acquire(self):
+        now = timezone.now()
+        JobLease.objects.get_or_create(lock_id=self.lock_id, defaults={'expires_at': now})
+        taken = JobLease.objects.filter(
+            Q(expires_at__lte=now) | Q(holder=self.holder), lock_id=self.lock_id
+        ).update(holder=self.holder, expires_at=now + self.ttl)
+        self._renew_at = now + self.ttl / 2 if taken else None
+        return bool(taken)
+
+    def held(self):
+        if self._renew_at is None:
+            return False
+        now = timezone.now()
+        if now < self._renew_at:
+            return True
+        # Renewed halfway through, so nobody can take it over before that
+        renewed = JobLease.objects.filter(
+            lock_id=self.lock_id, holder=self.holder, expires_at__gt=now
+        ).update(expires_at=now + self.ttl)
+        self._renew_at = now + self.ttl / 2 if renewed else None
+        return bool(renewed)
+
+    def release(self):
+        JobLease.objects.filter(lock_id=self.lock_id, holder=self.holder).update(expires_at=timezone.now())
+        self._renew_at = None
+
+
+def leader_lock(lock_id):
+    if connection.vendor == 'postgresql':
+        return AdvisoryLock(lock_id)
+    return LeaseLock(lock_id)
+
+
+class JobRunner:
+    def __init__(self, jobs=None, tick=1):
+        self.jobs = registered_jobs() if jobs is None else list(jobs)
+        self.tick = tick
+        self.lock = leader_lock(getattr(settings, 'JOBS_LOCK_ID', 0x62757331))
+        self.is_leader = False
+        self._last_run = {}
+        self._stopped = threading.Event()
+
+    def run_pending(self):
+        """Run the jobs that are due if this runner is the leader; return their names."""
+        if not self._elect():
+            return []
+
+        ran = []
+        for job in self.jobs:
+            last_run = self._last_run.get(job.name)
+            if last_run is not None and time.monotonic() - last_run < job.interval:
+                continue
+            self._last_run[job.name] = time.monotonic()
+            try:
+                job.func()
+            except DatabaseError:
+                logger.exception('Job %s failed, giving up leadership', job.name)
+                self._step_down()
+                break
+            except Exception:
+                logger.exception('Job %s failed', job.name)
+            ran.append(job.name)
+        return ran
+
+    def run_forever(self):
+        try:
+            while not self._stopped.is_set():
+                self.run_pending()
+                self._stopped.wait(self.tick)
+        finally:
+            if self.is_leader:
+                self.lock.release()
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _elect(self):
+        try:
+            if self.is_leader:
+                self.is_leader = self.lock.held()
+            elif self.lock.acquire():
+                self.is_leader = True
+                self._last_run.clear()
+                logger.info('Job runner elected leader')
+        except DatabaseError:
+            logger.exception('Job runner lost its database connection')
+            self._step_down()
+        return self.is_leader
+
+    def _step_down(self):
+        # Closing the session also drops an advisory lock; a lease runs out
+        self.is_leader = False
+        connection.close()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def start_background_runner():
+    """Start one daemon runner thread per process, return its runner."""
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = JobRunner()
+            threading.Thread(
+                target=_background.run_forever, name='job-runner', daemon=True
+            ).start()
+    return _background
@@ -0,0 +1,126 @@
+"""
+Shared snapshots of the live map feeds.
+
+Every client polling a live feed gets the same bytes until the fleet changes,
+so each feed is rendered once per version (per format and ``?fields=`` /
+``?compact=`` combination) and the cached ``bytes`` object is handed to every
+response without copying. Concurrent polls of the same snapshot are
+coalesced: one request checks the version (and rebuilds if needed) while the
+others wait for it, and its result is reused for ``LIVE_FEED_FRESHNESS``
+seconds.
+
+Clients can ask for ``application/msgpack`` or for the packed position
+format (``Accept: application/vnd.bus-tracking.positions`` or
+``?format=bin``). The packed format is little-endian::
+
+    header  16 bytes  magic b'BUSP', uint16 version (1), uint16 record size,
+                      uint32 record count, uint32 generated at (epoch seconds)
+    record  20 bytes  uint32 id, int32 latitude and int32 longitude in
+                      microdegrees, uint16 heading in centidegrees, uint16
+                      speed in cm/s, uint32 timestamp (epoch seconds)
+
+Unknown heading or speed is ``0xFFFF``.
+"""
+import struct
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.response import Response
+
+from .cache import TTLCache
+from .fieldsets import wants_compact
+from .renderers import PackedPositionsRenderer
+from .singleflight import SingleFlight
+
+PACKED_MAGIC = b'BUSP'
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct('<4sHHII')
+PACKED_RECORD = struct.Struct('<IiiHHI')
+PACKED_UNKNOWN = 0xFFFF
+
+# Speeds as stored, converted to cm/s
+KMH_TO_CMS = 100 / 3.6
+MS_TO_CMS = 100
+
+_snapshots = TTLCache(max_entries=64, ttl=300)
+_flights = SingleFlight(fresh_for=getattr(settings, 'LIVE_FEED_FRESHNESS', 1))
+
+
+def _uint16(value, scale, modulo=None):
+    if value is None:
+        return PACKED_UNKNOWN
+    value = round(float(value) * scale)
+    if modulo:
+        value %= modulo
+    return min(max(value, 0), PACKED_UNKNOWN - 1)
+
+
+def pack_positions(rows, speed_to_cms):
+    """
+    Pack ``(id, latitude, longitude, heading, speed, timestamp)`` rows.
+
+    ``speed_to_cms`` converts the stored speed unit to cm/s.
+    """
+    rows = list(rows)
+    buffer = bytearray(PACKED_HEADER.size + PACKED_RECORD.size * len(rows))
+    PACKED_HEADER.pack_into(
+        buffer, 0, PACKED_MAGIC, PACKED_VERSION, PACKED_RECORD.size, len(rows), int(time.time())
+    )
+    offset = PACKED_HEADER.size
+    for pk, lat, lng, heading, speed, timestamp in rows:
+        PACKED_RECORD.pack_into(
+            buffer, offset, pk,
+            round(lat * 1000000), round(lng * 1000000),
+            _uint16(heading, 100, 36000), _uint16(speed, speed_to_cms),
+            int(timestamp.timestamp()),
+        )
+        offset += PACKED_RECORD.size
+    return bytes(buffer)
+
+
+def unpack_positions(content):
+    """Inverse of ``pack_positions``, returns ``(generated_at, records)``."""
+    magic, version, size, count, generated_at = PACKED_HEADER.unpack_from(content)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION or size != PACKED_RECORD.size:
+        raise ValueError('Not a packed position feed')
+    body = memoryview(content)[PACKED_HEADER.size:PACKED_HEADER.size + size * count]
+    return generated_at, list(PACKED_RECORD.iter_unpack(body))
+
+
+def _snapshot(key, request, get_version, build_data, build_positions):
+    version = get_version()
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot[0] == version:
+        return snapshot[1]
+
+    renderer = request.accepted_renderer
+    if renderer.format == PackedPositionsRenderer.format:
+        content = pack_positions(*build_positions())
+    else:
+        content = renderer.render(build_data(), renderer.media_type, {'request': request})
+    _snapshots.set(key, (version, content))
+    return content
+
+
+def live_feed_response(request, feed, get_version, build_data, build_positions):
+    """
+    Respond with the snapshot of ``feed`` for the current ``get_version()``,
+    building it if the cached one is older.
+
+    ``build_data()`` returns the JSON/MessagePack payload and
+    ``build_positions()`` returns ``(rows, speed_to_cms)`` for
+    ``pack_positions``. The browsable API is never cached.
+    """
+    renderer = request.accepted_renderer
+    if renderer.format == 'api':
+        return Response(build_data())
+
+    key = (feed, renderer.format, request.query_params.get('fields'), wants_compact(request))
+    content = _flights.do(
+        key, lambda: _snapshot(key, request, get_version, build_data, build_positions)
+    )
+    response = HttpResponse(content, content_type=renderer.media_type)
+    patch_vary_headers(response, ['Accept'])
+    return response
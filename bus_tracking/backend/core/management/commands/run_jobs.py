@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import JobRunner
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic housekeeping jobs (only the elected leader does work)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every job once and exit')
+
+    def handle(self, *args, **options):
+        runner = JobRunner()
+        if not options['once']:
+            self.stdout.write(f'Running {len(runner.jobs)} jobs, press Ctrl+C to stop')
+            try:
+                runner.run_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        ran = runner.run_pending()
+        if not runner.is_leader:
+            self.stdout.write(self.style.WARNING('Another runner holds the leader lock'))
+        for name in ran:
+            self.stdout.write(self.style.SUCCESS(f'Ran {name}'))
@@ -0,0 +1,93 @@
+"""
+Precompiled row mappers for hot read endpoints.
+
+A ``RowMapper`` describes once, at import time, how the tuples returned by
+``values_list()`` turn into response dicts, so views can skip model
+instantiation and serializers entirely::
+
+    LOCATION_ROW = RowMapper(
+        ('id', 'id'),
+        ('lat', 'latitude', float),
+        ('label', ('name', 'code'), lambda name, code: f'{name} ({code})'),
+    )
+    rows = queryset.values_list(*LOCATION_ROW.columns)
+    data = LOCATION_ROW.map_all(rows)
+
+``select()`` narrows a mapper to the requested keys, which also narrows
+``columns`` and therefore the SELECT list.
+"""
+from operator import itemgetter
+
+
+class RowMapper:
+    """Maps ``values_list()`` tuples to dicts.
+
+    Each field is one of:
+
+    * ``(key, column)`` - copied as is;
+    * ``(key, column, converter)`` - converted, ``None`` passes through;
+    * ``(key, (column, ...), func)`` - ``func(*values)``, use ``()`` for
+      constant fields.
+    """
+
+    def __init__(self, *fields):
+        self.fields = tuple(fields)
+        self.keys = tuple(field[0] for field in fields)
+
+        columns = []
+        for field in fields:
+            for column in (field[1] if isinstance(field[1], tuple) else (field[1],)):
+                if column not in columns:
+                    columns.append(column)
+        self.columns = tuple(columns)
+
+        simple = [field for field in fields if not isinstance(field[1], tuple)]
+        self._simple_keys = tuple(field[0] for field in simple)
+        self._simple_getter = self._getter([columns.index(field[1]) for field in simple])
+        self._converters = tuple(
+            (field[0], field[2]) for field in simple if len(field) > 2 and field[2] is not None
+        )
+        self._computed = tuple(
+            (field[0], self._getter([columns.index(c) for c in field[1]]), field[2])
+            for field in fields if isinstance(field[1], tuple)
+        )
+
+    @staticmethod
+    def _getter(indexes):
+        """Return a callable picking ``indexes`` from a row, always as a tuple."""
+        if not indexes:
+            return lambda row: ()
+        if len(indexes) == 1:
+            index = indexes[0]
+            return lambda row: (row[index],)
+        return itemgetter(*indexes)
+
+    def __call__(self, row):
+        data = dict(zip(self._simple_keys, self._simple_getter(row)))
+        for key, convert in self._converters:
+            value = data[key]
+            if value is not None:
+                data[key] = convert(value)
+        for key, getter, func in self._computed:
+            data[key] = func(*getter(row))
+        return data
+
+    def map_all(self, rows):
+        return [self(row) for row in rows]
+
+    def map_compact(self, rows):
+        """Header row of keys followed by one list of values per row."""
+        keys = self.keys
+        return [list(keys)] + [[item[key] for key in keys] for item in map(self, rows)]
+
+    def select(self, keys):
+        """Return a mapper limited to ``keys`` (unknown keys are ignored).
+
+        Falls back to the full mapper when ``keys`` is empty or matches
+        nothing.
+        """
+        if not keys:
+            return self
+        wanted = set(keys)
+        fields = [field for field in self.fields if field[0] in wanted]
+        return RowMapper(*fields) if fields else self
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="JobLease",
+            fields=[
+                ("lock_id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("holder", models.CharField(blank=True, max_length=100)),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "job_leases",
+            },
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class JobLease(models.Model):
+    """The job runner leadership on databases without advisory locks (core.jobs)."""
+    lock_id = models.BigIntegerField(primary_key=True)
+    holder = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'job_leases'
+
+    def __str__(self):
+        return f"Lock {self.lock_id} - {self.holder or 'free'} until {self.expires_at}"
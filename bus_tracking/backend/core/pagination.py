@@ -0,0 +1,126 @@
+"""
+Keyset (cursor) pagination for API endpoints and list pages.
+
+Deep pages cost the same as the first one: no COUNT(*) and no OFFSET scan,
+just a range condition on an indexed ``(timestamp, id)`` pair.
+"""
+import base64
+from urllib.parse import urlencode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """API pagination, newest first over ``(created_at, id)``; set per view."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class KeysetPage:
+    """A single page of results, usable in templates like a Django ``Page``."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, params):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_query(self):
+        return self._query(self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(self.previous_cursor)
+
+    def _query(self, cursor):
+        params = [(k, v) for k, v in self._params if k != 'cursor']
+        params.append(('cursor', cursor))
+        return urlencode(params)
+
+
+def _encode_cursor(position, pk, reverse=False):
+    raw = f"{'b' if reverse else 'a'}|{position.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """Return ``(position, pk, reverse)`` or ``None`` for a missing/invalid cursor."""
+    if not cursor:
+        return None
+    try:
+        direction, position, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        position = parse_datetime(position)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if position is None or direction not in ('a', 'b'):
+        return None
+    return position, pk, direction == 'b'
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def keyset_paginate(request, queryset, ordering=('-created_at', '-id'), per_page=20):
+    """
+    Paginate ``queryset`` by ``ordering`` (a timestamp field and a unique
+    tie-breaker, both in the same direction) using the ``cursor`` GET param.
+    """
+    field = ordering[0].lstrip('-')
+    tie_field = ordering[1].lstrip('-')
+    descending = ordering[0].startswith('-')
+
+    cursor = _decode_cursor(request.GET.get('cursor'))
+    reverse = False
+    if cursor:
+        position, pk, reverse = cursor
+        lookup = 'lt' if descending != reverse else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': position}) |
+            Q(**{field: position, f'{tie_field}__{lookup}': pk})
+        )
+
+    order = tuple(_invert(o) for o in ordering) if reverse else ordering
+    rows = list(queryset.order_by(*order)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    # Walking backwards we came from a later page, so there is always a next one.
+    has_next = True if reverse else has_more
+    has_previous = has_more if reverse else cursor is not None
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        last = rows[-1]
+        next_cursor = _encode_cursor(getattr(last, field), getattr(last, tie_field))
+    if rows and has_previous:
+        first = rows[0]
+        previous_cursor = _encode_cursor(getattr(first, field), getattr(first, tie_field), reverse=True)
+
+    return KeysetPage(rows, next_cursor, previous_cursor, list(request.GET.items()))
@@ -0,0 +1,121 @@
+"""
+Fast JSON and binary renderers for DRF.
+
+Uses orjson when it is installed and falls back to DRF's JSONRenderer
+otherwise (and whenever an indented response is requested). MessagePack is
+only offered when the ``msgpack`` package is installed; the packed position
+format is produced by ``core.livefeed`` and passed through as is.
+
+The NDJSON and event-stream renderers frame single messages; streaming views
+use their ``frame()`` for every message they send.
+"""
+import datetime
+import decimal
+
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Serialises datetimes, dates and UUIDs natively in C. Anything orjson does
+    not know (Decimal, lazy strings, querysets, ...) goes through DRF's
+    encoder so the output matches the stock renderer.
+    """
+    _default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self._default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack with aware datetimes as the standard timestamp extension and
+    Decimals as floats. Other unknown types are encoded like the JSON renderer
+    would.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    _json_default = JSONEncoder().default
+
+    def _default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        if isinstance(obj, datetime.datetime) and obj.tzinfo is None:
+            return obj.isoformat()
+        return self._json_default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self._default, use_bin_type=True, datetime=True)
+
+
+class PackedPositionsRenderer(BaseRenderer):
+    """Fixed-width position records, see ``core.livefeed`` for the layout."""
+    media_type = 'application/vnd.bus-tracking.positions'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return data
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """One JSON document per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def frame(self, data, event=None, event_id=None):
+        return FastJSONRenderer.render(self, data) + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.frame(data)
+
+
+class EventStreamRenderer(NDJSONRenderer):
+    """Server-sent events, each message a JSON ``data`` line."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def frame(self, data, event=None, event_id=None):
+        lines = []
+        if event_id is not None:
+            lines.append(f'id: {event_id}\n'.encode())
+        if event is not None:
+            lines.append(f'event: {event}\n'.encode())
+        lines.append(b'data: ' + FastJSONRenderer.render(self, data) + b'\n\n')
+        return b''.join(lines)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.frame(data, event='error' if isinstance(data, dict) and 'error' in data else None)
+
+
+STREAM_RENDERERS = [NDJSONRenderer, EventStreamRenderer]
+
+LIVE_FEED_RENDERERS = [FastJSONRenderer, BrowsableAPIRenderer, PackedPositionsRenderer]
+if msgpack is not None:
+    LIVE_FEED_RENDERERS.insert(2, MessagePackRenderer)
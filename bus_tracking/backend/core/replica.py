@@ -0,0 +1,115 @@
+"""
+Read replica for reports and analytics.
+
+With a ``replica`` database configured, views marked ``@replica_safe`` (or
+class-based views with ``ReplicaSafeMixin``) read from it instead of the
+primary; ``core.routers.ReplicaRouter`` does the routing. Only tables kept
+on the primary are read there, telemetry keeps its own database, and every
+write still goes to the primary.
+
+Only the reports and exports are marked. The live position feeds
+(``bus_locations``, ``get_active_locations``) must show the latest pings,
+so they always read the primary.
+
+A lagging replica serves stale data, so a marked view only uses it while it
+is at most ``REPLICA_MAX_LAG`` seconds behind. The lag is checked at most
+every ``REPLICA_LAG_CHECK_INTERVAL`` seconds per process; a replica that is
+behind or cannot be reached sends the views back to the primary until the
+next check.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .singleflight import SingleFlight
+
+REPLICA_DB = 'replica'
+
+logger = logging.getLogger(__name__)
+
+_reading = ContextVar('replica_reads', default=False)
+
+
+def replica_enabled():
+    return REPLICA_DB in settings.DATABASES
+
+
+def reading_replica():
+    """Whether the current view reads from the replica."""
+    return _reading.get()
+
+
+def replica_lag():
+    """Seconds the replica is behind the primary."""
+    connection = connections[REPLICA_DB]
+    connection.ensure_connection()
+    if connection.vendor != 'postgresql':
+        # A stand-in opens the primary a second time, so it is never behind
+        return 0.0
+    with connection.cursor() as cursor:
+        # An idle primary sends no WAL: a replica that replayed all it got is current
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() "
+            "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        return float(cursor.fetchone()[0] or 0)
+
+
+class LagMonitor:
+    def __init__(self):
+        self._flights = SingleFlight(fresh_for=getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5))
+
+    def usable(self):
+        """Whether the replica is reachable and keeps up, as of the last check."""
+        return self._flights.do('lag', self._check)
+
+    def _check(self):
+        try:
+            lag = replica_lag()
+        except DatabaseError:
+            logger.warning('Replica unreachable, reading from the primary', exc_info=True)
+            return False
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 10)
+        if lag > max_lag:
+            logger.warning('Replica %.1fs behind, reading from the primary', lag)
+            return False
+        return True
+
+
+lag_monitor = LagMonitor()
+
+
+@contextmanager
+def replica_reads():
+    """Send the ORM reads of the block to the replica while it is usable."""
+    token = _reading.set(replica_enabled() and lag_monitor.usable())
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def replica_safe(view):
+    """
+    Mark a read-only view as fine with data up to ``REPLICA_MAX_LAG``
+    seconds old. Put it below ``@api_view`` and the auth decorators, so
+    that the user is still authenticated against the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaSafeMixin:
+    """``replica_safe`` for class-based views."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
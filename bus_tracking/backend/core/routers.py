@@ -0,0 +1,149 @@
+"""
+Database routing.
+
+The high-rate telemetry tables (``TELEMETRY_MODELS``: live and historical
+locations and ETAs) can live in a database of their own under the
+``telemetry`` alias, with its own connection settings, pool and WAL, away
+from users, routes, schedules and the other OLTP tables. ``TelemetryRouter``
+sends their reads, writes and migrations there when the alias is configured
+and everything else to ``default``; without it everything stays on
+``default``.
+
+Telemetry rows refer to buses, stops, drivers and journeys by plain integer
+ids without database foreign keys (``db_constraint=False``). The ORM still
+follows ``location.bus`` with a second query, but nothing may join across
+the two databases: code reading related columns goes through
+``values_across()``, and deletions that used to cascade are done by signals.
+
+``ReplicaRouter`` comes first: inside views marked replica-safe
+(core.replica; the reports, not the live feeds) it reads the tables of the
+primary from the ``replica`` alias, and it keeps every write on the primary.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+
+from .replica import REPLICA_DB, reading_replica, replica_enabled
+
+TELEMETRY_DB = 'telemetry'
+TELEMETRY_MODELS = frozenset({
+    'buses.buslocation',
+    'buses.etacalculation',
+    'locations.driverlocation',
+    'locations.locationhistory',
+})
+
+
+def telemetry_enabled():
+    return TELEMETRY_DB in settings.DATABASES
+
+
+def is_telemetry(model):
+    return model._meta.label_lower in TELEMETRY_MODELS
+
+
+def on_primary(model):
+    """Whether ``model`` is stored in the ``default`` database."""
+    return not (telemetry_enabled() and is_telemetry(model))
+
+
+def same_database(*models):
+    """Whether queries over ``models`` can be joined."""
+    return len({router.db_for_read(model) for model in models}) == 1
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_replica() and on_primary(model):
+            return REPLICA_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        if replica_enabled() and on_primary(model):
+            # Even for an instance that was read from the replica
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if replica_enabled() and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB, TELEMETRY_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return False if db == REPLICA_DB else None
+
+
+class TelemetryRouter:
+    def _database(self, model):
+        if not telemetry_enabled():
+            return None
+        # Explicit, so a bus reached from a location is not looked up next to it
+        return TELEMETRY_DB if is_telemetry(model) else DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return self._database(model)
+
+    def db_for_write(self, model, **hints):
+        return self._database(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, TELEMETRY_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not telemetry_enabled() or db not in (DEFAULT_DB_ALIAS, TELEMETRY_DB):
+            return None
+        if model_name is None:
+            # Data migrations without a model hint belong to the OLTP tables
+            return db == DEFAULT_DB_ALIAS
+        return (db == TELEMETRY_DB) == (f'{app_label}.{model_name}' in TELEMETRY_MODELS)
+
+
+def values_across(queryset, columns):
+    """
+    ``queryset.values_list(*columns)`` as a list, where columns through a
+    relation (``bus__bus_number``, ``journey__route__name``) are read with one
+    query per relation from the related model's own database instead of a
+    join. Rows whose related object is gone get ``None`` there.
+    """
+    meta = queryset.model._meta
+    local, related, getters = [], {}, []
+    for column in columns:
+        head, _, rest = column.partition('__')
+        field = meta.get_field(head) if rest else None
+        if field is not None and field.is_relation:
+            names = related.setdefault(field, [])
+            if rest not in names:
+                names.append(rest)
+            getters.append((field, names.index(rest)))
+        else:
+            if column not in local:
+                local.append(column)
+            getters.append((None, local.index(column)))
+
+    keys = list(local)
+    for field in related:
+        if field.attname not in keys:
+            keys.append(field.attname)
+    rows = list(queryset.values_list(*keys))
+
+    lookups = {}
+    for field, names in related.items():
+        position = keys.index(field.attname)
+        ids = {row[position] for row in rows} - {None}
+        fetched = field.related_model._base_manager.filter(pk__in=ids).values_list('pk', *names) if ids else ()
+        lookups[field] = (position, {pk: found for pk, *found in fetched}, [None] * len(names))
+
+    result = []
+    for row in rows:
+        values = []
+        for field, index in getters:
+            if field is None:
+                values.append(row[index])
+            else:
+                position, found, missing = lookups[field]
+                values.append(found.get(row[position], missing)[index])
+        result.append(tuple(values))
+    return result
+
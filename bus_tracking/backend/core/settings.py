@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    'core',
     'accounts',
     'buses',
     'schedules',
@@ -39,7 +41,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.authentication.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,9 +83,54 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # A file rather than shared memory, where concurrent writers in
+            # tests fail at once instead of waiting for the lock
+            'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'bus_tracking_test.sqlite3')},
         }
     }
 
+# Telemetry database (core.routers): the location and ETA tables move to a
+# database of their own when TELEMETRY_DATABASE_URL is set, or to
+# telemetry.sqlite3 next to db.sqlite3 with TELEMETRY_SQLITE=True for local
+# development; migrate it with `migrate --database=telemetry`
+TELEMETRY_DATABASE_URL = os.getenv('TELEMETRY_DATABASE_URL')
+if TELEMETRY_DATABASE_URL:
+    DATABASES['telemetry'] = dj_database_url.parse(
+        TELEMETRY_DATABASE_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    if DATABASES['telemetry']['ENGINE'] == 'django.db.backends.postgresql':
+        # Migrates the telemetry tables without foreign keys into the default database
+        DATABASES['telemetry']['ENGINE'] = 'core.backends.telemetry'
+elif os.getenv('TELEMETRY_SQLITE', 'False').lower() == 'true':
+    DATABASES['telemetry'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'telemetry.sqlite3',
+    }
+
+# Read replica (core.replica): views marked replica_safe read from it when
+# REPLICA_DATABASE_URL is set, or from a second connection to the primary as
+# a stand-in with REPLICA_STANDIN=True; they read the primary instead while it
+# is more than REPLICA_MAX_LAG seconds behind, checked at most every
+# REPLICA_LAG_CHECK_INTERVAL seconds
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        REPLICA_DATABASE_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+elif os.getenv('REPLICA_STANDIN', 'False').lower() == 'true':
+    DATABASES['replica'] = dict(DATABASES['default'])
+if 'replica' in DATABASES:
+    # Tests read the replica through the test primary
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+REPLICA_MAX_LAG = 10
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter', 'core.routers.TelemetryRouter']
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -111,7 +158,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -136,5 +187,97 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'accounts:dashboard'
 LOGOUT_REDIRECT_URL = 'accounts:login'
 
+# Shared by the worker processes on a host; logouts and user changes are
+# published here (accounts.authentication). Point it at Redis or Memcached
+# when the app runs on several hosts
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bus_tracking_cache')),
+    }
+}
+
+# Resolved token/session -> user entries, per worker process
+AUTH_CACHE_TTL = 30
+AUTH_CACHE_MAX_ENTRIES = 2048
+
+# Cached active journey/bus/route ids per driver for the ping path
+DRIVER_CONTEXT_TTL = 60
+
+# Seconds a live feed snapshot is reused by concurrent polls before the
+# fleet version is checked again
+LIVE_FEED_FRESHNESS = 1
+
+# Nearby buses/stops indexes: bus positions older than this (seconds) are
+# left out, the stop index is rebuilt at least this often (seconds)
+NEARBY_BUS_MAX_AGE = 120
+STOP_INDEX_TTL = 300
+
+# Housekeeping jobs (core.jobs) run in their own process (manage.py run_jobs);
+# JOBS_AUTOSTART also starts a runner in every web worker. Only the runner
+# holding the leader lock does work. Without PostgreSQL the lock is a lease
+# that others can take once unrenewed for JOBS_LEASE_TTL seconds
+JOBS_AUTOSTART = os.getenv('JOBS_AUTOSTART', 'False').lower() == 'true'
+JOBS_LEASE_TTL = 60
+JOURNEY_STALE_AFTER = 30 * 60
+# Journey statistics (locations.odometer): moves shorter than this many
+# metres are GPS jitter; running totals are written every CHECKPOINT seconds
+JOURNEY_ODOMETER_GATE = 10
+JOURNEY_STATS_CHECKPOINT = 60
+ETA_RETENTION = 60 * 60
+
 GPS_UPDATE_INTERVAL = 5
+# Driver clients ping at the interval (seconds) each location update response
+# recommends: between these bounds, often enough to leave a point every
+# GPS_PING_SPACING metres, fastest near a route stop, and stretched when a
+# worker takes more than INGEST_TARGET_RATE pings per second
+GPS_MIN_UPDATE_INTERVAL = 2
+GPS_MAX_UPDATE_INTERVAL = 15
+GPS_PING_SPACING = 75
+GPS_NEAR_STOP_METERS = 250
+INGEST_TARGET_RATE = 50
+# Stop geofences (schedules.geofence): a bus arrives within this many metres
+# of a stop and departs once it is EXIT_FACTOR times as far; pings are checked
+# against the next LOOKAHEAD stops of the route
+GEOFENCE_RADIUS_METERS = 50
+GEOFENCE_EXIT_FACTOR = 1.5
+GEOFENCE_LOOKAHEAD = 3
+# Delay alerts: raised automatically once a bus runs this many minutes late,
+# one alert per bus and route updated in place while it was touched within
+# the window (seconds), re-surfaced as unread every STEP minutes of delay
+DELAY_ALERT_MINUTES = 5
+DELAY_NOTIFICATION_STEP = 5
+DELAY_NOTIFICATION_WINDOW = 30 * 60
 ETA_CALCULATION_BUFFER = 1.2
+# Pings only queue their bus; ETAs are recomputed in the background at most
+# once per bus per interval (seconds)
+ETA_RECOMPUTE_INTERVAL = 1
+# Bus trail/location history compression: a smoothed ping is stored only when
+# it strays this many metres from the dead-reckoned path, or this many
+# seconds after the last stored one. The live location takes every ping, and
+# the bus trail one at least every BUS_POSITION_HEARTBEAT seconds.
+GPS_DEADBAND_METERS = 15
+GPS_DEADBAND_MAX_INTERVAL = 30
+BUS_POSITION_HEARTBEAT = 10
+
+# Telemetry segment log (locations.segments): when a directory is set, stored
+# pings are appended to hourly fixed-width segment files there instead of the
+# location history table. Every STRIDE-th record of a bus is indexed;
+# segments older than the retention (hours) are deleted, once the Parquet
+# archive holds their day when it is configured.
+TELEMETRY_SEGMENT_DIR = os.getenv('TELEMETRY_SEGMENT_DIR')
+TELEMETRY_INDEX_STRIDE = 64
+TELEMETRY_SEGMENT_RETENTION_HOURS = 24 * 90
+
+# Parquet archive of the location tables (reports.archive): closed days are
+# exported to this directory (needs pyarrow; DuckDB is optional), the job
+# catches up on the last LOOKBACK_DAYS days
+LOCATION_ARCHIVE_DIR = os.getenv('LOCATION_ARCHIVE_DIR')
+LOCATION_ARCHIVE_LOOKBACK_DAYS = 7
+
+# Journey replay (locations.replay): trails are read this many rows per
+# journey at a time; a response carries at most PAGE_SIZE positions and ends
+# with the cursor to continue from
+REPLAY_CHUNK_SIZE = 500
+REPLAY_PAGE_SIZE = 5000
+REPLAY_MAX_JOURNEYS = 500
@@ -0,0 +1,117 @@
+"""
+Single-flight call coalescing.
+
+When several callers ask for the same key at once, only the first one runs
+the computation and the others wait for its result. A finished result keeps
+being handed out for ``fresh_for`` seconds, so a burst of identical polls
+costs one computation. Failures are never reused.
+
+``SingleFlight`` is for threaded workers (gunicorn sync/gthread, and the
+thread pool Django runs sync views in under ASGI); ``AsyncSingleFlight``
+coalesces coroutines running on one event loop.
+"""
+import asyncio
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'finished_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+def _expired(finished_at, fresh_for, now):
+    return finished_at is not None and now - finished_at >= fresh_for
+
+
+class SingleFlight:
+    """Thread-based single-flight group."""
+
+    def __init__(self, fresh_for=0):
+        self.fresh_for = fresh_for
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return ``fn()``, sharing the result with concurrent callers of ``key``."""
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None or _expired(call.finished_at, self.fresh_for, now)
+            if leader:
+                self._prune(now)
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as exc:
+                call.error = exc
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+            finally:
+                call.finished_at = time.monotonic()
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def forget(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def _prune(self, now):
+        for key in [k for k, c in self._calls.items() if _expired(c.finished_at, self.fresh_for, now)]:
+            del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """Single-flight group for coroutines on one event loop."""
+
+    def __init__(self, fresh_for=0):
+        self.fresh_for = fresh_for
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Return ``await fn()``, sharing it with concurrent callers of ``key``."""
+        now = time.monotonic()
+        entry = self._calls.get(key)
+        if entry is not None and not _expired(entry[1], self.fresh_for, now):
+            return await asyncio.shield(entry[0])
+
+        for stale in [k for k, e in self._calls.items() if _expired(e[1], self.fresh_for, now)]:
+            del self._calls[stale]
+        entry = [asyncio.get_running_loop().create_future(), None]
+        self._calls[key] = entry
+        future = entry[0]
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._discard(key, entry)
+            future.cancel()
+            raise
+        except Exception as exc:
+            self._discard(key, entry)
+            future.set_exception(exc)
+            # Waiters re-raise it; stop asyncio logging it as unretrieved
+            future.exception()
+            raise
+        future.set_result(result)
+        entry[1] = time.monotonic()
+        return result
+
+    def forget(self, key):
+        self._calls.pop(key, None)
+
+    def _discard(self, key, entry):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
@@ -0,0 +1,126 @@
+"""
+In-memory uniform grid index for "what is near this point" queries.
+
+Points are bucketed into ``cell_deg`` x ``cell_deg`` cells. A query walks
+rings of cells outwards from the query point and stops as soon as the ``k``
+closest points found so far are nearer than anything the next ring could
+hold, or the radius is exhausted. When the radius spans more cells than
+there are points (sparse index) every point is measured instead.
+"""
+import heapq
+import math
+import threading
+from operator import itemgetter
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.32
+
+MAX_NEARBY_RADIUS_KM = 25
+MAX_NEARBY_RESULTS = 50
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def put(self, key, lat, lng, item):
+        """Insert or move ``key``."""
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+        with self._lock:
+            old = self._points.get(key)
+            if old is not None and old[0] != cell:
+                self._discard(key, old[0])
+            self._points[key] = (cell, lat, lng, item)
+            self._cells.setdefault(cell, {})[key] = (lat, lng, item)
+
+    def remove(self, key):
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is not None:
+                self._discard(key, old[0])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def _discard(self, key, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def nearest(self, lat, lng, k=5, radius_km=2.0):
+        """Up to ``k`` ``(distance_km, item)`` pairs within ``radius_km``, closest first."""
+        lat, lng = float(lat), float(lng)
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        rings = math.ceil(max(dlat, dlng) / self.cell_deg)
+        # Points in ring r are at least r - 1 cells away (the narrow side of a cell)
+        ring_km = self.cell_deg * KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)
+
+        found = []
+        with self._lock:
+            if (2 * rings + 1) ** 2 > len(self._points):
+                self._measure(lat, lng, radius_km, (p[1:] for p in self._points.values()), found)
+                return heapq.nsmallest(k, found, key=itemgetter(0))
+
+            row0, col0 = self._cell(lat, lng)
+            for ring in range(rings + 1):
+                if len(found) >= k and heapq.nsmallest(k, found, key=itemgetter(0))[-1][0] <= (ring - 1) * ring_km:
+                    break
+                self._measure(lat, lng, radius_km, self._ring_points(row0, col0, ring), found)
+        return heapq.nsmallest(k, found, key=itemgetter(0))
+
+    def _ring_points(self, row0, col0, ring):
+        """Points in the cells exactly ``ring`` cells away from ``(row0, col0)``."""
+        for row in range(row0 - ring, row0 + ring + 1):
+            edge = row in (row0 - ring, row0 + ring)
+            for col in (range(col0 - ring, col0 + ring + 1) if edge else (col0 - ring, col0 + ring)):
+                bucket = self._cells.get((row, col))
+                if bucket:
+                    yield from bucket.values()
+
+    @staticmethod
+    def _measure(lat, lng, radius_km, points, found):
+        for p_lat, p_lng, item in points:
+            distance = haversine_km(lat, lng, p_lat, p_lng)
+            if distance <= radius_km:
+                found.append((distance, item))
+
+
+def parse_nearby_params(request):
+    """
+    ``(lat, lng, k, radius_km)`` from ``?lat=&lng=&k=&radius=``; raises
+    ValueError with a user-facing message when they are missing or invalid.
+    """
+    params = request.query_params
+    try:
+        lat = float(params['lat'])
+        lng = float(params['lng'])
+        k = int(params.get('k', 5))
+        radius = float(params.get('radius', 2))
+    except (KeyError, ValueError):
+        raise ValueError('lat and lng are required; k and radius (km) must be numbers')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('lat/lng out of range')
+    if not 0 < radius <= MAX_NEARBY_RADIUS_KM:
+        raise ValueError(f'radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km')
+    return lat, lng, min(max(k, 1), MAX_NEARBY_RESULTS), radius
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from datetime import timedelta
+
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from accounts.models import User
+from buses.models import Bus, ETACalculation
+from locations.models import DriverLocation
+from schedules.models import Route, Stop
+
+from .singleflight import AsyncSingleFlight
+from .upsert import bulk_upsert, upsert
+
+
+class ConcurrentUpsertTests(TransactionTestCase):
+    """Writers racing on the same key must neither fail nor duplicate the row."""
+
+    threads = 8
+    rounds = 5
+
+    def race(self, write):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(self.rounds):
+                    barrier.wait()
+                    write(n, i)
+            except Exception as exc:
+                errors.append(exc)
+                barrier.abort()
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_driver_location(self):
+        driver = User.objects.create_user('driver', password='x', role='driver')
+
+        def write(n, i):
+            upsert(
+                DriverLocation, ['driver'],
+                driver_id=driver.pk, latitude=23.8 + n / 1000, longitude=90.4, is_sharing=True
+            )
+
+        self.race(write)
+        self.assertEqual(DriverLocation.objects.filter(driver=driver).count(), 1)
+
+    def test_route_etas(self):
+        bus = Bus.objects.create(bus_number='B1', license_plate='DHA-1')
+        route = Route.objects.create(name='R1')
+        stops = [
+            Stop.objects.create(route=route, name=f'S{order}', latitude=23.8, longitude=90.4, order=order)
+            for order in range(3)
+        ]
+
+        def write(n, i):
+            now = timezone.now()
+            bulk_upsert(ETACalculation, [
+                ETACalculation(
+                    bus=bus, stop=stop, calculated_eta=now + timedelta(minutes=n),
+                    scheduled_time=now, distance_km=n,
+                )
+                for stop in stops
+            ], ['bus', 'stop'])
+
+        self.race(write)
+        self.assertEqual(ETACalculation.objects.filter(bus=bus).count(), len(stops))
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    """Concurrent coroutines asking for one key share a single computation."""
+
+    def test_concurrent_callers_share_one_call(self):
+        group = AsyncSingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def main():
+            return await asyncio.gather(*(group.do('feed', compute) for _ in range(10)))
+
+        self.assertEqual(asyncio.run(main()), [1] * 10)
+        self.assertEqual(len(calls), 1)
+
+    def test_keys_are_separate(self):
+        group = AsyncSingleFlight()
+
+        async def main():
+            async def compute(key):
+                await asyncio.sleep(0.01)
+                return key
+            return await asyncio.gather(
+                group.do('a', lambda: compute('a')), group.do('b', lambda: compute('b')),
+            )
+
+        self.assertEqual(asyncio.run(main()), ['a', 'b'])
+
+    def test_failure_is_shared_but_not_reused(self):
+        group = AsyncSingleFlight(fresh_for=60)
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        async def main():
+            results = await asyncio.gather(*(group.do('feed', fail) for _ in range(3)), return_exceptions=True)
+            self.assertTrue(all(isinstance(r, ValueError) for r in results))
+            with self.assertRaises(ValueError):
+                await group.do('feed', fail)
+
+        asyncio.run(main())
+        self.assertEqual(len(calls), 2)
+
+    def test_result_reused_while_fresh(self):
+        group = AsyncSingleFlight(fresh_for=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return len(calls)
+
+        async def main():
+            first = await group.do('feed', compute)
+            second = await group.do('feed', compute)
+            group.forget('feed')
+            return first, second, await group.do('feed', compute)
+
+        self.assertEqual(asyncio.run(main()), (1, 1, 2))
@@ -0,0 +1,49 @@
+"""
+Single-statement upserts (``INSERT ... ON CONFLICT DO UPDATE``).
+
+``update_or_create`` is a SELECT followed by an UPDATE or INSERT, so it costs
+two round-trips and two concurrent callers can both miss the SELECT and race
+into an IntegrityError. These helpers let the database resolve the conflict
+instead, on PostgreSQL and SQLite alike. ``unique_fields`` must be covered by
+a unique constraint.
+
+Like ``bulk_create``, they skip ``save()`` and model signals, and the primary
+key of the returned objects is not set.
+"""
+
+
+def _update_fields(model, unique_fields, names=None):
+    """Field names to overwrite on conflict: ``names`` (or every concrete
+    field) minus the conflict target, plus ``auto_now`` timestamps."""
+    unique = {model._meta.get_field(name).name for name in unique_fields}
+    fields = []
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.name in unique or getattr(field, 'auto_now_add', False):
+            continue
+        if names is None or field.name in names or field.attname in names or getattr(field, 'auto_now', False):
+            fields.append(field.name)
+    return fields
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields=None):
+    """Insert ``objs``, overwriting ``update_fields`` of rows that already exist."""
+    objs = list(objs)
+    if objs:
+        model.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=_update_fields(model, unique_fields, update_fields),
+        )
+    return objs
+
+
+def upsert(model, unique_fields, **values):
+    """
+    Insert a row from ``values`` or, if one with the same ``unique_fields``
+    exists, overwrite only the fields given in ``values`` (and ``auto_now``
+    timestamps) and keep the rest.
+    """
+    obj = model(**values)
+    bulk_upsert(model, [obj], unique_fields, update_fields=set(values))
+    return obj
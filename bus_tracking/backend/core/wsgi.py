@@ -1,5 +1,10 @@
 import os
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 application = get_wsgi_application()
+
+if settings.JOBS_AUTOSTART:
+    from core.jobs import start_background_runner
+    start_background_runner()
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from buses.models import BusAssignment
+from core.pagination import CreatedAtCursorPagination
 from .models import Issue
 from .serializers import IssueSerializer, IssueCreateSerializer
 
@@ -20,8 +21,10 @@ def issue_list_api(request):
     if status_filter:
         issues = issues.filter(status=status_filter)
     
-    serializer = IssueSerializer(issues.order_by('-created_at')[:50], many=True)
-    return Response(serializer.data)
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(issues.select_related('reported_by', 'bus', 'route'), request)
+    serializer = IssueSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
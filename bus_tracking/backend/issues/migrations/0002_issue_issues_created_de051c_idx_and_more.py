@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("issues", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="issues_created_de051c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                fields=["reported_by", "-created_at", "-id"],
+                name="issues_reporte_09ecc9_idx",
+            ),
+        ),
+    ]
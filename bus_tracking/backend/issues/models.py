@@ -45,6 +45,10 @@ class Issue(models.Model):
     class Meta:
         db_table = 'issues'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['reported_by', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.get_issue_type_display()} - {self.reported_by.username}"
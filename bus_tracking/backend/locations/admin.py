@@ -1,13 +1,27 @@
 from django.contrib import admin
-from .models import DriverLocation, LocationHistory
+from django.db.models import Q
+from accounts.models import User
+from .models import DriverLocation, JourneyTrajectory, LocationHistory
 
 @admin.register(DriverLocation)
 class DriverLocationAdmin(admin.ModelAdmin):
     list_display = ('driver', 'is_sharing', 'latitude', 'longitude', 'last_updated', 'is_active')
+    # Telemetry (core.routers): related rows are not joined
+    list_select_related = ()
     list_filter = ('is_sharing',)
     search_fields = ('driver__username', 'driver__first_name', 'driver__last_name')
     readonly_fields = ('last_updated',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Drivers may be in another database (core.routers): search them there
+        if not search_term:
+            return queryset, False
+        drivers = User.objects.filter(
+            Q(username__icontains=search_term) | Q(first_name__icontains=search_term)
+            | Q(last_name__icontains=search_term)
+        ).values_list('id', flat=True)
+        return queryset.filter(driver_id__in=list(drivers)), False
+
     def is_active(self, obj):
         return obj.is_active
     is_active.boolean = True
@@ -16,5 +30,14 @@ class DriverLocationAdmin(admin.ModelAdmin):
 @admin.register(LocationHistory)
 class LocationHistoryAdmin(admin.ModelAdmin):
     list_display = ('driver', 'latitude', 'longitude', 'timestamp')
+    # Telemetry (core.routers): related rows are not joined
+    list_select_related = ()
     list_filter = ('driver', 'timestamp')
     date_hierarchy = 'timestamp'
+
+
+@admin.register(JourneyTrajectory)
+class JourneyTrajectoryAdmin(admin.ModelAdmin):
+    list_display = ('journey', 'point_count', 'size', 'created_at')
+    exclude = ('data',)
+    readonly_fields = ('journey', 'point_count', 'created_at')
@@ -7,6 +7,7 @@ urlpatterns = [
     path('journey/end/', api_views.end_journey, name='api_end_journey'),
     path('journey/delay/', api_views.report_delay, name='api_report_delay'),
     path('journey/<int:journey_id>/path/', api_views.get_journey_path, name='api_journey_path'),
+    path('journey/replay/', api_views.replay_journeys, name='api_journey_replay'),
     
     # Location tracking
     path('location/update/', api_views.update_location, name='api_update_location'),
@@ -14,4 +15,5 @@ urlpatterns = [
     path('location/stop/', api_views.stop_sharing, name='api_stop_sharing'),
     path('location/active/', api_views.get_active_locations, name='api_active_locations'),
     path('location/status/', api_views.get_my_location_status, name='api_location_status'),
+    path('ingest/metrics/', api_views.ingest_metrics, name='api_ingest_metrics'),
 ]
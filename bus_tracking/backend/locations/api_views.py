@@ -1,13 +1,59 @@
+import itertools
+
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from core.fieldsets import requested_fields, wants_compact
+from core.livefeed import MS_TO_CMS, live_feed_response
+from core.mappers import RowMapper
+from core.renderers import LIVE_FEED_RENDERERS, STREAM_RENDERERS
+from core.routers import values_across
+from core.upsert import upsert
+from .ingest import DRIVER_PIPELINE, PIPELINES, IngestError, Ping, deadband
+from .odometer import odometer
+from .replay import archived_trajectory, decode_cursor, journey_points, replay
+from .segments import segment_log
 from .models import DriverLocation, LocationHistory
-from .serializers import DriverLocationSerializer, LocationUpdateSerializer
+from .serializers import DriverLocationSerializer
 from buses.models import Journey, BusAssignment
+from buses.driver_context import get_driver_context, remember_journey, forget_driver
+from buses.eta_queue import eta_queue
 from notifications.models import Notification
 
+def _display_name(first_name, last_name, username):
+    return f'{first_name} {last_name}'.strip() or username
+
+
+ACTIVE_LOCATION_ROW = RowMapper(
+    ('driver_id', 'driver_id'),
+    ('driver_name', ('driver__first_name', 'driver__last_name', 'driver__username'), _display_name),
+    ('latitude', 'latitude', float),
+    ('longitude', 'longitude', float),
+    ('heading', 'heading'),
+    ('speed', 'speed'),
+    ('last_updated', 'last_updated'),
+    # get_active_drivers() only returns sharing drivers seen in the last 60s
+    ('is_active', (), lambda: True),
+    ('bus_number', 'journey__bus__bus_number'),
+    ('route_name', 'journey__route__name'),
+    ('route_id', 'journey__route_id'),
+    ('journey_id', 'journey_id'),
+    ('journey_start', 'journey__start_time'),
+)
+
+PATH_POINT_ROW = RowMapper(
+    ('lat', 'latitude', float),
+    ('lng', 'longitude', float),
+    ('timestamp', 'timestamp'),
+)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_journey(request):
@@ -18,17 +64,11 @@ def start_journey(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Check for existing active journey
-    active_journey = Journey.get_active_journey(request.user)
-    if active_journey:
-        return Response({
-            'error': 'You already have an active journey',
-            'journey_id': active_journey.id
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
     # Get active assignment
     try:
-        assignment = BusAssignment.objects.get(driver=request.user, is_active=True)
+        assignment = BusAssignment.objects.select_related('bus', 'route').get(
+            driver=request.user, is_active=True
+        )
     except BusAssignment.DoesNotExist:
         return Response({
             'error': 'No active bus assignment found'
@@ -38,29 +78,41 @@ def start_journey(request):
     latitude = request.data.get('latitude')
     longitude = request.data.get('longitude')
     
-    # Create journey
-    journey = Journey.objects.create(
-        driver=request.user,
-        bus=assignment.bus,
-        route=assignment.route,
-        assignment=assignment,
-        status='active',
-        start_latitude=latitude,
-        start_longitude=longitude
-    )
+    # Create journey; the unique_active_journey_per_driver constraint rejects
+    # a second active journey
+    try:
+        with transaction.atomic():
+            journey = Journey.objects.create(
+                driver=request.user,
+                bus=assignment.bus,
+                route=assignment.route,
+                assignment=assignment,
+                status='active',
+                start_latitude=latitude,
+                start_longitude=longitude
+            )
+    except IntegrityError:
+        active_journey = Journey.get_active_journey(request.user)
+        if not active_journey:
+            raise
+        return Response({
+            'error': 'You already have an active journey',
+            'journey_id': active_journey.id
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     # Create/update driver location with journey reference
-    location, created = DriverLocation.objects.update_or_create(
+    upsert(
+        DriverLocation, ['driver'],
         driver=request.user,
-        defaults={
-            'latitude': latitude or 0,
-            'longitude': longitude or 0,
-            'is_sharing': True,
-            'session_started': timezone.now(),
-            'journey': journey
-        }
+        latitude=latitude or 0,
+        longitude=longitude or 0,
+        is_sharing=True,
+        session_started=timezone.now(),
+        journey=journey
     )
     
+    remember_journey(journey)
+    
     # Create notification for journey start
     Notification.create_journey_notification(journey, 'journey_start', request.user)
     
@@ -99,7 +151,11 @@ def end_journey(request):
     journey.end_time = timezone.now()
     journey.end_latitude = latitude
     journey.end_longitude = longitude
-    journey.save()
+    # Leave the statistics columns to the odometer, which may be adding to them
+    journey.save(update_fields=['status', 'end_time', 'end_latitude', 'end_longitude'])
+    forget_driver(request.user.pk)
+    deadband.forget(request.user.pk)
+    odometer.finish(journey)
     
     # Stop location sharing
     try:
@@ -119,7 +175,11 @@ def end_journey(request):
         'status': 'success',
         'message': 'Journey ended',
         'journey_id': journey.id,
-        'duration_minutes': duration
+        'duration_minutes': duration,
+        'distance_km': journey.distance_km,
+        'avg_speed_kmh': journey.avg_speed_kmh,
+        'max_speed_kmh': journey.max_speed_kmh,
+        'idle_minutes': journey.idle_minutes
     })
 
 
@@ -133,44 +193,23 @@ def update_location(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Check for active journey
-    journey = Journey.get_active_journey(request.user)
-    if not journey:
-        return Response({
-            'error': 'No active journey. Start a journey first.'
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
-    serializer = LocationUpdateSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    data = serializer.validated_data
-    
-    # Update or create driver location
-    location, created = DriverLocation.objects.update_or_create(
-        driver=request.user,
-        defaults={
-            'latitude': data['latitude'],
-            'longitude': data['longitude'],
-            'accuracy': data.get('accuracy'),
-            'heading': data.get('heading'),
-            'speed': data.get('speed'),
-            'is_sharing': True,
-            'journey': journey
-        }
-    )
+    try:
+        ping = DRIVER_PIPELINE.run(Ping(request.user, request.data))
+    except IngestError as exc:
+        return Response(exc.detail, status=exc.status)
     
-    # Store in history for analytics
-    LocationHistory.objects.create(
-        driver=request.user,
-        latitude=data['latitude'],
-        longitude=data['longitude']
-    )
+    if ping is None:
+        return Response({
+            'status': 'success',
+            'message': 'Duplicate location ignored',
+            'next_interval': getattr(settings, 'GPS_UPDATE_INTERVAL', 5)
+        })
     
     return Response({
         'status': 'success',
         'message': 'Location updated',
-        'timestamp': location.last_updated.isoformat()
+        'timestamp': ping.recorded_at.isoformat(),
+        'next_interval': ping.next_interval
     })
 
 
@@ -190,38 +229,41 @@ def stop_sharing(request):
     return end_journey(request)
 
 
+def active_locations_version():
+    """
+    Changes whenever a sharing driver pings, starts or stops sharing, and
+    every GPS interval so drivers drop off once their last ping is too old.
+    """
+    sharing = DriverLocation.objects.filter(is_sharing=True).aggregate(
+        latest=Max('last_updated'), count=Count('id')
+    )
+    interval = getattr(settings, 'GPS_UPDATE_INTERVAL', 5)
+    return sharing['latest'], sharing['count'], int(timezone.now().timestamp()) // interval
+
+
 @api_view(['GET'])
+@renderer_classes(LIVE_FEED_RENDERERS)
 @permission_classes([IsAuthenticated])
 def get_active_locations(request):
     """Get all active driver locations with journey info."""
-    # Expire stale locations first
-    DriverLocation.expire_inactive()
-    
-    active_locations = DriverLocation.get_active_drivers()
-    
-    result = []
-    for loc in active_locations:
-        data = {
-            'driver_id': loc.driver.id,
-            'driver_name': loc.driver.get_full_name() or loc.driver.username,
-            'latitude': float(loc.latitude),
-            'longitude': float(loc.longitude),
-            'heading': loc.heading,
-            'speed': loc.speed,
-            'last_updated': loc.last_updated.isoformat(),
-            'is_active': loc.is_active,
-        }
-        
-        if loc.journey:
-            data['bus_number'] = loc.journey.bus.bus_number
-            data['route_name'] = loc.journey.route.name
-            data['route_id'] = loc.journey.route.id
-            data['journey_id'] = loc.journey.id
-            data['journey_start'] = loc.journey.start_time.isoformat()
-        
-        result.append(data)
+    # Stale locations are expired by the locations.jobs sweeper; this stays a pure read
+    mapper = ACTIVE_LOCATION_ROW.select(requested_fields(request))
+    
+    def build_data():
+        rows = values_across(DriverLocation.get_active_drivers(), mapper.columns)
+        if wants_compact(request):
+            return mapper.map_compact(rows)
+        return mapper.map_all(rows)
+    
+    def build_positions():
+        rows = DriverLocation.get_active_drivers().values_list(
+            'driver_id', 'latitude', 'longitude', 'heading', 'speed', 'last_updated'
+        )
+        return rows, MS_TO_CMS
     
-    return Response(result)
+    return live_feed_response(
+        request, 'active_locations', active_locations_version, build_data, build_positions
+    )
 
 
 @api_view(['GET'])
@@ -235,30 +277,36 @@ def get_my_location_status(request):
         )
     
     # Check for active journey
-    journey = Journey.get_active_journey(request.user)
+    context = get_driver_context(request.user)
     
     try:
         location = DriverLocation.objects.get(driver=request.user)
-        return Response({
-            'is_sharing': location.is_sharing,
-            'is_active': location.is_active,
-            'has_active_journey': journey is not None,
-            'journey_id': journey.id if journey else None,
-            'bus_number': journey.bus.bus_number if journey else None,
-            'route_name': journey.route.name if journey else None,
-            'journey_start': journey.start_time.isoformat() if journey else None,
-            'last_updated': location.last_updated.isoformat() if location.last_updated else None,
-            'session_started': location.session_started.isoformat() if location.session_started else None
-        })
     except DriverLocation.DoesNotExist:
         return Response({
             'is_sharing': False,
             'is_active': False,
-            'has_active_journey': journey is not None,
-            'journey_id': journey.id if journey else None,
+            'has_active_journey': context is not None,
+            'journey_id': context.journey_id if context else None,
             'last_updated': None,
             'session_started': None
         })
+    
+    if context and location.journey_id != context.journey_id:
+        # The live location points elsewhere, so the cached context is stale
+        forget_driver(request.user.pk)
+        context = get_driver_context(request.user)
+    
+    return Response({
+        'is_sharing': location.is_sharing,
+        'is_active': location.is_active,
+        'has_active_journey': context is not None,
+        'journey_id': context.journey_id if context else None,
+        'bus_number': context.bus_number if context else None,
+        'route_name': context.route_name if context else None,
+        'journey_start': context.journey_start.isoformat() if context else None,
+        'last_updated': location.last_updated.isoformat() if location.last_updated else None,
+        'session_started': location.session_started.isoformat() if location.session_started else None
+    })
 
 
 @api_view(['POST'])
@@ -271,22 +319,37 @@ def report_delay(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    journey = Journey.get_active_journey(request.user)
+    context = get_driver_context(request.user)
+    journey = None
+    if context:
+        journey = Journey.objects.select_related('bus', 'route').filter(
+            pk=context.journey_id, status='active'
+        ).first()
+        if journey is None:
+            forget_driver(request.user.pk)
+            journey = Journey.get_active_journey(request.user)
+    
     if not journey:
         return Response({
             'error': 'No active journey'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    delay_minutes = request.data.get('delay_minutes', 10)
+    try:
+        delay_minutes = int(request.data.get('delay_minutes', 10))
+    except (TypeError, ValueError):
+        return Response({
+            'error': 'delay_minutes must be a whole number'
+        }, status=status.HTTP_400_BAD_REQUEST)
     reason = request.data.get('reason', '')
     
-    # Create delay notification
+    # Updates the bus's open delay alert rather than adding another
     Notification.create_delay_notification(
         driver=request.user,
         bus=journey.bus,
         route=journey.route,
         delay_minutes=delay_minutes,
-        reason=reason
+        reason=reason,
+        journey=journey
     )
     
     return Response({
@@ -306,28 +369,31 @@ def get_journey_path(request, journey_id):
         )
     
     try:
-        journey = Journey.objects.get(id=journey_id)
+        journey = Journey.objects.select_related('driver', 'bus', 'route', 'trajectory').get(id=journey_id)
     except Journey.DoesNotExist:
         return Response({
             'error': 'Journey not found'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    # Get location history for this journey's time range
-    locations = LocationHistory.objects.filter(
-        driver=journey.driver,
-        timestamp__gte=journey.start_time
-    )
-    
-    if journey.end_time:
-        locations = locations.filter(timestamp__lte=journey.end_time)
-    
-    locations = locations.order_by('timestamp')
-    
-    path = [{
-        'lat': float(loc.latitude),
-        'lng': float(loc.longitude),
-        'timestamp': loc.timestamp.isoformat()
-    } for loc in locations]
+    mapper = PATH_POINT_ROW.select(requested_fields(request))
+    if segment_log is not None or archived_trajectory(journey) is not None:
+        points = (
+            {'latitude': latitude, 'longitude': longitude, 'timestamp': timestamp}
+            for timestamp, _, _, latitude, longitude in journey_points(journey)
+        )
+        rows = [tuple(point[column] for column in mapper.columns) for point in points]
+    else:
+        # Get location history for this journey's time range
+        locations = LocationHistory.objects.filter(
+            driver=journey.driver,
+            timestamp__gte=journey.start_time
+        )
+        
+        if journey.end_time:
+            locations = locations.filter(timestamp__lte=journey.end_time)
+        
+        rows = locations.order_by('timestamp').values_list(*mapper.columns)
+    path = mapper.map_compact(rows) if wants_compact(request) else mapper.map_all(rows)
     
     return Response({
         'journey_id': journey.id,
@@ -337,5 +403,116 @@ def get_journey_path(request, journey_id):
         'start_time': journey.start_time.isoformat(),
         'end_time': journey.end_time.isoformat() if journey.end_time else None,
         'status': journey.status,
+        'distance_km': journey.distance_km,
+        'avg_speed_kmh': journey.avg_speed_kmh,
+        'max_speed_kmh': journey.max_speed_kmh,
+        'idle_seconds': journey.idle_seconds,
+        'point_count': journey.point_count,
         'path': path
     })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(STREAM_RENDERERS)
+def replay_journeys(request):
+    """
+    Stream the stored positions of ``?journeys=1,2`` or of every journey
+    started on ``?date=YYYY-MM-DD`` (optionally narrowed to one ``route`` or
+    ``bus``) in timestamp order, as NDJSON or server-sent events, for the
+    client to play back from their timestamps. A response stops after
+    REPLAY_PAGE_SIZE positions with an ``end`` event whose ``next`` cursor,
+    passed as ``?after=`` (or ``Last-Event-ID``), continues the stream.
+    """
+    if request.user.role not in ['admin', 'authority']:
+        return Response(
+            {'error': 'Only admin and authority can replay journeys'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    journeys = Journey.objects.select_related('driver', 'bus', 'route')
+    try:
+        if request.GET.get('journeys'):
+            journeys = journeys.filter(id__in=[int(pk) for pk in request.GET['journeys'].split(',')])
+        elif request.GET.get('date') and parse_date(request.GET['date']):
+            journeys = journeys.filter(start_time__date=parse_date(request.GET['date']))
+            if request.GET.get('route'):
+                journeys = journeys.filter(route_id=int(request.GET['route']))
+            if request.GET.get('bus'):
+                journeys = journeys.filter(bus_id=int(request.GET['bus']))
+        else:
+            return Response({
+                'error': 'Give journey ids or a date (YYYY-MM-DD)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({
+            'error': 'Journey, route and bus ids must be integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    max_journeys = getattr(settings, 'REPLAY_MAX_JOURNEYS', 500)
+    journeys = list(journeys.order_by('start_time', 'id')[:max_journeys + 1])
+    if not journeys:
+        return Response({
+            'error': 'No journeys found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    if len(journeys) > max_journeys:
+        return Response({
+            'error': f'At most {max_journeys} journeys can be replayed at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    after = decode_cursor(request.headers.get('Last-Event-ID') or request.GET.get('after'))
+    renderer = request.accepted_renderer
+    page_size = getattr(settings, 'REPLAY_PAGE_SIZE', 5000)
+
+    def stream():
+        yield renderer.frame({
+            'type': 'journeys',
+            'journeys': [{
+                'id': journey.id,
+                'driver': journey.driver.get_full_name() or journey.driver.username,
+                'bus_number': journey.bus.bus_number,
+                'route_name': journey.route.name,
+                'start_time': journey.start_time,
+                'end_time': journey.end_time,
+            } for journey in journeys],
+        }, event='journeys')
+
+        buffered, points, cursor = [], 0, None
+        positions = replay(journeys, after)
+        for cursor, point in itertools.islice(positions, page_size):
+            buffered.append(renderer.frame({'type': 'position', **point}, event='position', event_id=cursor))
+            points += 1
+            if len(buffered) >= 100:
+                yield b''.join(buffered)
+                buffered = []
+        more = points == page_size and next(positions, None) is not None
+        buffered.append(renderer.frame({
+            'type': 'end', 'points': points, 'next': cursor if more else None,
+        }, event='end'))
+        yield b''.join(buffered)
+
+    response = StreamingHttpResponse(stream(), content_type=renderer.media_type)
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ingest_metrics(request):
+    """
+    Per-stage throughput and latency of the telemetry pipelines, the trail
+    compression ratio, plus the ETA recompute queue depth and freshness (this
+    process).
+    """
+    if request.user.role not in ['admin', 'authority']:
+        return Response(
+            {'error': 'Only admins can view ingestion metrics'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response({
+        'pipelines': [pipeline.metrics() for pipeline in PIPELINES],
+        'compression': deadband.metrics(),
+        'eta': eta_queue.metrics(),
+    })
@@ -0,0 +1,89 @@
+"""
+Server-driven ping cadence.
+
+The location update response tells the driver client when to send its next
+ping. A moving bus pings often enough to leave a point every
+``GPS_PING_SPACING`` metres, a parked one falls back to
+``GPS_MAX_UPDATE_INTERVAL``, and a bus moving near a stop of its route pings
+at ``GPS_MIN_UPDATE_INTERVAL`` so arrivals and departures are caught. When
+this worker takes pings faster than ``INGEST_TARGET_RATE`` per second every
+interval is stretched in proportion, shedding load before it queues up.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from core.spatial import haversine_km
+
+# Below this speed (m/s) a bus counts as stopped
+STOPPED_SPEED = 1.0
+
+
+class RateMeter:
+    """Events per second over a sliding window of whole seconds."""
+
+    def __init__(self, window=10):
+        self.window = window
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += 1
+            else:
+                self._buckets.append([second, 1])
+            self._expire(second)
+
+    def rate(self):
+        with self._lock:
+            self._expire(int(time.monotonic()))
+            return sum(count for _, count in self._buckets) / self.window
+
+    def _expire(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+
+ingest_rate = RateMeter()
+
+
+def near_route_stop(latitude, longitude, route_id):
+    """Whether a stop of ``route_id`` lies within GPS_NEAR_STOP_METERS."""
+    from schedules.geofence import geofence
+
+    # Only the bus's own route: other routes' stops must not speed it up
+    radius_km = getattr(settings, 'GPS_NEAR_STOP_METERS', 250) / 1000
+    return any(
+        haversine_km(latitude, longitude, stop.latitude, stop.longitude) <= radius_km
+        for stop in geofence.route_stops(route_id)
+    )
+
+
+def recommend_interval(speed, near_stop, load=None):
+    """
+    Seconds until the next ping for a bus moving at ``speed`` m/s (None if
+    unknown); ``load`` is this worker's ping rate, defaulting to the meter.
+    """
+    base = getattr(settings, 'GPS_UPDATE_INTERVAL', 5)
+    shortest = getattr(settings, 'GPS_MIN_UPDATE_INTERVAL', 2)
+    longest = getattr(settings, 'GPS_MAX_UPDATE_INTERVAL', 15)
+
+    if speed is None:
+        interval = shortest if near_stop else base
+    elif speed < STOPPED_SPEED:
+        # Parked at a stop it may pull away any moment
+        interval = base if near_stop else longest
+    elif near_stop:
+        interval = shortest
+    else:
+        interval = getattr(settings, 'GPS_PING_SPACING', 75) / speed
+
+    load = ingest_rate.rate() if load is None else load
+    target = getattr(settings, 'INGEST_TARGET_RATE', 50)
+    if load > target:
+        interval *= load / target
+    return int(round(min(max(interval, shortest), longest)))
@@ -0,0 +1,395 @@
+"""
+Telemetry ingestion pipeline.
+
+Every GPS ping, whichever endpoint it arrives on, goes through the same
+stages::
+
+    parse -> validate -> dedupe -> enrich -> sinks -> remember_position
+
+The sinks keep the driver's live location, the bus position trail (which the
+bus map and ETAs read) and the driver's location history in step, so readers
+of either feed see the same ping, and queue the bus for ETA recomputation.
+The live location takes every ping; ``smooth`` decides which smoothed points
+are worth appending to the trail and history (see ``locations.smoothing``),
+and the trail also gets a point every ``BUS_POSITION_HEARTBEAT`` seconds so
+a bus holding its course still shows as live.
+``stop_events`` turns the stream into stop arrivals and departures that fill
+in the trip log.
+
+A stage is a callable taking a ``Ping`` and returning it; returning None
+drops the ping (a duplicate, say) and raising ``IngestError`` rejects it.
+``Pipeline`` times every stage and ``metrics()`` reports per-stage
+throughput and latency for this process.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+from buses.driver_context import DriverContext, forget_driver, get_driver_context
+from core.cache import TTLCache
+from core.upsert import upsert
+from .models import DriverLocation, LocationHistory
+from .odometer import odometer
+from .segments import segment_log
+from .cadence import ingest_rate, near_route_stop, recommend_interval
+from .serializers import LocationUpdateSerializer
+from .smoothing import DeadBandFilter
+
+
+class IngestError(Exception):
+    """A rejected ping; ``detail`` is the response body."""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class Ping:
+    __slots__ = (
+        'user', 'data', 'received_at', 'latitude', 'longitude', 'accuracy',
+        'heading', 'speed', 'context', 'recorded_at', 'persist', 'smoothed',
+        'next_interval', 'stop_events',
+    )
+
+    def __init__(self, user, data):
+        self.user = user
+        self.data = data
+        self.received_at = timezone.now()
+        self.latitude = self.longitude = None
+        # Speed is in m/s and heading in degrees from validate() on
+        self.accuracy = self.heading = self.speed = None
+        self.context = None
+        self.recorded_at = None
+        # Whether the trail/history sinks store this ping, and where
+        self.persist = True
+        self.smoothed = None
+        # Seconds the client should wait before its next ping
+        self.next_interval = getattr(settings, 'GPS_UPDATE_INTERVAL', 5)
+        # Stop arrivals/departures this ping caused (schedules.geofence)
+        self.stop_events = []
+
+
+class StageMetrics:
+    def __init__(self, name, window=1024):
+        self.name = name
+        self.calls = self.dropped = self.errors = 0
+        self.total = self.slowest = 0.0
+        self._recent = deque(maxlen=window)
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, dropped=False, error=False):
+        with self._lock:
+            self.calls += 1
+            self.dropped += dropped
+            self.errors += error
+            self.total += elapsed
+            self.slowest = max(self.slowest, elapsed)
+            self._recent.append(elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            uptime = time.monotonic() - self._started
+            return {
+                'stage': self.name,
+                'calls': self.calls,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'per_second': round(self.calls / uptime, 3) if uptime else 0.0,
+                'avg_ms': round(self.total / self.calls * 1000, 3) if self.calls else None,
+                'p95_ms': round(recent[int(len(recent) * 0.95)] * 1000, 3) if recent else None,
+                'max_ms': round(self.slowest * 1000, 3),
+            }
+
+
+class Pipeline:
+    def __init__(self, name, *stages):
+        self.name = name
+        self.stages = [(stage, StageMetrics(stage.__name__)) for stage in stages]
+
+    def run(self, ping):
+        """Run ``ping`` through every stage; None means it was dropped."""
+        for stage, metrics in self.stages:
+            started = time.perf_counter()
+            try:
+                ping = stage(ping)
+            except Exception:
+                metrics.record(time.perf_counter() - started, error=True)
+                raise
+            metrics.record(time.perf_counter() - started, dropped=ping is None)
+            if ping is None:
+                return None
+        return ping
+
+    def metrics(self):
+        return {'pipeline': self.name, 'stages': [m.snapshot() for _, m in self.stages]}
+
+
+def parse(ping):
+    serializer = LocationUpdateSerializer(data=ping.data)
+    if not serializer.is_valid():
+        raise IngestError(serializer.errors)
+    data = serializer.validated_data
+    ping.latitude = data['latitude']
+    ping.longitude = data['longitude']
+    ping.accuracy = data.get('accuracy')
+    ping.heading = data.get('heading')
+    ping.speed = data.get('speed')
+    return ping
+
+
+def speed_from_kmh(ping):
+    """The legacy bus endpoint reports km/h."""
+    if ping.speed is not None:
+        ping.speed = ping.speed / 3.6
+    return ping
+
+
+def validate(ping):
+    errors = {}
+    if not -90 <= ping.latitude <= 90:
+        errors['latitude'] = ['Latitude must be between -90 and 90.']
+    if not -180 <= ping.longitude <= 180:
+        errors['longitude'] = ['Longitude must be between -180 and 180.']
+    if errors:
+        raise IngestError(errors)
+
+    # Browsers report unknown values as negative numbers
+    if ping.heading is not None:
+        ping.heading = ping.heading % 360 if ping.heading >= 0 else None
+    if ping.speed is not None and ping.speed < 0:
+        ping.speed = None
+    if ping.accuracy is not None and ping.accuracy < 0:
+        ping.accuracy = None
+    return ping
+
+
+_last_pings = TTLCache(max_entries=4096, ttl=getattr(settings, 'INGEST_DEDUPE_WINDOW', 10))
+# When this process last appended to each bus's trail (epoch seconds)
+_bus_written = TTLCache(max_entries=4096, ttl=3600)
+
+deadband = DeadBandFilter(
+    tolerance=getattr(settings, 'GPS_DEADBAND_METERS', 15),
+    max_interval=getattr(settings, 'GPS_DEADBAND_MAX_INTERVAL', 30),
+    max_accuracy=getattr(settings, 'GPS_ACCURATE_METERS', 50),
+)
+
+
+def dedupe(ping):
+    """Drop a ping repeating the user's last stored position within INGEST_DEDUPE_WINDOW."""
+    if _last_pings.get(ping.user.pk) == (ping.latitude, ping.longitude):
+        return None
+    return ping
+
+
+def remember_position(ping):
+    """Last stage: only pings that made it through every sink count for dedupe."""
+    _last_pings.set(ping.user.pk, (ping.latitude, ping.longitude))
+    return ping
+
+
+def enrich_journey(ping):
+    ping.context = get_driver_context(ping.user)
+    if ping.context is None:
+        raise IngestError({'error': 'No active journey. Start a journey first.'})
+    return ping
+
+
+def enrich_assignment(ping):
+    """Active journey if there is one, otherwise the bare bus assignment."""
+    ping.context = get_driver_context(ping.user)
+    if ping.context is not None:
+        return ping
+
+    from buses.models import BusAssignment
+    assignment = BusAssignment.objects.filter(
+        driver=ping.user, is_active=True
+    ).select_related('bus', 'route').first()
+    if assignment is None:
+        raise IngestError({'error': 'No active assignment'}, status=404)
+    ping.context = DriverContext(
+        journey_id=None,
+        journey_start=None,
+        bus_id=assignment.bus_id,
+        bus_number=assignment.bus.bus_number,
+        route_id=assignment.route_id,
+        route_name=assignment.route.name,
+        assignment_id=assignment.pk,
+    )
+    return ping
+
+
+def journey_stats(ping):
+    """Fold the ping into the journey's running statistics (locations.odometer)."""
+    # After live_state, which has confirmed the journey is still active
+    if ping.context.journey_id is None or ping.recorded_at is None:
+        return ping
+    odometer.add(
+        ping.context.journey_id, ping.latitude, ping.longitude,
+        ping.received_at, ping.speed, ping.accuracy
+    )
+    return ping
+
+
+def live_state(ping):
+    """Update the driver's DriverLocation for the active journey."""
+    if ping.context.journey_id is None:
+        return ping
+
+    fields = {
+        'latitude': ping.latitude,
+        'longitude': ping.longitude,
+        'accuracy': ping.accuracy,
+        'heading': ping.heading,
+        'speed': ping.speed,
+        'is_sharing': True,
+    }
+    # Fast path: a single UPDATE that only matches while the cached journey is
+    # still active, which doubles as the staleness check for the context. A
+    # live location is detached from its journey once that ends
+    # (locations.signals), so this needs no join to the journeys table.
+    updated = DriverLocation.objects.filter(
+        driver=ping.user,
+        journey_id=ping.context.journey_id
+    ).update(last_updated=ping.received_at, **fields)
+
+    if updated:
+        ping.recorded_at = ping.received_at
+        return ping
+
+    # First ping of the journey, or the journey changed elsewhere
+    forget_driver(ping.user.pk)
+    deadband.forget(ping.user.pk)
+    ping.context = get_driver_context(ping.user)
+    if ping.context is None:
+        raise IngestError({'error': 'No active journey. Start a journey first.'})
+    location = upsert(
+        DriverLocation, ['driver'],
+        driver=ping.user, journey_id=ping.context.journey_id, **fields
+    )
+    ping.recorded_at = location.last_updated
+    return ping
+
+
+def smooth(ping):
+    """Smooth the fix and keep it for the trail only if it leaves the dead-band."""
+    persist, lat, lng = deadband.update(
+        ping.user.pk, ping.latitude, ping.longitude,
+        ping.received_at.timestamp(), ping.accuracy
+    )
+    ping.persist = persist
+    ping.smoothed = (round(lat, 7), round(lng, 7))
+    return ping
+
+
+def _trail_position(ping):
+    return ping.smoothed or (ping.latitude, ping.longitude)
+
+
+def bus_position(ping):
+    """Append to the bus trail read by the bus map and the ETA calculation."""
+    from buses.models import BusLocation
+
+    bus_id = ping.context.bus_id
+    now = ping.received_at.timestamp()
+    last = _bus_written.get(bus_id)
+    if not ping.persist and last is not None and \
+            now - last < getattr(settings, 'BUS_POSITION_HEARTBEAT', 10):
+        ping.recorded_at = ping.recorded_at or ping.received_at
+        return ping
+    latitude, longitude = _trail_position(ping)
+    location = BusLocation.objects.create(
+        bus_id=bus_id,
+        latitude=latitude,
+        longitude=longitude,
+        speed=round(min(ping.speed * 3.6, 999.99), 2) if ping.speed is not None else None,
+        heading=round(ping.heading, 2) if ping.heading is not None else None,
+        timestamp=ping.received_at,
+        is_accurate=ping.accuracy is None or ping.accuracy <= getattr(settings, 'GPS_ACCURATE_METERS', 50),
+    )
+    _bus_written.set(bus_id, now)
+    ping.recorded_at = ping.recorded_at or location.timestamp
+    return ping
+
+
+def history(ping):
+    # The segment log replaces the history table when it is enabled
+    if not ping.persist or segment_log is not None:
+        return ping
+    latitude, longitude = _trail_position(ping)
+    LocationHistory.objects.create(
+        driver=ping.user,
+        latitude=latitude,
+        longitude=longitude
+    )
+    return ping
+
+
+def segment(ping):
+    """Append the ping to the telemetry segment log (locations.segments), if enabled."""
+    if not ping.persist or segment_log is None:
+        return ping
+    latitude, longitude = _trail_position(ping)
+    segment_log.append(
+        ping.received_at, ping.context.bus_id, latitude, longitude,
+        journey_id=ping.context.journey_id, driver_id=ping.user.pk,
+        heading=ping.heading, speed=ping.speed,
+    )
+    return ping
+
+
+def stop_events(ping):
+    """Detect stop arrivals and departures and log them on the trip (reports.stop_events)."""
+    from reports.stop_events import record_stop_events
+    from schedules.geofence import geofence
+
+    # A vague fix could fake an arrival
+    if ping.accuracy is not None and ping.accuracy > getattr(settings, 'GPS_ACCURATE_METERS', 50):
+        return ping
+    latitude, longitude = _trail_position(ping)
+    ping.stop_events = geofence.update(
+        ping.context.bus_id, ping.context.route_id, latitude, longitude,
+        ping.received_at, trip_key=ping.context.journey_id
+    )
+    record_stop_events(ping.stop_events, driver_id=ping.user.pk)
+    return ping
+
+
+def eta(ping):
+    """Queue the bus for background ETA recomputation (buses.eta_queue)."""
+    from buses.eta_queue import eta_queue
+
+    eta_queue.enqueue(ping.context.bus_id, ping.context.route_id, ping.received_at.timestamp())
+    return ping
+
+
+def cadence(ping):
+    """Recommend when the client should ping next (see ``locations.cadence``)."""
+    ingest_rate.tick()
+    speed = ping.speed if ping.speed is not None else deadband.speed(ping.user.pk)
+    near_stop = near_route_stop(ping.latitude, ping.longitude, ping.context.route_id)
+    ping.next_interval = recommend_interval(speed, near_stop)
+    return ping
+
+
+# Driver app pings during a journey (locations/api/location/update/)
+DRIVER_PIPELINE = Pipeline(
+    'driver', parse, validate, dedupe, enrich_journey, live_state,
+    journey_stats, smooth, bus_position, history, segment, stop_events, eta,
+    cadence, remember_position,
+)
+
+# Legacy bus tracking endpoint (api/buses/update-location/), km/h speeds and
+# no journey required
+BUS_PIPELINE = Pipeline(
+    'bus', parse, speed_from_kmh, validate, dedupe, enrich_assignment,
+    smooth, bus_position, segment, stop_events, eta, cadence,
+    remember_position,
+)
+
+PIPELINES = [DRIVER_PIPELINE, BUS_PIPELINE]
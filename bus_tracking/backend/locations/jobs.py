@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+
+from core.jobs import periodic
+from .models import DriverLocation
+from .segments import segment_log
+
+
+@periodic(seconds=30)
+def expire_locations():
+    """Stop sharing for drivers that have not pinged in two minutes."""
+    DriverLocation.expire_inactive()
+
+
+@periodic(seconds=300)
+def index_segments():
+    """Write the sparse index of finished telemetry segments and drop expired, archived ones."""
+    if segment_log is None:
+        return
+    from reports import archive
+
+    hour = int(time.time()) // 3600
+    segment_log.seal(before=hour)
+    retention = getattr(settings, 'TELEMETRY_SEGMENT_RETENTION_HOURS', 24 * 90)
+    before = hour - retention
+    try:
+        archive.archive_dir()
+    except archive.ArchiveUnavailable:
+        pass
+    else:
+        # Hours the Parquet archive does not hold yet are kept
+        for logged in segment_log.hours():
+            if logged >= before:
+                break
+            if not archive.hour_is_exported(archive.LOCATION_HISTORY, logged):
+                before = logged
+                break
+    segment_log.prune(before=before)
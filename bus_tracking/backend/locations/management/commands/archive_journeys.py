@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from buses.models import Journey
+from locations.models import JourneyTrajectory, LocationHistory
+from locations.replay import journey_points
+from locations.segments import SEGMENT_RECORD, segment_log
+from locations.trajectory import encode
+
+
+def history_bytes_per_point():
+    """On-disk bytes per LocationHistory row, indexes included, or None if the database cannot tell."""
+    table = LocationHistory._meta.db_table
+    connection = connections[router.db_for_read(LocationHistory)]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)", [table]
+                )
+            else:
+                return None
+            size = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    rows = LocationHistory.objects.count()
+    return size / rows if size and rows else None
+
+
+class Command(BaseCommand):
+    help = 'Pack the trails of finished journeys into compact trajectories (locations.trajectory)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=24, help='Hours since the journey ended')
+        parser.add_argument('--limit', type=int, default=1000)
+        parser.add_argument(
+            '--delete-history', action='store_true',
+            help='Delete the archived LocationHistory rows'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report sizes without saving')
+
+    def handle(self, *args, **options):
+        history_size = history_bytes_per_point()
+        journeys = Journey.objects.filter(
+            status__in=['completed', 'aborted'],
+            end_time__lt=timezone.now() - timedelta(hours=options['older_than']),
+            trajectory__isnull=True,
+        ).order_by('end_time')[:options['limit']]
+
+        archived = points = packed = deleted = 0
+        for journey in journeys:
+            trail = [(timestamp, latitude, longitude) for timestamp, _, _, latitude, longitude in journey_points(journey)]
+            data = encode(trail)
+            archived += 1
+            points += len(trail)
+            packed += len(data)
+            if options['dry_run']:
+                continue
+
+            # The history may be in the telemetry database (core.routers)
+            with transaction.atomic(), transaction.atomic(using=router.db_for_write(LocationHistory)):
+                JourneyTrajectory.objects.create(journey=journey, data=data, point_count=len(trail))
+                if options['delete_history'] and segment_log is None:
+                    deleted += LocationHistory.objects.filter(
+                        driver_id=journey.driver_id,
+                        timestamp__gte=journey.start_time,
+                        timestamp__lte=journey.end_time,
+                    ).delete()[0]
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {archived} journeys, {points} points, {packed} bytes'))
+        if deleted:
+            self.stdout.write(f'Deleted {deleted} location history rows')
+        if not points:
+            return
+
+        self.stdout.write(f'trajectory        {packed / points:7.2f} bytes/point')
+        if segment_log is not None:
+            self.stdout.write(f'segment log       {SEGMENT_RECORD.size:7.2f} bytes/point')
+        if history_size is not None:
+            self.stdout.write(
+                f'location history  {history_size:7.2f} bytes/point  ({history_size * points / packed:.1f}x)'
+            )
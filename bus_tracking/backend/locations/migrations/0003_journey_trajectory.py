@@ -0,0 +1,45 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0009_journey_statistics"),
+        ("locations", "0002_driverlocation_journey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JourneyTrajectory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.BinaryField()),
+                ("point_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "journey",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trajectory",
+                        to="buses.journey",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Journey Trajectory",
+                "verbose_name_plural": "Journey Trajectories",
+                "db_table": "journey_trajectories",
+            },
+        ),
+    ]
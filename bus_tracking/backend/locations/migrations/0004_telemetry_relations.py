@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0010_telemetry_relations"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("locations", "0003_journey_trajectory"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="driverlocation",
+            name="driver",
+            field=models.OneToOneField(
+                db_constraint=False,
+                limit_choices_to={"role": "driver"},
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="live_location",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="driverlocation",
+            name="journey",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="location_updates",
+                to="buses.journey",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="locationhistory",
+            name="driver",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="location_history",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
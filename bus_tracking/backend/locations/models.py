@@ -5,15 +5,18 @@ from accounts.models import User
 
 class DriverLocation(models.Model):
     """Real-time driver location tracking."""
+    # Telemetry (core.routers): plain ids, cleaned up by locations.signals
     driver = models.OneToOneField(
         User, 
-        on_delete=models.CASCADE, 
+        on_delete=models.DO_NOTHING, 
+        db_constraint=False,
         related_name='live_location',
         limit_choices_to={'role': 'driver'}
     )
     journey = models.ForeignKey(
         'buses.Journey',
-        on_delete=models.SET_NULL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         null=True,
         blank=True,
         related_name='location_updates'
@@ -63,12 +66,16 @@ class DriverLocation(models.Model):
     @classmethod
     def get_active_drivers(cls):
         """Get all drivers currently sharing location with active journeys."""
+        from buses.models import Journey
+
         threshold = timezone.now() - timedelta(seconds=60)
+        # Journeys may be in another database (core.routers): match ids, not a join
+        active = Journey.objects.filter(status='active').values_list('id', flat=True)
         return cls.objects.filter(
             is_sharing=True,
             last_updated__gte=threshold,
-            journey__status='active'
-        ).select_related('driver', 'journey__bus', 'journey__route')
+            journey_id__in=list(active)
+        )
 
     @classmethod
     def expire_inactive(cls):
@@ -82,7 +89,9 @@ class DriverLocation(models.Model):
 
 class LocationHistory(models.Model):
     """Optional: Store location history for analytics."""
-    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_history')
+    driver = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='location_history'
+    )
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -96,3 +105,23 @@ class LocationHistory(models.Model):
 
     def __str__(self):
         return f"{self.driver.username} - {self.timestamp}"
+
+
+class JourneyTrajectory(models.Model):
+    """A finished journey's trail packed by locations.trajectory (archive_journeys)."""
+    journey = models.OneToOneField('buses.Journey', on_delete=models.CASCADE, related_name='trajectory')
+    data = models.BinaryField()
+    point_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'journey_trajectories'
+        verbose_name = 'Journey Trajectory'
+        verbose_name_plural = 'Journey Trajectories'
+
+    def __str__(self):
+        return f"Journey {self.journey_id} - {self.point_count} points"
+
+    @property
+    def size(self):
+        return len(self.data)
@@ -0,0 +1,177 @@
+"""
+Per-journey odometer and driving statistics.
+
+``JourneyOdometer`` folds each ping of a journey into running totals in
+O(1): distance, top speed, idle time and point count. Distance is counted
+from an anchor that only moves once the bus is more than the fix's accuracy
+(at least ``JOURNEY_ODOMETER_GATE`` metres) away from it, so GPS jitter
+while parked adds neither distance nor moving time.
+
+Totals are flushed to the Journey as increments every
+``JOURNEY_STATS_CHECKPOINT`` seconds while it is active, so several workers
+can each add the pings they saw. Those are running figures: pings still
+pending in other workers, and the segment before a worker's first ping of
+the journey, are not in them. ``finish()`` therefore recomputes distance and
+idle time from the journey's stored trail (``locations.replay``), which
+every worker writes to, and then the average speed. Flushes arriving after
+the journey ended are dropped.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.spatial import haversine_km
+
+# Below this speed (m/s) between two fixes the bus counts as idle
+IDLE_SPEED = 1.0
+# Faster than this (m/s) between two fixes is a GPS jump, not driving
+MAX_PLAUSIBLE_SPEED = 50.0
+
+
+class JourneyTotals:
+    __slots__ = (
+        'anchor', 'last_at', 'distance_m', 'max_speed', 'idle_seconds',
+        'points', 'flushed_at',
+    )
+
+    def __init__(self, anchor=None, last_at=None):
+        # (latitude, longitude) the distance is counted from
+        self.anchor = anchor
+        self.last_at = last_at
+        self.distance_m = 0.0
+        self.max_speed = 0.0
+        self.idle_seconds = 0.0
+        self.points = 0
+        self.flushed_at = time.monotonic()
+
+    @property
+    def pending(self):
+        return self.points or self.distance_m or self.idle_seconds >= 1
+
+
+class JourneyOdometer:
+    def __init__(self, gate=10, checkpoint=60, stale_after=1800):
+        self.gate = gate
+        self.checkpoint = checkpoint
+        self.stale_after = stale_after
+        self._journeys = {}
+        self._lock = threading.Lock()
+
+    def add(self, journey_id, latitude, longitude, at, speed=None, accuracy=None):
+        """Fold one fix into the journey's totals; flushes at checkpoints."""
+        with self._lock:
+            totals = self._journeys.get(journey_id)
+            new = totals is None
+            if new:
+                totals = self._journeys[journey_id] = JourneyTotals()
+            self._advance(totals, (float(latitude), float(longitude)), at, speed, accuracy)
+            due = time.monotonic() - totals.flushed_at >= self.checkpoint
+
+        if new:
+            self._prune(at)
+        if due:
+            self.flush(journey_id)
+
+    def _advance(self, totals, position, at, speed, accuracy):
+        totals.points += 1
+        if speed is not None:
+            totals.max_speed = max(totals.max_speed, speed)
+        if totals.anchor is None:
+            totals.anchor, totals.last_at = position, at
+            return
+        elapsed = max((at - totals.last_at).total_seconds(), 0)
+        moved = haversine_km(*totals.anchor, *position) * 1000
+        if moved > max(self.gate, accuracy or 0):
+            # A jump no bus could drive re-anchors without adding distance
+            if elapsed and moved / elapsed < MAX_PLAUSIBLE_SPEED:
+                totals.distance_m += moved
+                if speed is None:
+                    totals.max_speed = max(totals.max_speed, moved / elapsed)
+            totals.anchor = position
+        elif speed is None or speed < IDLE_SPEED:
+            totals.idle_seconds += elapsed
+        totals.last_at = at
+
+    def flush(self, journey_id):
+        """Add the journey's pending totals to its row."""
+        from buses.models import Journey
+
+        with self._lock:
+            totals = self._journeys.get(journey_id)
+            if totals is None or not totals.pending:
+                return
+            distance_m, max_speed = totals.distance_m, totals.max_speed
+            idle_seconds, points = totals.idle_seconds, totals.points
+            totals.distance_m = 0.0
+            # Whole seconds are stored, carry the rest
+            totals.idle_seconds = idle_seconds - int(idle_seconds)
+            totals.points = 0
+            totals.flushed_at = time.monotonic()
+
+        Journey.objects.filter(pk=journey_id, status='active').update(
+            distance_km=F('distance_km') + Decimal(f'{distance_m / 1000:.3f}'),
+            max_speed_kmh=Greatest(F('max_speed_kmh'), Decimal(f'{min(max_speed * 3.6, 9999):.2f}')),
+            idle_seconds=F('idle_seconds') + int(idle_seconds),
+            point_count=F('point_count') + points,
+        )
+
+    def _prune(self, now):
+        """Flush and drop journeys this worker has not seen a ping of for ``stale_after``."""
+        with self._lock:
+            stale = [
+                journey_id for journey_id, totals in self._journeys.items()
+                if totals.last_at is not None and (now - totals.last_at).total_seconds() > self.stale_after
+            ]
+        for journey_id in stale:
+            self.flush(journey_id)
+            with self._lock:
+                self._journeys.pop(journey_id, None)
+
+    def finish(self, journey):
+        """Recompute the ended journey's totals from its stored trail and set its average speed."""
+        from .models import DriverLocation
+        from .replay import journey_points
+
+        with self._lock:
+            running = self._journeys.pop(journey.pk, None)
+        trail = JourneyTotals()
+        for at, _, _, latitude, longitude in journey_points(journey):
+            self._advance(trail, (float(latitude), float(longitude)), at, None, None)
+        # The trail keeps a point per dead-band interval; the driver's live
+        # location (detached from the journey by now) closes it
+        last = DriverLocation.objects.filter(driver_id=journey.driver_id).values_list(
+            'latitude', 'longitude', 'last_updated'
+        ).first()
+        end_time = journey.end_time or timezone.now()
+        if last is not None and trail.last_at is not None and trail.last_at < last[2] <= end_time:
+            self._advance(trail, (float(last[0]), float(last[1])), last[2], None, None)
+
+        journey.refresh_from_db(fields=['max_speed_kmh', 'point_count'])
+        # Speeds are only trusted from the raw pings, and only those count every ping
+        if running is not None:
+            journey.max_speed_kmh = max(
+                journey.max_speed_kmh, Decimal(f'{min(running.max_speed * 3.6, 9999):.2f}')
+            )
+        journey.point_count = max(journey.point_count + (running.points if running else 0), trail.points)
+        journey.distance_km = Decimal(f'{trail.distance_m / 1000:.3f}')
+        journey.idle_seconds = int(trail.idle_seconds)
+
+        moving = end_time - journey.start_time - timedelta(seconds=journey.idle_seconds)
+        hours = moving.total_seconds() / 3600
+        journey.avg_speed_kmh = round(min(float(journey.distance_km) / hours, 9999), 2) if hours > 0 else None
+        journey.save(update_fields=[
+            'distance_km', 'max_speed_kmh', 'idle_seconds', 'point_count', 'avg_speed_kmh'
+        ])
+
+
+odometer = JourneyOdometer(
+    gate=getattr(settings, 'JOURNEY_ODOMETER_GATE', 10),
+    checkpoint=getattr(settings, 'JOURNEY_STATS_CHECKPOINT', 60),
+    stale_after=getattr(settings, 'JOURNEY_STALE_AFTER', 1800),
+)
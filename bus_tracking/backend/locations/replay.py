@@ -0,0 +1,120 @@
+"""
+Historical playback of journeys.
+
+``replay()`` streams the stored trail of one or many journeys as position
+events in timestamp order. It does not pace them: the client plays them
+back at the speed it likes from their timestamps, so a replay holds a web
+worker only as long as the read takes. Each
+journey's trail is read in ``REPLAY_CHUNK_SIZE`` LocationHistory rows at a
+time over the ``(driver, timestamp)`` index, resuming after the last row
+read, or an hour at a time from the segment log (locations.segments) when
+it is enabled; what was recorded before the log was enabled still comes
+from LocationHistory. An archived journey is decoded from its trajectory
+(locations.trajectory). The journeys are merged lazily: a whole day of the fleet
+holds at most one chunk per journey in memory and the first event goes out
+after one small read per journey.
+
+Every position carries a cursor; a stream restarted ``after`` it (the
+``Last-Event-ID`` of an EventSource) continues with the next position.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JourneyTrajectory, LocationHistory
+from .segments import from_micros, segment_log, to_micros
+from .trajectory import decode
+
+
+def encode_cursor(timestamp, pk):
+    return f'{to_micros(timestamp)}-{pk}'
+
+
+def decode_cursor(cursor):
+    """``(timestamp, pk)`` or None for a missing or malformed cursor."""
+    try:
+        micros, pk = cursor.split('-')
+        micros, pk = int(micros), int(pk)
+    except (AttributeError, ValueError):
+        return None
+    return from_micros(micros), pk
+
+
+def journey_points(journey, after=None, chunk_size=500):
+    """``(timestamp, pk, journey_id, latitude, longitude)`` of a journey's trail, in order."""
+    archived = archived_trajectory(journey)
+    if archived is not None:
+        yield from _archived_points(journey, archived, after)
+        return
+    if segment_log is None:
+        yield from _history_points(journey, after, chunk_size)
+        return
+    # The trail up to the journey's first logged point predates the log
+    first = next(_logged_points(journey), None)
+    yield from _history_points(journey, after, chunk_size, before=first[0] if first else None)
+    if first is not None:
+        yield from _logged_points(journey, after)
+
+
+def _history_points(journey, after=None, chunk_size=500, before=None):
+    """Like ``journey_points()``, from LocationHistory, optionally only points older than ``before``."""
+    trail = LocationHistory.objects.filter(driver_id=journey.driver_id, timestamp__gte=journey.start_time)
+    if journey.end_time:
+        trail = trail.filter(timestamp__lte=journey.end_time)
+    if before is not None:
+        trail = trail.filter(timestamp__lt=before)
+    trail = trail.order_by('timestamp', 'id')
+
+    while True:
+        chunk = trail
+        if after is not None:
+            timestamp, pk = after
+            chunk = chunk.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+        rows = list(chunk.values_list('timestamp', 'id', 'latitude', 'longitude')[:chunk_size])
+        for timestamp, pk, latitude, longitude in rows:
+            yield timestamp, pk, journey.pk, latitude, longitude
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][:2]
+
+
+def archived_trajectory(journey):
+    """The journey's packed trail, or None if it was not archived."""
+    try:
+        return journey.trajectory.data
+    except JourneyTrajectory.DoesNotExist:
+        return None
+
+
+def _archived_points(journey, data, after=None):
+    """Like ``journey_points()``, from the archive; the point's position stands in for the pk."""
+    for position, (timestamp, latitude, longitude) in enumerate(decode(data)):
+        if after is not None and (timestamp, position) <= after:
+            continue
+        yield timestamp, position, journey.pk, latitude, longitude
+
+
+def _logged_points(journey, after=None):
+    """Like ``journey_points()``, from the segment log; the record number stands in for the pk."""
+    end = journey.end_time or timezone.now()
+    for rows in segment_log.chunks(journey.bus_id, journey.start_time, end, journey_id=journey.pk):
+        for micros, record, _, _, latitude, longitude, _, _ in rows:
+            timestamp = from_micros(micros)
+            if after is not None and (timestamp, record) <= after:
+                continue
+            yield timestamp, record, journey.pk, latitude / 1000000, longitude / 1000000
+
+
+def replay(journeys, after=None):
+    """Yield ``(cursor, point)`` for every stored position of ``journeys``, merged in timestamp order."""
+    chunk_size = getattr(settings, 'REPLAY_CHUNK_SIZE', 500)
+    merged = heapq.merge(*(journey_points(journey, after, chunk_size) for journey in journeys))
+    for timestamp, pk, journey_id, latitude, longitude in merged:
+        yield encode_cursor(timestamp, pk), {
+            'journey_id': journey_id,
+            'lat': float(latitude),
+            'lng': float(longitude),
+            'timestamp': timestamp,
+        }
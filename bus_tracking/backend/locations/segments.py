@@ -0,0 +1,356 @@
+"""
+Append-only telemetry segment log.
+
+With ``TELEMETRY_SEGMENT_DIR`` set, every stored ping is appended to the
+segment file of its hour as a fixed-width record, and LocationHistory is no
+longer written. Readers map a segment with ``mmap`` and look at the records
+through a NumPy view (``struct`` when NumPy is not installed), so nothing is
+parsed. The layout is little-endian::
+
+    header  16 bytes  magic b'BUSG', uint16 version (1), uint16 record size,
+                      int64 start of the hour (epoch seconds)
+    record  32 bytes  int64 timestamp (epoch microseconds), uint32 bus id,
+                      uint32 journey id and uint32 driver id (0 if none),
+                      int32 latitude and int32 longitude in microdegrees,
+                      uint16 heading in centidegrees, uint16 speed in cm/s
+
+Unknown heading or speed is ``0xFFFF``. Every record is a single ``write()``
+to an ``O_APPEND`` descriptor, so workers sharing the directory never
+interleave partial records.
+
+Each segment has a sparse per-bus index. The records of a bus are grouped
+``TELEMETRY_INDEX_STRIDE`` at a time and a group keeps only its first and
+last record position and its earliest and latest timestamp, so a read for
+one bus and time range scans just the records between the groups that
+overlap the range, whatever order the pings arrived in. The open hour's
+index is extended in memory from the records appended since the last read;
+once the hour is over the ``index_segments`` job writes it next to the
+segment (``.idx``, entries of uint32 bus id, uint32 first and last record,
+int64 earliest and latest timestamp).
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+SEGMENT_MAGIC = b'BUSG'
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct('<4sHHq')
+SEGMENT_RECORD = struct.Struct('<qIIIiiHH')
+INDEX_ENTRY = struct.Struct('<IIIqq')
+UNKNOWN = 0xFFFF
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([
+        ('timestamp', '<i8'), ('bus', '<u4'), ('journey', '<u4'), ('driver', '<u4'),
+        ('latitude', '<i4'), ('longitude', '<i4'), ('heading', '<u2'), ('speed', '<u2'),
+    ])
+
+
+def _scaled(value, scale, modulo=None):
+    if value is None:
+        return UNKNOWN
+    value = round(value * scale)
+    if modulo:
+        value %= modulo
+    return min(max(value, 0), UNKNOWN - 1)
+
+
+def to_micros(at):
+    return round(at.timestamp() * 1000000)
+
+
+def from_micros(micros):
+    return datetime.fromtimestamp(micros / 1000000, dt_timezone.utc)
+
+
+class Segment:
+    """One hour of records, mapped read-only, with its sparse per-bus index."""
+
+    def __init__(self, path, stride=64):
+        self.path = path
+        self.stride = stride
+        self._map = None
+        self._count = 0
+        # bus id -> [[first record, last record, earliest, latest timestamp], ...]
+        self._groups = {}
+        # bus id -> records of the bus indexed so far
+        self._seen = {}
+        self._indexed = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _refresh(self):
+        """Remap the file if records were appended since the last read."""
+        size = os.path.getsize(self.path)
+        count = max(size - SEGMENT_HEADER.size, 0) // SEGMENT_RECORD.size
+        if self._map is None or count != self._count:
+            with open(self.path, 'rb') as handle:
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._count = count
+
+    def _columns(self, start, stop):
+        """(timestamps, bus ids) of records ``start`` to ``stop``."""
+        if numpy is not None:
+            view = numpy.frombuffer(
+                self._map, RECORD_DTYPE, count=stop - start,
+                offset=SEGMENT_HEADER.size + start * SEGMENT_RECORD.size,
+            )
+            return view['timestamp'].tolist(), view['bus'].tolist()
+        records = SEGMENT_RECORD.iter_unpack(
+            memoryview(self._map)[SEGMENT_HEADER.size + start * SEGMENT_RECORD.size:
+                                  SEGMENT_HEADER.size + stop * SEGMENT_RECORD.size]
+        )
+        timestamps, buses = [], []
+        for record in records:
+            timestamps.append(record[0])
+            buses.append(record[1])
+        return timestamps, buses
+
+    def _extend_index(self):
+        if self._indexed >= self._count:
+            return
+        timestamps, buses = self._columns(self._indexed, self._count)
+        for record, (timestamp, bus) in enumerate(zip(timestamps, buses), self._indexed):
+            seen = self._seen.get(bus, 0)
+            if seen % self.stride == 0:
+                self._groups.setdefault(bus, []).append([record, record, timestamp, timestamp])
+            else:
+                group = self._groups[bus][-1]
+                group[1] = record
+                group[2] = min(group[2], timestamp)
+                group[3] = max(group[3], timestamp)
+            self._seen[bus] = seen + 1
+        self._indexed = self._count
+
+    @property
+    def index_path(self):
+        return self.path[:-len('.seg')] + '.idx'
+
+    def _load_index(self):
+        """Use the index written when the hour was sealed, if there is one."""
+        try:
+            with open(self.index_path, 'rb') as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            return
+        for bus, first, last, earliest, latest in INDEX_ENTRY.iter_unpack(data):
+            self._groups.setdefault(bus, []).append([first, last, earliest, latest])
+            self._indexed = max(self._indexed, last + 1)
+        # A record appended after sealing starts a new group
+        self._seen = dict.fromkeys(self._groups, 0)
+
+    def write_index(self):
+        """Write the sparse index of a segment that takes no more records."""
+        with self._lock:
+            self._refresh()
+            self._extend_index()
+            entries = b''.join(
+                INDEX_ENTRY.pack(bus, *group)
+                for bus, groups in sorted(self._groups.items()) for group in groups
+            )
+        partial = f'{self.index_path}.{os.getpid()}'
+        with open(partial, 'wb') as handle:
+            handle.write(entries)
+        os.replace(partial, self.index_path)
+
+    def records(self):
+        """
+        ``(timestamp, bus id, journey id, driver id, latitude, longitude,
+        heading, speed)`` of every record, in the order they were appended.
+        """
+        with self._lock:
+            self._refresh()
+            if numpy is not None:
+                return numpy.frombuffer(
+                    self._map, RECORD_DTYPE, count=self._count, offset=SEGMENT_HEADER.size
+                ).tolist()
+            return list(SEGMENT_RECORD.iter_unpack(
+                memoryview(self._map)[SEGMENT_HEADER.size:SEGMENT_HEADER.size + self._count * SEGMENT_RECORD.size]
+            ))
+
+    def _span(self, bus_id, start, end):
+        """Records ``[first, stop)`` holding every record of ``bus_id`` between the timestamps."""
+        overlapping = [
+            group for group in self._groups.get(bus_id, ())
+            if group[2] <= end and group[3] >= start
+        ]
+        if not overlapping:
+            return 0, 0
+        return overlapping[0][0], overlapping[-1][1] + 1
+
+    def points(self, bus_id, start, end, journey_id=None):
+        """
+        ``(timestamp, record, journey id, driver id, latitude, longitude,
+        heading, speed)`` of ``bus_id`` between the epoch-microsecond
+        timestamps, in timestamp order; coordinates in microdegrees.
+        """
+        with self._lock:
+            self._refresh()
+            self._extend_index()
+            first, stop = self._span(bus_id, start, end)
+            if first >= stop:
+                return []
+            offset = SEGMENT_HEADER.size + first * SEGMENT_RECORD.size
+
+            if numpy is not None:
+                view = numpy.frombuffer(self._map, RECORD_DTYPE, count=stop - first, offset=offset)
+                mask = (view['bus'] == bus_id) & (view['timestamp'] >= start) & (view['timestamp'] <= end)
+                if journey_id is not None:
+                    mask &= view['journey'] == journey_id
+                positions = numpy.flatnonzero(mask)
+                selected = view[positions]
+                return sorted(zip(
+                    selected['timestamp'].tolist(), (positions + first).tolist(),
+                    selected['journey'].tolist(), selected['driver'].tolist(),
+                    selected['latitude'].tolist(), selected['longitude'].tolist(),
+                    selected['heading'].tolist(), selected['speed'].tolist(),
+                ))
+
+            rows = []
+            records = SEGMENT_RECORD.iter_unpack(
+                memoryview(self._map)[offset:SEGMENT_HEADER.size + stop * SEGMENT_RECORD.size]
+            )
+            for record, (timestamp, bus, journey, driver, lat, lng, heading, speed) in enumerate(records, first):
+                if bus == bus_id and start <= timestamp <= end and (journey_id is None or journey == journey_id):
+                    rows.append((timestamp, record, journey, driver, lat, lng, heading, speed))
+            rows.sort()
+            return rows
+
+
+class SegmentLog:
+    def __init__(self, directory, stride=64, cached_segments=48):
+        self.directory = str(directory)
+        self.stride = stride
+        self.cached_segments = cached_segments
+        self._hour = None
+        self._fd = None
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, hour):
+        return os.path.join(self.directory, time.strftime('%Y-%m-%dT%H.seg', time.gmtime(hour * 3600)))
+
+    def _open(self, hour):
+        """Append descriptor of the hour's segment, creating it with its header."""
+        path = self.path(hour)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            # Publish the header and the file at once so no record lands before it
+            partial = f'{path}.{os.getpid()}.{threading.get_ident()}'
+            with open(partial, 'wb') as handle:
+                handle.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, SEGMENT_RECORD.size, hour * 3600))
+            try:
+                os.link(partial, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(partial)
+        return os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    def append(self, at, bus_id, latitude, longitude, journey_id=None, driver_id=None, heading=None, speed=None):
+        """Append one fix taken at ``at`` (a datetime); ``speed`` in m/s."""
+        micros = to_micros(at)
+        record = SEGMENT_RECORD.pack(
+            micros, bus_id, journey_id or 0, driver_id or 0,
+            round(float(latitude) * 1000000), round(float(longitude) * 1000000),
+            _scaled(heading, 100, 36000), _scaled(speed, 100),
+        )
+        hour = micros // 3600000000
+        with self._lock:
+            if hour != self._hour:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._fd = self._open(hour)
+                self._hour = hour
+            os.write(self._fd, record)
+
+    def segment(self, hour):
+        """The hour's Segment, or None if nothing was logged in it."""
+        with self._lock:
+            segment = self._segments.get(hour)
+            if segment is not None:
+                self._segments.move_to_end(hour)
+                return segment
+        path = self.path(hour)
+        if not os.path.exists(path):
+            return None
+        segment = Segment(path, self.stride)
+        with self._lock:
+            segment = self._segments.setdefault(hour, segment)
+            while len(self._segments) > self.cached_segments:
+                self._segments.popitem(last=False)
+        return segment
+
+    def chunks(self, bus_id, start, end, journey_id=None):
+        """Yield the points (see ``Segment.points``) of ``bus_id`` between two datetimes, one hour at a time."""
+        start, end = to_micros(start), to_micros(end)
+        for hour in range(start // 3600000000, end // 3600000000 + 1):
+            segment = self.segment(hour)
+            if segment is not None:
+                rows = segment.points(bus_id, start, end, journey_id)
+                if rows:
+                    yield rows
+
+    def hours(self):
+        """Hours with a segment on disk, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        hours = []
+        for name in names:
+            if name.endswith('.seg'):
+                stamp = datetime.strptime(name[:-len('.seg')], '%Y-%m-%dT%H').replace(tzinfo=dt_timezone.utc)
+                hours.append(int(stamp.timestamp()) // 3600)
+        return sorted(hours)
+
+    def seal(self, before):
+        """Write the index of every segment before the ``before`` hour that has none yet."""
+        sealed = 0
+        for hour in self.hours():
+            if hour >= before:
+                break
+            segment = self.segment(hour)
+            if segment is not None and not os.path.exists(segment.index_path):
+                segment.write_index()
+                sealed += 1
+        return sealed
+
+    def prune(self, before):
+        """Delete the segments (and indexes) of hours before ``before``."""
+        pruned = 0
+        for hour in self.hours():
+            if hour >= before:
+                break
+            with self._lock:
+                self._segments.pop(hour, None)
+            path = self.path(hour)
+            for name in (path, path[:-len('.seg')] + '.idx'):
+                try:
+                    os.unlink(name)
+                except FileNotFoundError:
+                    pass
+            pruned += 1
+        return pruned
+
+
+def _segment_log():
+    directory = getattr(settings, 'TELEMETRY_SEGMENT_DIR', None)
+    if not directory:
+        return None
+    return SegmentLog(directory, stride=getattr(settings, 'TELEMETRY_INDEX_STRIDE', 64))
+
+
+segment_log = _segment_log()
@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from core.fieldsets import SparseFieldsMixin
 from .models import DriverLocation
 
-class DriverLocationSerializer(serializers.ModelSerializer):
+class DriverLocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     driver_id = serializers.IntegerField(source='driver.id', read_only=True)
     driver_name = serializers.CharField(source='driver.get_full_name', read_only=True)
     driver_username = serializers.CharField(source='driver.username', read_only=True)
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from buses.models import Journey
+from .models import DriverLocation, LocationHistory
+
+
+# Telemetry rows only hold the ids of drivers and journeys (core.routers), so
+# the database does not cascade deletions to them
+@receiver(post_delete, sender=User)
+def delete_driver_telemetry(sender, instance, **kwargs):
+    DriverLocation.objects.filter(driver_id=instance.pk).delete()
+    LocationHistory.objects.filter(driver_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Journey)
+@receiver(post_delete, sender=Journey)
+def detach_journey_locations(sender, instance, signal, **kwargs):
+    # A live location only points at an active journey (locations.ingest.live_state)
+    if signal is post_delete:
+        DriverLocation.objects.filter(journey_id=instance.pk).update(journey=None)
+    elif instance.status != 'active':
+        DriverLocation.objects.filter(journey_id=instance.pk).update(journey=None, is_sharing=False)
@@ -0,0 +1,139 @@
+"""
+GPS smoothing and dead-band compression for the ingest pipeline.
+
+Each tracked driver gets an alpha-beta filter over a local metric frame. The
+filter gain follows the ping's reported ``accuracy``: a precise fix moves the
+estimate most of the way, a vague one barely nudges it. A fix that lands
+further from the prediction than a vehicle could plausibly get restarts the
+track instead of dragging the estimate across the map.
+
+The dead-band dead-reckons from the last persisted point along its velocity.
+A smoothed point is only persisted when it strays from that prediction by
+more than the tolerance, or when ``max_interval`` has passed since the last
+one, so a bus parked at a stop or cruising down a straight road writes a
+point every ``max_interval`` seconds instead of every ping.
+
+State is per process: with several workers each keeps its own tracks, which
+only costs some compression, never a lost turn.
+"""
+import math
+import threading
+
+from core.cache import TTLCache
+
+METERS_PER_DEGREE = 111320
+
+
+class Track:
+    __slots__ = ('lat0', 'lng0', 'x', 'y', 'vx', 'vy', 't', 'fixes', 'kept')
+
+    def __init__(self, lat, lng, t):
+        self.lat0, self.lng0 = lat, lng
+        self.x = self.y = self.vx = self.vy = 0.0
+        self.t = t
+        self.fixes = 1
+        # (x, y, vx, vy, t) of the last persisted point
+        self.kept = None
+
+    def to_xy(self, lat, lng):
+        return (
+            (lng - self.lng0) * METERS_PER_DEGREE * math.cos(math.radians(self.lat0)),
+            (lat - self.lat0) * METERS_PER_DEGREE,
+        )
+
+    def to_latlng(self, x, y):
+        return (
+            self.lat0 + y / METERS_PER_DEGREE,
+            self.lng0 + x / (METERS_PER_DEGREE * math.cos(math.radians(self.lat0))),
+        )
+
+
+class DeadBandFilter:
+    def __init__(self, tolerance=15, max_interval=30, reference_accuracy=10,
+                 reset_distance=250, reset_after=120, max_accuracy=50):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.reference_accuracy = reference_accuracy
+        self.reset_distance = reset_distance
+        self.max_accuracy = max_accuracy
+        # A track nobody pinged for ``reset_after`` seconds starts over
+        self._tracks = TTLCache(max_entries=4096, ttl=reset_after)
+        self._lock = threading.Lock()
+        self.seen = self.persisted = self.resets = 0
+
+    def gain(self, accuracy):
+        """Alpha for a fix of ``accuracy`` metres; beta follows as alpha^2 / (2 - alpha)."""
+        if accuracy is None:
+            return 0.5
+        return min(max(self.reference_accuracy / (self.reference_accuracy + accuracy), 0.1), 0.9)
+
+    def update(self, key, lat, lng, at, accuracy=None):
+        """
+        Feed one fix taken at epoch ``at``; returns ``(persist, lat, lng)`` with
+        the smoothed position.
+        """
+        lat, lng = float(lat), float(lng)
+        track = self._tracks.get(key)
+        restarted = False
+        if track is not None:
+            dt = at - track.t
+            zx, zy = track.to_xy(lat, lng)
+            px, py = track.x + track.vx * dt, track.y + track.vy * dt
+            rx, ry = zx - px, zy - py
+            restarted = dt <= 0 or math.hypot(rx, ry) > self.reset_distance
+
+        reset = track is None or restarted
+        if reset:
+            track = Track(lat, lng, at)
+            smoothed = (lat, lng)
+        else:
+            alpha = self.gain(accuracy)
+            beta = alpha * alpha / (2 - alpha)
+            track.x, track.y = px + alpha * rx, py + alpha * ry
+            track.vx += beta * rx / dt
+            track.vy += beta * ry / dt
+            track.t = at
+            track.fixes += 1
+            smoothed = track.to_latlng(track.x, track.y)
+
+        persist = reset or self._deviates(track, accuracy)
+        if persist:
+            track.kept = (track.x, track.y, track.vx, track.vy, track.t)
+        self._tracks.set(key, track)
+
+        with self._lock:
+            self.seen += 1
+            self.persisted += persist
+            self.resets += restarted
+        return persist, smoothed[0], smoothed[1]
+
+    def _deviates(self, track, accuracy):
+        if track.kept is None:
+            return True
+        x, y, vx, vy, t = track.kept
+        dt = track.t - t
+        if dt >= self.max_interval:
+            return True
+        # Within GPS noise of the dead-reckoned position is not a deviation
+        tolerance = max(self.tolerance, min(accuracy or 0, self.max_accuracy))
+        return math.hypot(track.x - (x + vx * dt), track.y - (y + vy * dt)) > tolerance
+
+    def speed(self, key):
+        """Smoothed speed (m/s) of ``key``'s track, None if it has none."""
+        track = self._tracks.get(key)
+        if track is None or track.fixes < 2:
+            return None
+        return math.hypot(track.vx, track.vy)
+
+    def forget(self, key):
+        self._tracks.delete(key)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'seen': self.seen,
+                'persisted': self.persisted,
+                'dropped': self.seen - self.persisted,
+                'track_resets': self.resets,
+                'compression_ratio': round(self.seen / self.persisted, 2) if self.persisted else None,
+            }
@@ -0,0 +1,88 @@
+"""
+Compact trajectories for archived journeys.
+
+``encode()`` packs a journey's trail into one blob: a version byte, the
+number of points and the first timestamp (epoch seconds) as varints, then
+per point the change in time (seconds) and in latitude and longitude
+(microdegrees) from the previous point, each a zigzag varint. A bus
+pinging every few seconds moves a few hundred microdegrees between points,
+so a point takes about 5 bytes instead of a LocationHistory row.
+Timestamps keep whole seconds and coordinates six decimals (about 0.1 m).
+"""
+from datetime import datetime, timezone as dt_timezone
+
+TRAJECTORY_VERSION = 1
+
+
+class TrajectoryError(ValueError):
+    """A blob that is not a trajectory of a known version."""
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value // 2 if not value & 1 else -(value + 1) // 2
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varints(data, offset=0):
+    """Yield the unsigned varints of ``data`` from ``offset`` on."""
+    value = shift = 0
+    for byte in memoryview(data)[offset:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield value
+        value = shift = 0
+    if shift:
+        raise TrajectoryError('Truncated trajectory')
+
+
+def encode(points):
+    """Pack ``(timestamp, latitude, longitude)`` points, in order, into bytes."""
+    out = bytearray([TRAJECTORY_VERSION])
+    body = bytearray()
+    count = 0
+    start = previous = None
+    lat = lng = 0
+    for timestamp, latitude, longitude in points:
+        seconds = round(timestamp.timestamp())
+        if start is None:
+            start = previous = seconds
+        micro_lat, micro_lng = round(float(latitude) * 1000000), round(float(longitude) * 1000000)
+        _write_varint(body, _zigzag(seconds - previous))
+        _write_varint(body, _zigzag(micro_lat - lat))
+        _write_varint(body, _zigzag(micro_lng - lng))
+        previous, lat, lng = seconds, micro_lat, micro_lng
+        count += 1
+    _write_varint(out, count)
+    _write_varint(out, start or 0)
+    return bytes(out + body)
+
+
+def decode(data):
+    """Yield the ``(timestamp, latitude, longitude)`` points of a blob from ``encode()``."""
+    data = bytes(data)
+    if not data or data[0] != TRAJECTORY_VERSION:
+        raise TrajectoryError('Unknown trajectory version')
+    varints = _read_varints(data, 1)
+    count = next(varints, 0)
+    seconds = next(varints, 0)
+    lat = lng = 0
+    for _ in range(count):
+        try:
+            seconds += _unzigzag(next(varints))
+            lat += _unzigzag(next(varints))
+            lng += _unzigzag(next(varints))
+        except StopIteration:
+            raise TrajectoryError('Truncated trajectory') from None
+        yield datetime.fromtimestamp(seconds, dt_timezone.utc), lat / 1000000, lng / 1000000
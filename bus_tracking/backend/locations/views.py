@@ -2,6 +2,7 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from accounts.decorators import driver_required
 from buses.models import Journey
+from core.pagination import keyset_paginate
 
 @login_required
 @driver_required
@@ -32,8 +33,8 @@ def journey_history(request):
         from django.shortcuts import redirect
         return redirect('accounts:dashboard')
     
-    journeys = Journey.objects.select_related('driver', 'bus', 'route').order_by('-start_time')[:100]
+    journeys = Journey.objects.select_related('driver', 'bus', 'route')
     context = {
-        'journeys': journeys,
+        'journeys': keyset_paginate(request, journeys, ordering=('-start_time', '-id'), per_page=50),
     }
     return render(request, 'locations/journey_history.html', context)
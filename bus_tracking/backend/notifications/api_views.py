@@ -4,9 +4,20 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db import models
+from core.fieldsets import requested_fields, wants_compact, serialized_list, sparse_only
+from core.mappers import RowMapper
+from core.pagination import CreatedAtCursorPagination
 from .models import Notification, UserNotification
 from .serializers import NotificationSerializer, UserNotificationSerializer
 
+UNREAD_NOTIFICATION_ROW = RowMapper(
+    ('notification_id', 'id'),
+    ('title', 'title'),
+    ('message', 'message'),
+    ('priority', 'priority'),
+    ('created_at', 'created_at'),
+)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def notification_list_api(request):
@@ -28,8 +39,14 @@ def notification_list_api(request):
         models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now)
     )
     
-    serializer = NotificationSerializer(notifications.order_by('-created_at')[:20], many=True)
-    return Response(serializer.data)
+    notifications = sparse_only(
+        notifications.select_related('created_by', 'target_route'), request, NotificationSerializer,
+        extra=('created_at',)
+    )
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(notifications, request)
+    serializer = NotificationSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serialized_list(request, serializer))
 
 
 @api_view(['GET'])
@@ -62,17 +79,12 @@ def unread_notifications_api(request):
     
     notifications = notifications.exclude(id__in=read_notification_ids)
     
-    result = []
-    for n in notifications.order_by('-created_at')[:10]:
-        result.append({
-            'notification_id': n.id,
-            'title': n.title,
-            'message': n.message,
-            'priority': n.priority,
-            'created_at': n.created_at.isoformat()
-        })
+    mapper = UNREAD_NOTIFICATION_ROW.select(requested_fields(request))
+    rows = notifications.order_by('-created_at').values_list(*mapper.columns)[:10]
     
-    return Response(result)
+    if wants_compact(request):
+        return Response(mapper.map_compact(rows))
+    return Response(mapper.map_all(rows))
 
 
 @api_view(['GET'])
@@ -82,8 +94,8 @@ def user_notifications_api(request):
         user=request.user
     ).select_related('notification').order_by('-notification__created_at')[:20]
     
-    serializer = UserNotificationSerializer(user_notifications, many=True)
-    return Response(serializer.data)
+    serializer = UserNotificationSerializer(user_notifications, many=True, context={'request': request})
+    return Response(serialized_list(request, serializer))
 
 
 @api_view(['POST'])
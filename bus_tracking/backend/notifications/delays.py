@@ -0,0 +1,69 @@
+"""
+Automatic delay alerts from schedule adherence (schedules.adherence).
+
+Adherence reports every bus's delay on each ETA recompute, about once a
+second per moving bus. ``DelayNotifier`` only touches the database when the
+delay crosses into another DELAY_NOTIFICATION_STEP-minute band at or above
+DELAY_ALERT_MINUTES, or halfway through the alert window to keep the alert
+alive, and the alert itself is coalesced per bus and route
+(``Notification.create_delay_notification``). A bus back under the
+threshold has its alert withdrawn.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from core.cache import TTLCache
+
+
+class DelayNotifier:
+    def __init__(self, threshold=5, step=5, window=1800):
+        self.threshold = threshold
+        self.step = step
+        self.window = window
+        # bus id -> (journey id, delay band, posted at) of the last alert posted here
+        self._posted = TTLCache(max_entries=1024, ttl=window)
+
+    def band(self, delay_minutes):
+        if delay_minutes < self.threshold:
+            return None
+        return (delay_minutes - self.threshold) // self.step
+
+    def observe(self, bus_id, route_id, journey_id, delay_minutes):
+        """Post, update or withdraw the bus's delay alert; returns True if the database was touched."""
+        from .models import Notification
+
+        band = self.band(delay_minutes)
+        posted = self._posted.get(bus_id)
+        now = timezone.now()
+        if posted is not None and posted[0] == journey_id and posted[1] == band:
+            if band is None or (now - posted[2]).total_seconds() < self.window / 2:
+                return False
+        self._posted.set(bus_id, (journey_id, band, now))
+
+        if band is None:
+            # Back on schedule: withdraw any alert the bus still has up
+            return bool(Notification.objects.filter(
+                notification_type='delay', related_bus_id=bus_id, target_route_id=route_id,
+                source='system', is_active=True
+            ).update(is_active=False))
+
+        from buses.models import Journey
+
+        journey = Journey.objects.select_related('driver', 'bus', 'route').get(pk=journey_id)
+        Notification.create_delay_notification(
+            driver=journey.driver,
+            bus=journey.bus,
+            route=journey.route,
+            delay_minutes=delay_minutes,
+            reason='Detected from live tracking.',
+            journey=journey,
+            source='system',
+        )
+        return True
+
+
+delay_notifier = DelayNotifier(
+    threshold=getattr(settings, 'DELAY_ALERT_MINUTES', 5),
+    step=getattr(settings, 'DELAY_NOTIFICATION_STEP', 5),
+    window=getattr(settings, 'DELAY_NOTIFICATION_WINDOW', 1800),
+)
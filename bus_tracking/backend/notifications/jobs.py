@@ -0,0 +1,10 @@
+from django.utils import timezone
+
+from core.jobs import periodic
+from .models import Notification
+
+
+@periodic(seconds=60)
+def expire_notifications():
+    """Deactivate notifications past their expiry time."""
+    Notification.objects.filter(is_active=True, expires_at__lte=timezone.now()).update(is_active=False)
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0003_notification_notificatio_created_3298c2_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="delay_minutes",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["notification_type", "related_bus", "-updated_at"],
+                name="notificatio_notific_d67f48_idx",
+            ),
+        ),
+    ]
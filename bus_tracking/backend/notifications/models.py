@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 from accounts.models import User
 from schedules.models import Route
 
@@ -51,6 +55,8 @@ class Notification(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_notifications')
     related_bus = models.ForeignKey('buses.Bus', on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
     related_journey = models.ForeignKey('buses.Journey', on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+    # Current delay of a (coalesced) delay alert
+    delay_minutes = models.IntegerField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -59,6 +65,10 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['notification_type', 'related_bus', '-updated_at']),
+        ]
 
     def __str__(self):
         return self.title
@@ -89,33 +99,56 @@ class Notification(models.Model):
         )
     
     @classmethod
-    def create_delay_notification(cls, driver, bus, route, delay_minutes, reason=''):
-        """Create a delay notification for admins and all users."""
-        # Create notification for admin and authority
-        cls.objects.create(
-            title=f"Delay Alert: {route.name}",
-            message=f"Bus {bus.bus_number} on route {route.name} is delayed by approximately {delay_minutes} minutes. {reason}",
-            notification_type='delay',
-            priority='warning',
-            source='driver',
-            target='admin_authority',
-            target_route=route,
-            created_by=driver,
-            related_bus=bus
-        )
-        
-        # Create notification for all users
-        return cls.objects.create(
-            title=f"Delay Alert: {route.name}",
-            message=f"Bus {bus.bus_number} on route {route.name} is delayed by approximately {delay_minutes} minutes. {reason}",
-            notification_type='delay',
-            priority='warning',
-            source='driver',
-            target='all',
-            target_route=route,
-            created_by=driver,
-            related_bus=bus
-        )
+    def create_delay_notification(cls, driver, bus, route, delay_minutes, reason='', journey=None, source='driver'):
+        """
+        Post a delay alert for ``bus`` on ``route``: one for admins and
+        authority, one for all users (returned).
+
+        Alerts are coalesced: while an active alert for the same bus, route
+        and audience was updated within DELAY_NOTIFICATION_WINDOW seconds it
+        is updated in place instead of adding another, and read receipts are
+        reset when the delay grows by DELAY_NOTIFICATION_STEP minutes so it
+        shows as unread.
+        """
+        window = timedelta(seconds=getattr(settings, 'DELAY_NOTIFICATION_WINDOW', 1800))
+        step = getattr(settings, 'DELAY_NOTIFICATION_STEP', 5)
+        now = timezone.now()
+        fields = {
+            'title': f"Delay Alert: {route.name}",
+            'message': f"Bus {bus.bus_number} on route {route.name} is delayed by approximately {delay_minutes} minutes. {reason}".strip(),
+            'priority': 'danger' if int(delay_minutes) >= 3 * step else 'warning',
+            'delay_minutes': int(delay_minutes),
+            'source': source,
+            'expires_at': now + window,
+        }
+
+        alert = None
+        with transaction.atomic():
+            for target in ('admin_authority', 'all'):
+                existing = cls.objects.select_for_update().filter(
+                    notification_type='delay', target=target, target_route=route, related_bus=bus,
+                    is_active=True, updated_at__gte=now - window
+                ).order_by('-updated_at').first()
+                if existing is None:
+                    alert = cls.objects.create(
+                        notification_type='delay',
+                        target=target,
+                        target_route=route,
+                        created_by=driver,
+                        related_bus=bus,
+                        related_journey=journey,
+                        **fields
+                    )
+                    continue
+
+                previous = existing.delay_minutes
+                for name, value in fields.items():
+                    setattr(existing, name, value)
+                existing.save(update_fields=[*fields, 'updated_at'])
+                if previous is not None and int(delay_minutes) - previous >= step:
+                    existing.user_notifications.filter(is_read=True).update(is_read=False, read_at=None)
+                alert = existing
+        return alert
 
 
 class UserNotification(models.Model):
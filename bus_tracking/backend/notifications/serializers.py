@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from core.fieldsets import SparseFieldsMixin
 from .models import Notification, UserNotification
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     route_name = serializers.CharField(source='target_route.name', read_only=True)
 
@@ -9,10 +10,10 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'title', 'message', 'priority', 'target', 'target_route',
                   'route_name', 'created_by', 'created_by_name', 'is_active',
-                  'expires_at', 'created_at']
+                  'delay_minutes', 'expires_at', 'created_at', 'updated_at']
 
 
-class UserNotificationSerializer(serializers.ModelSerializer):
+class UserNotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     notification = NotificationSerializer(read_only=True)
 
     class Meta:
@@ -1,10 +1,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.utils import timezone
 from accounts.decorators import admin_required
 from accounts.models import User
+from core.pagination import keyset_paginate
 from .models import Notification, UserNotification
 from .forms import NotificationForm
 
@@ -19,11 +19,8 @@ def notification_list(request):
         else:
             notifications = notifications.filter(target__in=['all', 'users'])
     
-    notifications = notifications.select_related('created_by', 'target_route').order_by('-created_at')
-    
-    paginator = Paginator(notifications, 15)
-    page = request.GET.get('page')
-    notifications = paginator.get_page(page)
+    notifications = notifications.select_related('created_by', 'target_route')
+    notifications = keyset_paginate(request, notifications, per_page=15)
     
     return render(request, 'notifications/notification_list.html', {'notifications': notifications})
 
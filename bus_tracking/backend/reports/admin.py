@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import TripLog, UserFeedback, RouteAnalytics
+from .models import TripLog, StopVisit, UserFeedback, RouteAnalytics
+
+class StopVisitInline(admin.TabularInline):
+    model = StopVisit
+    extra = 0
+    readonly_fields = ('stop', 'arrived_at', 'departed_at', 'dwell_seconds')
 
 @admin.register(TripLog)
 class TripLogAdmin(admin.ModelAdmin):
@@ -7,6 +12,7 @@ class TripLogAdmin(admin.ModelAdmin):
     list_filter = ('is_completed', 'date', 'route')
     search_fields = ('route__name', 'bus__bus_number')
     date_hierarchy = 'date'
+    inlines = [StopVisitInline]
 
 @admin.register(UserFeedback)
 class UserFeedbackAdmin(admin.ModelAdmin):
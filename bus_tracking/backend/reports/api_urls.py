@@ -7,4 +7,6 @@ urlpatterns = [
     path('feedback-summary/', api_views.feedback_summary_api, name='api_feedback_summary'),
     path('feedback/submit/', api_views.submit_feedback_api, name='api_submit_feedback'),
     path('export/', api_views.export_data_api, name='api_export_data'),
+    path('archive/speed-profile/', api_views.speed_profile_api, name='api_archive_speed_profile'),
+    path('archive/heatmap/', api_views.heatmap_api, name='api_archive_heatmap'),
 ]
@@ -5,11 +5,14 @@ from rest_framework.response import Response
 from django.db.models import Count, Avg, Sum
 from django.utils import timezone
 from datetime import timedelta
+from core.replica import replica_safe
+from . import archive
 from .models import TripLog, UserFeedback, RouteAnalytics
 from .serializers import TripLogSerializer, UserFeedbackSerializer, RouteAnalyticsSerializer
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_safe
 def route_analytics_api(request):
     if request.user.role not in ['admin', 'authority']:
         return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
@@ -32,6 +35,7 @@ def route_analytics_api(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_safe
 def performance_summary_api(request):
     if request.user.role not in ['admin', 'authority']:
         return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
@@ -53,6 +57,7 @@ def performance_summary_api(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_safe
 def feedback_summary_api(request):
     if request.user.role not in ['admin', 'authority']:
         return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
@@ -85,6 +90,7 @@ def submit_feedback_api(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_safe
 def export_data_api(request):
     if request.user.role not in ['admin', 'authority']:
         return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
@@ -114,3 +120,46 @@ def export_data_api(request):
         return Response({'error': 'Invalid report type'}, status=status.HTTP_400_BAD_REQUEST)
     
     return Response(serializer.data)
+
+
+def _archived_range(request):
+    """The last ``days`` closed days and the ``bus`` ids (comma separated) of an archive query."""
+    days = int(request.GET.get('days', 30))
+    end, _ = archive.day_bounds(timezone.localdate())
+    bus_ids = [int(pk) for pk in request.GET['bus'].split(',')] if request.GET.get('bus') else None
+    return end - timedelta(days=days), end, bus_ids
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def speed_profile_api(request):
+    """Average bus speed by hour of day, from the Parquet archive (reports.archive)."""
+    if request.user.role not in ['admin', 'authority']:
+        return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        start, end, bus_ids = _archived_range(request)
+        return Response(archive.speed_profile(start, end, bus_ids))
+    except ValueError:
+        return Response({'error': 'days and bus must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    except archive.ArchiveUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def heatmap_api(request):
+    """Bus positions per grid cell (``cell`` degrees), from the Parquet archive (reports.archive)."""
+    if request.user.role not in ['admin', 'authority']:
+        return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        start, end, bus_ids = _archived_range(request)
+        cell = float(request.GET.get('cell', 0.005))
+        if cell <= 0:
+            raise ValueError
+        return Response(archive.heatmap(start, end, bus_ids, cell_deg=cell))
+    except ValueError:
+        return Response({'error': 'days and bus must be integers, cell a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+    except archive.ArchiveUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
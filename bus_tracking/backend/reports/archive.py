@@ -0,0 +1,304 @@
+"""
+Columnar archive of the location tables.
+
+Closed days of BusLocation (``bus_locations``) and LocationHistory
+(``location_history``) are exported to Parquet under ``LOCATION_ARCHIVE_DIR``,
+partitioned by date and bus::
+
+    bus_locations/date=2026-10-18/bus=12/part-0.parquet
+    location_history/date=2026-10-18/bus=12/driver-7.parquet
+
+A day is written to a hidden directory and renamed into place with a
+``_SUCCESS`` marker, so readers never see half a day. History points are
+given the bus of the journey they fall in (bus 0 outside any journey).
+With the telemetry segment log enabled (locations.segments) the pings it
+took in place of LocationHistory are exported with them, one file per
+hour, and its retention never drops an hour whose day is not archived yet.
+
+``scan()`` reads the files with ``pyarrow.dataset``: dates and buses outside
+the query are never opened and timestamp filters are checked against the
+row group statistics before any data is read. ``sql()`` runs DuckDB over the
+same files. Analytics can use either without touching the live database;
+pyarrow and duckdb are both optional.
+"""
+import os
+import shutil
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+    import pyarrow.dataset
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover
+    duckdb = None
+
+BUS_LOCATIONS = 'bus_locations'
+LOCATION_HISTORY = 'location_history'
+DATASETS = (BUS_LOCATIONS, LOCATION_HISTORY)
+SUCCESS_MARKER = '_SUCCESS'
+
+
+class ArchiveUnavailable(Exception):
+    """pyarrow is not installed or LOCATION_ARCHIVE_DIR is not set."""
+
+
+def archive_dir():
+    directory = getattr(settings, 'LOCATION_ARCHIVE_DIR', None)
+    if pyarrow is None or not directory:
+        raise ArchiveUnavailable('The location archive is not available')
+    return str(directory)
+
+
+def _schema(dataset):
+    fields = [('timestamp', pyarrow.timestamp('us', tz='UTC'))]
+    if dataset == BUS_LOCATIONS:
+        fields += [
+            ('latitude', pyarrow.float64()), ('longitude', pyarrow.float64()),
+            ('speed', pyarrow.float32()), ('heading', pyarrow.float32()),
+            ('is_accurate', pyarrow.bool_()),
+        ]
+    else:
+        fields += [
+            ('driver', pyarrow.int64()), ('journey', pyarrow.int64()),
+            ('latitude', pyarrow.float64()), ('longitude', pyarrow.float64()),
+        ]
+    return pyarrow.schema(fields)
+
+
+def _partitioning():
+    return pyarrow.dataset.partitioning(
+        pyarrow.schema([('date', pyarrow.date32()), ('bus', pyarrow.int64())]), flavor='hive'
+    )
+
+
+def day_path(dataset, day):
+    return os.path.join(archive_dir(), dataset, f'date={day.isoformat()}')
+
+
+def is_exported(dataset, day):
+    return os.path.exists(os.path.join(day_path(dataset, day), SUCCESS_MARKER))
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+class _DayWriter:
+    """Collects rows and writes one Parquet file per call to ``flush()``."""
+
+    def __init__(self, dataset, directory):
+        self.schema = _schema(dataset)
+        self.directory = directory
+        self.rows = 0
+        self._columns = {}
+
+    def add(self, bus, row):
+        columns = self._columns.setdefault(bus, [[] for _ in self.schema])
+        for column, value in zip(columns, row):
+            column.append(value)
+
+    def flush(self, name):
+        for bus, columns in self._columns.items():
+            table = pyarrow.Table.from_arrays(
+                [pyarrow.array(column, field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema,
+            )
+            path = os.path.join(self.directory, f'bus={bus}')
+            os.makedirs(path, exist_ok=True)
+            pyarrow.parquet.write_table(table, os.path.join(path, f'{name}.parquet'), compression='zstd')
+            self.rows += table.num_rows
+        self._columns = {}
+
+
+def _export_bus_locations(writer, start, end):
+    from buses.models import BusLocation
+
+    rows = BusLocation.objects.filter(timestamp__gte=start, timestamp__lt=end).order_by('bus_id', 'timestamp').values_list(
+        'bus_id', 'timestamp', 'latitude', 'longitude', 'speed', 'heading', 'is_accurate'
+    )
+    current = None
+    for bus, timestamp, latitude, longitude, speed, heading, is_accurate in rows.iterator(chunk_size=5000):
+        if bus != current and current is not None:
+            writer.flush('part-0')
+        current = bus
+        writer.add(bus, (
+            timestamp, float(latitude), float(longitude),
+            float(speed) if speed is not None else None,
+            float(heading) if heading is not None else None,
+            is_accurate,
+        ))
+    writer.flush('part-0')
+
+
+def _export_location_history(writer, start, end):
+    from buses.models import Journey
+    from locations.models import LocationHistory
+
+    # Journeys overlapping the day, per driver, to find each point's bus
+    journeys = {}
+    for pk, driver, bus, started, ended in Journey.objects.filter(start_time__lt=end).exclude(
+        end_time__lt=start
+    ).order_by('start_time').values_list('id', 'driver_id', 'bus_id', 'start_time', 'end_time'):
+        journeys.setdefault(driver, []).append((started, ended or end, pk, bus))
+
+    rows = LocationHistory.objects.filter(timestamp__gte=start, timestamp__lt=end).order_by('driver_id', 'timestamp').values_list(
+        'driver_id', 'timestamp', 'latitude', 'longitude'
+    )
+    current = None
+    for driver, timestamp, latitude, longitude in rows.iterator(chunk_size=5000):
+        if driver != current:
+            if current is not None:
+                writer.flush(f'driver-{current}')
+            current, windows = driver, list(journeys.get(driver, ()))
+        # Points come in time order, so passed journeys can be dropped
+        while windows and windows[0][1] < timestamp:
+            windows.pop(0)
+        journey, bus = None, 0
+        if windows and windows[0][0] <= timestamp:
+            journey, bus = windows[0][2], windows[0][3]
+        writer.add(bus, (timestamp, driver, journey, float(latitude), float(longitude)))
+    if current is not None:
+        writer.flush(f'driver-{current}')
+
+    from locations import segments
+
+    log = segments.segment_log
+    if log is None:
+        return
+    start_us, end_us = segments.to_micros(start), segments.to_micros(end)
+    for hour in log.hours():
+        if not start_us // 3600000000 <= hour <= (end_us - 1) // 3600000000:
+            continue
+        for micros, bus, journey, driver, latitude, longitude, _, _ in log.segment(hour).records():
+            if start_us <= micros < end_us:
+                writer.add(bus, (
+                    segments.from_micros(micros), driver or None, journey or None,
+                    latitude / 1000000, longitude / 1000000,
+                ))
+        writer.flush(f'segment-{hour}')
+
+
+def export_day(day, overwrite=False):
+    """Export ``day`` of every dataset not yet exported; returns rows written per dataset."""
+    start, end = day_bounds(day)
+    exported = {}
+    for dataset, export in ((BUS_LOCATIONS, _export_bus_locations), (LOCATION_HISTORY, _export_location_history)):
+        final = day_path(dataset, day)
+        if is_exported(dataset, day) and not overwrite:
+            continue
+        partial = os.path.join(os.path.dirname(final), f'.{os.path.basename(final)}.{os.getpid()}')
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        writer = _DayWriter(dataset, partial)
+        export(writer, start, end)
+        open(os.path.join(partial, SUCCESS_MARKER), 'w').close()
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(partial, final)
+        exported[dataset] = writer.rows
+    return exported
+
+
+def hour_is_exported(dataset, hour):
+    """Whether the days of epoch ``hour`` (local time) are all exported."""
+    start = datetime.fromtimestamp(hour * 3600, dt_timezone.utc)
+    days = {timezone.localdate(start), timezone.localdate(start + timedelta(seconds=3599))}
+    return all(is_exported(dataset, day) for day in days)
+
+
+def scan(dataset, start, end, bus_ids=None, columns=None):
+    """
+    pyarrow Table of the archived rows of ``dataset`` with ``start <=
+    timestamp < end`` (aware datetimes), optionally only ``bus_ids``, with
+    ``columns`` (all by default, plus ``date`` and ``bus``).
+    """
+    schema = _schema(dataset).append(pyarrow.field('date', pyarrow.date32())).append(
+        pyarrow.field('bus', pyarrow.int64())
+    )
+    path = os.path.join(archive_dir(), dataset)
+    if not os.path.isdir(path):
+        table = schema.empty_table()
+        return table.select(columns) if columns else table
+
+    files = pyarrow.dataset.dataset(path, schema=schema, format='parquet', partitioning=_partitioning())
+    stamp = pyarrow.timestamp('us', tz='UTC')
+    condition = (
+        (pc.field('date') >= pyarrow.scalar(timezone.localtime(start).date()))
+        & (pc.field('date') <= pyarrow.scalar(timezone.localtime(end).date()))
+        & (pc.field('timestamp') >= pyarrow.scalar(start, stamp))
+        & (pc.field('timestamp') < pyarrow.scalar(end, stamp))
+    )
+    if bus_ids:
+        condition &= pc.field('bus').isin(list(bus_ids))
+    return files.to_table(columns=columns, filter=condition)
+
+
+def sql(query, params=None):
+    """
+    Run a DuckDB query over the archive, where ``bus_locations`` and
+    ``location_history`` are views of the Parquet files; returns
+    ``(column names, rows)``.
+    """
+    if duckdb is None:
+        raise ArchiveUnavailable('DuckDB is not installed')
+    root = archive_dir()
+    connection = duckdb.connect()
+    try:
+        for dataset in DATASETS:
+            path = os.path.join(root, dataset)
+            if not os.path.isdir(path) or not any(name.startswith('date=') for name in os.listdir(path)):
+                continue
+            # Days still being written sit in hidden directories the pattern skips
+            pattern = os.path.join(path, 'date=*', 'bus=*', '*.parquet').replace("'", "''")
+            connection.execute(
+                f"CREATE VIEW {dataset} AS SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)"
+            )
+        result = connection.execute(query, params or [])
+        return [column[0] for column in result.description], result.fetchall()
+    finally:
+        connection.close()
+
+
+def speed_profile(start, end, bus_ids=None):
+    """Average speed (km/h) and sample count of moving buses by hour of day."""
+    table = scan(BUS_LOCATIONS, start, end, bus_ids, columns=['timestamp', 'speed'])
+    table = table.filter(pc.greater(table['speed'], 0))
+    # Hours of a zoned timestamp are taken in its zone
+    local = table['timestamp'].cast(pyarrow.timestamp('us', tz=timezone.get_current_timezone_name()))
+    grouped = pyarrow.table({'hour': pc.hour(local), 'speed': table['speed']}).group_by('hour').aggregate(
+        [('speed', 'mean'), ('speed', 'count')]
+    ).sort_by('hour')
+    return [
+        {'hour': hour, 'avg_speed_kmh': round(speed, 1), 'samples': count}
+        for hour, speed, count in zip(
+            grouped['hour'].to_pylist(), grouped['speed_mean'].to_pylist(), grouped['speed_count'].to_pylist()
+        )
+    ]
+
+
+def heatmap(start, end, bus_ids=None, cell_deg=0.005):
+    """Bus positions per ``cell_deg`` grid cell, keyed by the cell centre."""
+    table = scan(BUS_LOCATIONS, start, end, bus_ids, columns=['latitude', 'longitude'])
+    cells = pyarrow.table({
+        'row': pc.floor(pc.divide(table['latitude'], cell_deg)),
+        'col': pc.floor(pc.divide(table['longitude'], cell_deg)),
+    }).group_by(['row', 'col']).aggregate([([], 'count_all')])
+    return [
+        {
+            'latitude': round((row + 0.5) * cell_deg, 6),
+            'longitude': round((col + 0.5) * cell_deg, 6),
+            'count': count,
+        }
+        for row, col, count in zip(
+            cells['row'].to_pylist(), cells['col'].to_pylist(), cells['count_all'].to_pylist()
+        )
+    ]
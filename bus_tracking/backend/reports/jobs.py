@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.jobs import periodic
+from . import archive
+
+
+@periodic(seconds=3600)
+def export_location_archive():
+    """Export the last LOCATION_ARCHIVE_LOOKBACK_DAYS closed days to the Parquet archive (reports.archive)."""
+    try:
+        archive.archive_dir()
+    except archive.ArchiveUnavailable:
+        return
+    today = timezone.localdate()
+    for days_ago in range(getattr(settings, 'LOCATION_ARCHIVE_LOOKBACK_DAYS', 7), 0, -1):
+        archive.export_day(today - timedelta(days=days_ago))
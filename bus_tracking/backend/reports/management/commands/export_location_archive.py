@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from reports import archive
+
+
+class Command(BaseCommand):
+    help = 'Export closed days of the location tables to the Parquet archive (reports.archive)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='First day to export (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument('--days', type=int, default=1, help='Number of days from --date on')
+        parser.add_argument('--overwrite', action='store_true', help='Export days already in the archive again')
+
+    def handle(self, *args, **options):
+        try:
+            archive.archive_dir()
+        except archive.ArchiveUnavailable as e:
+            raise CommandError(f'{e} (install pyarrow and set LOCATION_ARCHIVE_DIR)')
+
+        today = timezone.localdate()
+        first = parse_date(options['date']) if options['date'] else today - timedelta(days=1)
+        if first is None:
+            raise CommandError('--date must be YYYY-MM-DD')
+
+        for offset in range(options['days']):
+            day = first + timedelta(days=offset)
+            if day >= today:
+                self.stdout.write(self.style.WARNING(f'{day} is not over yet, skipped'))
+                continue
+            exported = archive.export_day(day, overwrite=options['overwrite'])
+            if not exported:
+                self.stdout.write(f'{day} already exported')
+            for dataset, rows in exported.items():
+                self.stdout.write(self.style.SUCCESS(f'{day} {dataset}: {rows} rows'))
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0008_busassignment_unique_active_assignment_per_bus_and_more"),
+        ("schedules", "0005_schedule_bus_schedule_driver_alter_route_color"),
+        ("reports", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="triplog",
+            name="journey",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="trip_logs",
+                to="buses.journey",
+            ),
+        ),
+        migrations.CreateModel(
+            name="StopVisit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("arrived_at", models.DateTimeField()),
+                ("departed_at", models.DateTimeField(blank=True, null=True)),
+                ("dwell_seconds", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "stop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visits",
+                        to="schedules.stop",
+                    ),
+                ),
+                (
+                    "trip_log",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stop_visits",
+                        to="reports.triplog",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "stop_visits",
+                "ordering": ["arrived_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["trip_log", "stop"],
+                        name="stop_visits_trip_lo_2a385a_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Keep the first trip log per journey and the first visit per stop and
+    trip, so the constraints can be added."""
+    TripLog = apps.get_model("reports", "TripLog")
+    StopVisit = apps.get_model("reports", "StopVisit")
+
+    first_log = {}
+    for log in TripLog.objects.filter(journey__isnull=False).order_by(
+        "created_at", "id"
+    ):
+        kept = first_log.setdefault(log.journey_id, log)
+        if kept is log:
+            continue
+        # Later logs of the journey hand their actuals and visits over
+        kept.actual_departure = kept.actual_departure or log.actual_departure
+        if not kept.is_completed and log.is_completed:
+            kept.actual_arrival, kept.is_completed = log.actual_arrival, True
+        kept.save(update_fields=["actual_departure", "actual_arrival", "is_completed"])
+        StopVisit.objects.filter(trip_log_id=log.pk).update(trip_log_id=kept.pk)
+        log.delete()
+
+    first_visit = {}
+    for visit in StopVisit.objects.order_by("arrived_at", "id"):
+        key = (visit.trip_log_id, visit.stop_id)
+        kept = first_visit.setdefault(key, visit)
+        if kept is visit:
+            continue
+        if kept.departed_at is None and visit.departed_at is not None:
+            kept.departed_at = visit.departed_at
+            kept.dwell_seconds = int(
+                (visit.departed_at - kept.arrived_at).total_seconds()
+            )
+            kept.save(update_fields=["departed_at", "dwell_seconds"])
+        visit.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0002_triplog_journey_stopvisit"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="stopvisit",
+            constraint=models.UniqueConstraint(
+                fields=("trip_log", "stop"), name="unique_stop_visit_per_trip"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="stopvisit",
+            name="stop_visits_trip_lo_2a385a_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="triplog",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("journey__isnull", False)),
+                fields=("journey",),
+                name="unique_trip_log_per_journey",
+            ),
+        ),
+    ]
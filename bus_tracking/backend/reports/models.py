@@ -1,12 +1,13 @@
 from django.db import models
 from accounts.models import User
-from schedules.models import Route
-from buses.models import Bus
+from schedules.models import Route, Stop
+from buses.models import Bus, Journey
 
 class TripLog(models.Model):
     bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='trip_logs')
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='trip_logs')
     driver = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='trip_logs')
+    journey = models.ForeignKey(Journey, on_delete=models.SET_NULL, null=True, blank=True, related_name='trip_logs')
     date = models.DateField()
     scheduled_departure = models.TimeField()
     actual_departure = models.TimeField(null=True, blank=True)
@@ -20,6 +21,12 @@ class TripLog(models.Model):
     class Meta:
         db_table = 'trip_logs'
         ordering = ['-date', '-scheduled_departure']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['journey'], condition=models.Q(journey__isnull=False),
+                name='unique_trip_log_per_journey'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.route.name} - {self.date}"
@@ -39,6 +46,25 @@ class TripLog(models.Model):
         return self.departure_delay_mins <= 5
 
 
+class StopVisit(models.Model):
+    """A bus's stay at a stop, recorded from its geofence arrival and departure."""
+    trip_log = models.ForeignKey(TripLog, on_delete=models.CASCADE, related_name='stop_visits')
+    stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name='visits')
+    arrived_at = models.DateTimeField()
+    departed_at = models.DateTimeField(null=True, blank=True)
+    dwell_seconds = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'stop_visits'
+        ordering = ['arrived_at']
+        constraints = [
+            models.UniqueConstraint(fields=['trip_log', 'stop'], name='unique_stop_visit_per_trip'),
+        ]
+
+    def __str__(self):
+        return f"{self.stop.name} @ {self.arrived_at}"
+
+
 class UserFeedback(models.Model):
     RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
     
@@ -0,0 +1,100 @@
+"""
+Trip logs from geofence events (schedules.geofence).
+
+Each journey gets a TripLog the first time its bus reaches or leaves a stop;
+its scheduled times come from the route's trip departing closest to then.
+Leaving the first stop sets ``actual_departure``, reaching the last one sets
+``actual_arrival`` and completes the log, and every stop stay becomes a
+StopVisit with its dwell time. Unique constraints allow one TripLog per
+journey and one visit per stop of a trip, so a second worker replaying the
+same event finds the first one's rows instead of adding its own.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from schedules.adherence import match_trip
+from schedules.geofence import ARRIVAL
+from schedules.models import Stop, TripStopTime
+from .models import StopVisit, TripLog
+
+
+def scheduled_times(route_id, at):
+    """(departure, arrival) of the route's trip closest to ``at`` (a time)."""
+    trip = match_trip(route_id, at)
+    if trip is not None:
+        last_stop = TripStopTime.objects.filter(trip=trip).order_by('-order').values_list('arrival_time', flat=True).first()
+        return trip.departure_time, trip.arrival_time or last_stop or trip.departure_time
+
+    times = list(
+        Stop.objects.filter(route_id=route_id, scheduled_time__isnull=False)
+        .order_by('order').values_list('scheduled_time', flat=True)
+    )
+    if times:
+        return times[0], times[-1]
+    return at, at
+
+
+def trip_log_for(event, driver_id=None):
+    local = timezone.localtime(event.at)
+    if event.trip_key is not None:
+        trip_log = TripLog.objects.filter(journey_id=event.trip_key).first()
+    else:
+        trip_log = TripLog.objects.filter(
+            bus_id=event.bus_id, route_id=event.route_id, date=local.date(),
+            journey__isnull=True, is_completed=False,
+        ).order_by('-created_at').first()
+    if trip_log is not None:
+        return trip_log
+
+    departure, arrival = scheduled_times(event.route_id, local.time())
+    values = {
+        'bus_id': event.bus_id,
+        'route_id': event.route_id,
+        'driver_id': driver_id,
+        'date': local.date(),
+        'scheduled_departure': departure,
+        'scheduled_arrival': arrival,
+    }
+    if event.trip_key is None:
+        return TripLog.objects.create(**values)
+    # Another worker may have created it since
+    return TripLog.objects.get_or_create(journey_id=event.trip_key, defaults=values)[0]
+
+
+def record_stop_events(events, driver_id=None):
+    """Apply a ping's geofence events to its TripLog."""
+    if not events:
+        return None
+    with transaction.atomic():
+        trip_log = trip_log_for(events[0], driver_id)
+        for event in events:
+            local_time = timezone.localtime(event.at).time().replace(microsecond=0)
+
+            if event.kind == ARRIVAL:
+                StopVisit.objects.get_or_create(
+                    trip_log=trip_log, stop_id=event.stop.id, defaults={'arrived_at': event.at}
+                )
+                if event.is_last and not trip_log.is_completed:
+                    trip_log.actual_arrival = local_time
+                    trip_log.is_completed = True
+                    trip_log.save(update_fields=['actual_arrival', 'is_completed'])
+                continue
+
+            # Without a visit the arrival was seen by another worker, or before a restart
+            visit, created = StopVisit.objects.get_or_create(
+                trip_log=trip_log, stop_id=event.stop.id, defaults={
+                    'arrived_at': event.at - timedelta(seconds=event.dwell_seconds),
+                    'departed_at': event.at,
+                    'dwell_seconds': event.dwell_seconds,
+                }
+            )
+            if not created:
+                StopVisit.objects.filter(pk=visit.pk, departed_at__isnull=True).update(
+                    departed_at=event.at, dwell_seconds=event.dwell_seconds
+                )
+            if event.is_first and trip_log.actual_departure is None:
+                trip_log.actual_departure = local_time
+                trip_log.save(update_fields=['actual_departure'])
+    return trip_log
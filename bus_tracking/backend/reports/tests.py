@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from core import replica
+from core.replica import REPLICA_DB, LagMonitor
+from locations import jobs, segments
+from locations.segments import SegmentLog
+from schedules.models import Route
+
+from . import archive
+from .models import RouteAnalytics
+
+
+@unittest.skipIf(archive.pyarrow is None, 'pyarrow is not installed')
+class SegmentLogArchiveTests(TestCase):
+    """With the segment log replacing LocationHistory, its pings still reach the archive."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.log = SegmentLog(os.path.join(self.directory, 'segments'))
+        for target in (segments, jobs):
+            patcher = mock.patch.object(target, 'segment_log', self.log)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings = override_settings(LOCATION_ARCHIVE_DIR=os.path.join(self.directory, 'archive'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.day = timezone.localdate() - timedelta(days=2)
+        self.noon = timezone.make_aware(datetime.combine(self.day, time(12)))
+        for minute in range(3):
+            self.log.append(
+                self.noon + timedelta(minutes=minute), 7, 23.8 + minute / 1000, 90.4,
+                journey_id=3, driver_id=5, speed=8.0,
+            )
+        # The next day is not part of the export
+        self.log.append(self.noon + timedelta(days=1), 7, 23.9, 90.4, journey_id=4, driver_id=5)
+
+    def test_export_reads_the_segment_log(self):
+        exported = archive.export_day(self.day)
+        self.assertEqual(exported[archive.LOCATION_HISTORY], 3)
+
+        start, end = archive.day_bounds(self.day)
+        table = archive.scan(archive.LOCATION_HISTORY, start, end).sort_by('timestamp')
+        self.assertEqual(table['bus'].to_pylist(), [7, 7, 7])
+        self.assertEqual(table['journey'].to_pylist(), [3, 3, 3])
+        self.assertEqual(table['driver'].to_pylist(), [5, 5, 5])
+        self.assertEqual(table['latitude'].to_pylist(), [23.8, 23.801, 23.802])
+        self.assertEqual(table['timestamp'].to_pylist()[0], self.noon)
+
+    def test_retention_keeps_hours_not_archived(self):
+        hours = self.log.hours()
+        with override_settings(TELEMETRY_SEGMENT_RETENTION_HOURS=0):
+            jobs.index_segments()
+            self.assertEqual(self.log.hours(), hours)
+
+            archive.export_day(self.day)
+            jobs.index_segments()
+        self.assertEqual(self.log.hours(), hours[1:])
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reports marked replica_safe read from the replica while it keeps up."""
+
+    databases = {DEFAULT_DB_ALIAS, REPLICA_DB}
+
+    @classmethod
+    def setUpClass(cls):
+        # REPLICA_STANDIN=True: the test database opened a second time.
+        # connections.settings is settings.DATABASES, so replica_enabled() sees it
+        connections.settings[REPLICA_DB] = dict(
+            connections.settings[DEFAULT_DB_ALIAS], TEST={'MIRROR': DEFAULT_DB_ALIAS}
+        )
+
+        def remove_standin():
+            connections[REPLICA_DB].close()
+            del connections[REPLICA_DB]
+            del connections.settings[REPLICA_DB]
+        cls.addClassCleanup(remove_standin)
+        super().setUpClass()
+
+    def setUp(self):
+        patcher = mock.patch.object(replica, 'lag_monitor', LagMonitor())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        route = Route.objects.create(name='R1')
+        RouteAnalytics.objects.create(route=route, date=timezone.localdate(), total_trips=4)
+        admin = User.objects.create_user('admin', password='x', role='admin')
+        self.client.force_login(admin)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA_DB]) as standin:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        touched = lambda queries: any('route_analytics' in query['sql'] for query in queries)
+        return response, touched(primary.captured_queries), touched(standin.captured_queries)
+
+    def test_reports_read_from_the_replica(self):
+        for url in ('/api/reports/analytics/', '/reports/route-popularity/'):
+            with self.subTest(url=url):
+                response, on_primary, on_replica = self.get(url)
+                self.assertFalse(on_primary)
+                self.assertTrue(on_replica)
+        self.assertEqual(response.context['route_stats'][0]['total_trips'], 4)
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        with mock.patch.object(replica, 'replica_lag', return_value=settings.REPLICA_MAX_LAG + 1):
+            response, on_primary, on_replica = self.get('/api/reports/analytics/')
+        self.assertTrue(on_primary)
+        self.assertFalse(on_replica)
+        self.assertEqual(response.data[0]['total_trips'], 4)
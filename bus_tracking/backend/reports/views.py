@@ -1,12 +1,13 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Avg, Sum, Q
+from django.db.models import Count, Avg, Sum, Max, Q
 from django.utils import timezone
 from datetime import timedelta
 from accounts.decorators import admin_or_authority_required
+from core.replica import replica_safe
 from schedules.models import Route
-from buses.models import Bus
+from buses.models import Bus, Journey
 from issues.models import Issue
 from .models import TripLog, UserFeedback, RouteAnalytics
 from .forms import FeedbackForm, DateRangeForm
@@ -19,6 +20,7 @@ def report_list(request):
 
 @login_required
 @admin_or_authority_required
+@replica_safe
 def route_popularity(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
@@ -49,6 +51,7 @@ def route_popularity(request):
 
 @login_required
 @admin_or_authority_required
+@replica_safe
 def on_time_performance(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
@@ -89,6 +92,7 @@ def on_time_performance(request):
 
 @login_required
 @admin_or_authority_required
+@replica_safe
 def driver_incidents(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
@@ -128,6 +132,7 @@ def driver_incidents(request):
 
 @login_required
 @admin_or_authority_required
+@replica_safe
 def user_feedback_report(request):
     feedbacks = UserFeedback.objects.select_related('user', 'route', 'bus').order_by('-created_at')[:50]
     
@@ -163,6 +168,7 @@ def submit_feedback(request):
 
 @login_required
 @admin_or_authority_required
+@replica_safe
 def authority_reports(request):
     """Main reports dashboard for authority users"""
     from buses.models import BusAssignment
@@ -178,6 +184,9 @@ def authority_reports(request):
         'total_drivers': User.objects.filter(role='driver').count(),
         'active_issues': Issue.objects.filter(status='pending').count(),
         'total_trips_30d': RouteAnalytics.objects.filter(date__gte=last_30_days).aggregate(total=Sum('total_trips'))['total'] or 0,
+        'distance_km_30d': Journey.objects.filter(
+            start_time__date__gte=last_30_days
+        ).aggregate(total=Sum('distance_km'))['total'] or 0,
     }
     
     # Recent issues
@@ -200,6 +209,7 @@ def authority_reports(request):
 
 @login_required
 @admin_or_authority_required
+@replica_safe
 def driver_logs(request):
     """Driver activity and incident logs"""
     from buses.models import BusAssignment
@@ -228,6 +238,27 @@ def driver_logs(request):
         ))
     ).order_by('-total_assignments')
     
+    # Driving statistics from the journeys' odometer columns
+    journey_stats = {
+        row['driver_id']: row
+        for row in Journey.objects.filter(
+            driver__role='driver',
+            start_time__date__gte=start_date,
+            start_time__date__lte=end_date
+        ).values('driver_id').annotate(
+            journeys=Count('id'),
+            distance_km=Sum('distance_km'),
+            idle_seconds=Sum('idle_seconds'),
+            max_speed_kmh=Max('max_speed_kmh')
+        )
+    }
+    for driver in drivers:
+        stats = journey_stats.get(driver.pk, {})
+        driver.total_journeys = stats.get('journeys', 0)
+        driver.distance_km = stats.get('distance_km') or 0
+        driver.idle_minutes = (stats.get('idle_seconds') or 0) // 60
+        driver.max_speed_kmh = stats.get('max_speed_kmh') or 0
+    
     # Recent assignments
     recent_assignments = BusAssignment.objects.filter(
         date__gte=start_date,
@@ -0,0 +1,191 @@
+"""
+Schedule adherence: live delay and ETAs against the timetable.
+
+Each active journey is matched once to the route's Trip departing closest
+to its start, and the trip's TripStopTime rows (or, without any, the stops'
+own scheduled times) become its plan, cached per journey. On every ETA
+recompute of a bus (buses.eta_queue) the latest StopVisit of the journey
+says how far along the plan the bus is and how late it was there; a bus
+that is already past the scheduled time of its next stop is at least that
+late. Every downstream stop is then expected at its scheduled time plus the
+current delay, which costs O(remaining stops) per bus.
+
+The delay also drives the automatic delay alerts (notifications.delays).
+LiveETA rows are written in one batched upsert, and only the ones whose
+estimate, delay or distance changed since the last recompute in this
+process; rows for stops the bus has passed are deleted.
+"""
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.cache import TTLCache
+from core.spatial import haversine_km
+from core.upsert import bulk_upsert
+
+PlannedStop = namedtuple('PlannedStop', ['stop_id', 'latitude', 'longitude', 'arrival', 'departure'])
+Plan = namedtuple('Plan', ['trip_id', 'stops', 'index'])
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def match_trip(route_id, at):
+    """The route's active Trip departing closest to ``at`` (a time), or None."""
+    from .models import Trip
+
+    trips = Trip.objects.filter(route_id=route_id, is_active=True).only('id', 'departure_time', 'arrival_time')
+    return min(trips, key=lambda trip: abs(_minutes(trip.departure_time) - _minutes(at)), default=None)
+
+
+def _timetable(route_id, trip):
+    """(stop_id, latitude, longitude, arrival, departure) times in stop order."""
+    from .models import Stop, TripStopTime
+
+    if trip is not None:
+        rows = list(
+            TripStopTime.objects.filter(trip=trip).order_by('order', 'arrival_time').values_list(
+                'stop_id', 'stop__latitude', 'stop__longitude', 'arrival_time', 'departure_time'
+            )
+        )
+        if rows:
+            return rows
+    return [
+        (pk, lat, lng, scheduled, scheduled)
+        for pk, lat, lng, scheduled in Stop.objects.filter(
+            route_id=route_id, scheduled_time__isnull=False
+        ).order_by('order').values_list('id', 'latitude', 'longitude', 'scheduled_time')
+    ]
+
+
+def build_plan(route_id, journey_start):
+    """The journey's timetable as aware datetimes, rolling over midnight."""
+    local_start = timezone.localtime(journey_start)
+    trip = match_trip(route_id, local_start.time())
+    stops = []
+    day = local_start.date()
+    previous = None
+    for stop_id, lat, lng, arrival, departure in _timetable(route_id, trip):
+        if previous is not None and arrival < previous:
+            day += timedelta(days=1)
+        previous = arrival
+        arrive_at = timezone.make_aware(datetime.combine(day, arrival))
+        depart_at = arrive_at
+        if departure is not None:
+            depart_at = timezone.make_aware(datetime.combine(day, departure))
+            if depart_at < arrive_at:
+                depart_at += timedelta(days=1)
+        stops.append(PlannedStop(stop_id, float(lat), float(lng), arrive_at, depart_at))
+    return Plan(trip.pk if trip else None, tuple(stops), {stop.stop_id: i for i, stop in enumerate(stops)})
+
+
+class AdherenceEngine:
+    def __init__(self, ttl=300):
+        self._plans = TTLCache(max_entries=1024, ttl=ttl)
+        # journey id -> {stop_id: (scheduled, estimated, delay_minutes, distance_km)} last written
+        self._written = TTLCache(max_entries=1024, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def plan(self, journey_id, route_id, journey_start):
+        plan = self._plans.get(journey_id)
+        if plan is None:
+            plan = build_plan(route_id, journey_start)
+            self._plans.set(journey_id, plan)
+        return plan
+
+    def forget(self, journey_id):
+        self._plans.delete(journey_id)
+        self._written.delete(journey_id)
+
+    @staticmethod
+    def progress(plan, visit, now):
+        """(index of the first downstream stop, current delay as a timedelta)."""
+        if visit is None:
+            first, delay = 0, timedelta(0)
+        else:
+            stop_id, arrived_at, departed_at = visit
+            current = plan.index[stop_id]
+            planned = plan.stops[current]
+            first = current + 1
+            if departed_at is not None:
+                delay = departed_at - planned.departure
+            else:
+                # Still at the stop: late as soon as it overstays its departure time
+                delay = max(arrived_at - planned.arrival, now - planned.departure)
+
+        if first < len(plan.stops):
+            overdue = now - plan.stops[first].arrival
+            delay = max(delay, overdue)
+        return first, delay
+
+    def estimates(self, plan, first, delay, position=None):
+        """LiveETA field values for every downstream stop."""
+        rows = {}
+        for planned in plan.stops[first:]:
+            estimated = timezone.localtime(planned.arrival + delay)
+            distance = None
+            if position is not None:
+                distance = round(haversine_km(position[0], position[1], planned.latitude, planned.longitude), 2)
+            rows[planned.stop_id] = (
+                timezone.localtime(planned.arrival).time().replace(microsecond=0),
+                estimated.time().replace(microsecond=0),
+                round(delay.total_seconds() / 60),
+                distance,
+            )
+        return rows
+
+    def update_bus(self, bus_id, location=None, now=None):
+        """Recompute the LiveETAs of ``bus_id``'s active journey; returns how many rows were written."""
+        from buses.models import Journey
+        from notifications.delays import delay_notifier
+        from reports.models import StopVisit
+        from .models import LiveETA
+
+        journey = Journey.objects.filter(bus_id=bus_id, status='active').values(
+            'id', 'route_id', 'start_time'
+        ).first()
+        if journey is None:
+            return 0
+        plan = self.plan(journey['id'], journey['route_id'], journey['start_time'])
+        if not plan.stops:
+            return 0
+
+        visit = StopVisit.objects.filter(
+            trip_log__journey_id=journey['id'], stop_id__in=list(plan.index)
+        ).order_by('-arrived_at').values_list('stop_id', 'arrived_at', 'departed_at').first()
+
+        now = now or timezone.now()
+        first, delay = self.progress(plan, visit, now)
+        if first < len(plan.stops):
+            delay_notifier.observe(bus_id, journey['route_id'], journey['id'], round(delay.total_seconds() / 60))
+        position = (float(location.latitude), float(location.longitude)) if location is not None else None
+        rows = self.estimates(plan, first, delay, position)
+
+        with self._lock:
+            written = self._written.get(journey['id'])
+            changed = [stop_id for stop_id, values in rows.items() if written is None or written.get(stop_id) != values]
+            self._written.set(journey['id'], rows)
+
+        if written is None or set(written) != set(rows):
+            # New journey in this process or stops passed: drop every other row of the bus
+            LiveETA.objects.filter(bus_id=bus_id).exclude(stop_id__in=list(rows)).delete()
+        bulk_upsert(LiveETA, [
+            LiveETA(
+                bus_id=bus_id,
+                stop_id=stop_id,
+                trip_id=plan.trip_id,
+                scheduled_time=rows[stop_id][0],
+                estimated_time=rows[stop_id][1],
+                delay_minutes=rows[stop_id][2],
+                distance_km=rows[stop_id][3],
+            )
+            for stop_id in changed
+        ], ['bus', 'stop'])
+        return len(changed)
+
+
+adherence = AdherenceEngine(ttl=getattr(settings, 'STOP_INDEX_TTL', 300))
@@ -6,24 +6,55 @@ from django.utils import timezone
 from .models import Route, Stop, Schedule
 from .serializers import RouteSerializer, StopSerializer, ScheduleSerializer
 from buses.models import ETACalculation
+from core.fieldsets import requested_fields, wants_compact, serialized_list, sparse_only
+from core.mappers import RowMapper
+from core.spatial import parse_nearby_params
+from .stop_index import stop_index
+
+
+def _hhmm(value):
+    return value.strftime('%H:%M')
+
+
+# Row mapper columns filled from the latest ETACalculation of the stop
+LATEST_ETA_COLUMNS = {
+    'latest_eta': 'calculated_eta',
+    'latest_is_delayed': 'is_delayed',
+    'latest_delay_minutes': 'delay_minutes',
+}
+
+STOP_ETA_ROW = RowMapper(
+    ('id', 'id'),
+    ('name', 'name'),
+    ('order', 'order'),
+    ('scheduled_time', 'scheduled_time', _hhmm),
+    ('is_major_stop', 'is_major_stop'),
+    ('eta', 'latest_eta', _hhmm),
+    ('eta_minutes', (), lambda: None),
+    ('is_delayed', ('latest_is_delayed',), bool),
+    ('delay_minutes', ('latest_delay_minutes',), lambda minutes: minutes or 0),
+)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def route_list_api(request):
-    routes = Route.objects.filter(is_active=True).prefetch_related('stops')
-    serializer = RouteSerializer(routes, many=True)
-    return Response(serializer.data)
+    routes = sparse_only(
+        Route.objects.filter(is_active=True).prefetch_related('stops'), request, RouteSerializer
+    )
+    serializer = RouteSerializer(routes, many=True, context={'request': request})
+    return Response(serialized_list(request, serializer))
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def route_detail_api(request, pk):
+    routes = sparse_only(Route.objects.prefetch_related('stops'), request, RouteSerializer)
     try:
-        route = Route.objects.prefetch_related('stops').get(pk=pk)
+        route = routes.get(pk=pk)
     except Route.DoesNotExist:
         return Response({'error': 'Route not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    serializer = RouteSerializer(route)
+    serializer = RouteSerializer(route, context={'request': request})
     return Response(serializer.data)
 
 
@@ -35,41 +66,51 @@ def route_stops_api(request, pk):
     except Route.DoesNotExist:
         return Response({'error': 'Route not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    stops = route.stops.order_by('order')
-    serializer = StopSerializer(stops, many=True)
-    return Response(serializer.data)
+    stops = sparse_only(route.stops.order_by('order'), request, StopSerializer)
+    serializer = StopSerializer(stops, many=True, context={'request': request})
+    return Response(serialized_list(request, serializer))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def nearby_stops_api(request):
+    """The ``k`` closest stops of active routes within ``radius`` km of ``lat``/``lng``."""
+    try:
+        lat, lng, k, radius = parse_nearby_params(request)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response([
+        {**stop, 'distance_km': round(distance, 3)}
+        for distance, stop in stop_index.nearest(lat, lng, k, radius)
+    ])
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def route_with_eta_api(request, pk):
     try:
-        route = Route.objects.prefetch_related('stops').get(pk=pk)
+        route = Route.objects.only('id', 'name').get(pk=pk)
     except Route.DoesNotExist:
         return Response({'error': 'Route not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    stops_data = []
-    for stop in route.stops.order_by('order'):
-        eta_record = ETACalculation.objects.filter(stop=stop).order_by('-calculated_at').first()
-        
-        stop_info = {
-            'id': stop.id,
-            'name': stop.name,
-            'order': stop.order,
-            'scheduled_time': stop.scheduled_time.strftime('%H:%M') if stop.scheduled_time else None,
-            'is_major_stop': stop.is_major_stop,
-            'eta': None,
-            'eta_minutes': None,
-            'is_delayed': False,
-            'delay_minutes': 0
-        }
-        
-        if eta_record:
-            stop_info['eta'] = eta_record.calculated_eta.strftime('%H:%M')
-            stop_info['is_delayed'] = eta_record.is_delayed
-            stop_info['delay_minutes'] = eta_record.delay_minutes
-        
-        stops_data.append(stop_info)
+    mapper = STOP_ETA_ROW.select(requested_fields(request))
+    stop_columns = [column for column in mapper.columns if column not in LATEST_ETA_COLUMNS]
+    stops = list(route.stops.order_by('order').values('id', *stop_columns))
+    
+    # Latest ETA per stop, read on its own: ETAs may be in the telemetry
+    # database (core.routers), out of reach of a subquery
+    latest = {}
+    wanted = [column for column in mapper.columns if column in LATEST_ETA_COLUMNS]
+    if wanted:
+        etas = ETACalculation.objects.filter(stop_id__in=[stop['id'] for stop in stops]).order_by('calculated_at')
+        for stop_id, *values in etas.values_list('stop_id', *(LATEST_ETA_COLUMNS[column] for column in wanted)):
+            latest[stop_id] = dict(zip(wanted, values))
+    rows = [
+        tuple(stop[column] if column in stop else latest.get(stop['id'], {}).get(column) for column in mapper.columns)
+        for stop in stops
+    ]
+    stops_data = mapper.map_compact(rows) if wants_compact(request) else mapper.map_all(rows)
     
     return Response({
         'id': route.id,
@@ -102,8 +143,9 @@ def schedule_list_api(request):
     if route_id:
         schedules = schedules.filter(route_id=route_id)
     
-    serializer = ScheduleSerializer(schedules, many=True)
-    return Response(serializer.data)
+    schedules = sparse_only(schedules, request, ScheduleSerializer)
+    serializer = ScheduleSerializer(schedules, many=True, context={'request': request})
+    return Response(serialized_list(request, serializer))
 
 
 @api_view(['GET'])
@@ -126,5 +168,6 @@ def today_schedules_api(request):
         route_id__in=assigned_route_ids
     ).order_by('departure_time')
     
-    serializer = ScheduleSerializer(schedules, many=True)
-    return Response(serializer.data)
+    schedules = sparse_only(schedules, request, ScheduleSerializer)
+    serializer = ScheduleSerializer(schedules, many=True, context={'request': request})
+    return Response(serialized_list(request, serializer))
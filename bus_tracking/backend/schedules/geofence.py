@@ -0,0 +1,143 @@
+"""
+Streaming stop geofences.
+
+Every stop is a circle of ``GEOFENCE_RADIUS_METERS``. A bus leaves it only
+once it is ``GEOFENCE_EXIT_FACTOR`` times that far away, so a fix jittering
+on the boundary does not flap between arrival and departure.
+
+The engine keeps the stops of each route in order, in memory, and one small
+state per bus: the stop it is inside, if any, and the next stop it expects.
+A ping is measured against that stop and the few after it
+(``GEOFENCE_LOOKAHEAD``, so a skipped stop does not lose the trip), never
+against the whole route. Only a bus's first ping measures every stop of the
+route, to find where along it the bus is.
+
+``update()`` returns the arrival and departure events the ping caused; a
+departure carries the dwell time at the stop. State is per process and
+resets when a bus changes route or journey.
+"""
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+from core.cache import TTLCache
+from core.spatial import haversine_km
+
+RouteStop = namedtuple('RouteStop', ['id', 'name', 'order', 'latitude', 'longitude'])
+
+StopEvent = namedtuple('StopEvent', [
+    'kind', 'bus_id', 'route_id', 'trip_key', 'stop', 'at',
+    'is_first', 'is_last', 'dwell_seconds',
+])
+
+ARRIVAL = 'arrival'
+DEPARTURE = 'departure'
+
+
+class BusFenceState:
+    __slots__ = ('route_id', 'trip_key', 'inside', 'entered_at', 'next_index')
+
+    def __init__(self, route_id, trip_key):
+        self.route_id = route_id
+        self.trip_key = trip_key
+        # Index into the route's stops of the stop the bus is in, if any
+        self.inside = None
+        self.entered_at = None
+        self.next_index = 0
+
+
+class GeofenceEngine:
+    def __init__(self, radius_m=50, exit_factor=1.5, lookahead=3):
+        self.radius_m = radius_m
+        self.exit_m = radius_m * exit_factor
+        self.lookahead = lookahead
+        self._routes = TTLCache(max_entries=256, ttl=getattr(settings, 'STOP_INDEX_TTL', 300))
+        self._buses = {}
+        self._lock = threading.Lock()
+
+    def route_stops(self, route_id):
+        stops = self._routes.get(route_id)
+        if stops is None:
+            from .models import Stop
+
+            stops = tuple(
+                RouteStop(pk, name, order, float(lat), float(lng))
+                for pk, name, order, lat, lng in Stop.objects.filter(route_id=route_id).order_by('order').values_list(
+                    'id', 'name', 'order', 'latitude', 'longitude'
+                )
+            )
+            self._routes.set(route_id, stops)
+        return stops
+
+    def invalidate(self):
+        self._routes.clear()
+
+    def forget(self, bus_id):
+        with self._lock:
+            self._buses.pop(bus_id, None)
+
+    def update(self, bus_id, route_id, latitude, longitude, at, trip_key=None):
+        """Feed one fix taken at ``at`` (a datetime); returns the events it caused."""
+        stops = self.route_stops(route_id)
+        if not stops:
+            return []
+        latitude, longitude = float(latitude), float(longitude)
+
+        with self._lock:
+            state = self._buses.get(bus_id)
+            initial = state is None or state.route_id != route_id or state.trip_key != trip_key
+            if initial:
+                state = self._buses[bus_id] = BusFenceState(route_id, trip_key)
+                candidates = range(len(stops))
+            else:
+                candidates = range(state.next_index, min(state.next_index + self.lookahead, len(stops)))
+            events = self._advance(state, bus_id, stops, latitude, longitude, at, candidates)
+            if initial and state.inside is None:
+                # First fix away from any stop: expect the nearest one next
+                state.next_index = min(
+                    range(len(stops)),
+                    key=lambda i: haversine_km(latitude, longitude, stops[i].latitude, stops[i].longitude)
+                )
+            return events
+
+    def _advance(self, state, bus_id, stops, latitude, longitude, at, candidates):
+        def distance(index):
+            stop = stops[index]
+            return haversine_km(latitude, longitude, stop.latitude, stop.longitude) * 1000
+
+        def event(kind, index, dwell=None):
+            return StopEvent(
+                kind, bus_id, state.route_id, state.trip_key, stops[index], at,
+                index == 0, index == len(stops) - 1, dwell,
+            )
+
+        events = []
+        entered = None
+        for index in candidates:
+            if index == state.inside:
+                continue
+            meters = distance(index)
+            if meters <= self.radius_m and (entered is None or meters < entered[0]):
+                entered = (meters, index)
+
+        # Leaving the current stop, or reaching another before leaving its fence
+        if state.inside is not None and (entered is not None or distance(state.inside) > self.exit_m):
+            dwell = int((at - state.entered_at).total_seconds())
+            events.append(event(DEPARTURE, state.inside, max(dwell, 0)))
+            state.next_index = max(state.next_index, state.inside + 1)
+            state.inside = state.entered_at = None
+
+        if entered is not None:
+            index = entered[1]
+            events.append(event(ARRIVAL, index))
+            state.inside, state.entered_at = index, at
+            state.next_index = index + 1
+        return events
+
+
+geofence = GeofenceEngine(
+    radius_m=getattr(settings, 'GEOFENCE_RADIUS_METERS', 50),
+    exit_factor=getattr(settings, 'GEOFENCE_EXIT_FACTOR', 1.5),
+    lookahead=getattr(settings, 'GEOFENCE_LOOKAHEAD', 3),
+)
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from buses.models import Journey
+from core.jobs import periodic
+from .models import LiveETA
+
+
+@periodic(seconds=300)
+def cleanup_live_etas():
+    """Delete LiveETAs of buses without an active journey or not recomputed within ETA_RETENTION seconds."""
+    threshold = timezone.now() - timedelta(seconds=getattr(settings, 'ETA_RETENTION', 3600))
+    LiveETA.objects.filter(updated_at__lt=threshold).delete()
+    active = Journey.objects.filter(bus=OuterRef('bus'), status='active')
+    LiveETA.objects.filter(~Exists(active)).delete()
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:03
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def delete_duplicate_live_etas(apps, schema_editor):
+    """Keep only the latest LiveETA per (bus, stop) before making the pair unique."""
+    LiveETA = apps.get_model("schedules", "LiveETA")
+    latest = (
+        LiveETA.objects.values("bus", "stop")
+        .annotate(keep=Max("id"))
+        .values_list("keep", flat=True)
+    )
+    LiveETA.objects.exclude(id__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buses", "0008_busassignment_unique_active_assignment_per_bus_and_more"),
+        ("schedules", "0005_schedule_bus_schedule_driver_alter_route_color"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_live_etas, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="liveeta",
+            unique_together={("bus", "stop")},
+        ),
+    ]
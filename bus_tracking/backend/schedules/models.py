@@ -186,6 +186,7 @@ class LiveETA(models.Model):
     class Meta:
         db_table = 'live_etas'
         ordering = ['-updated_at']
+        unique_together = ['bus', 'stop']
 
     @property
     def is_delayed(self):
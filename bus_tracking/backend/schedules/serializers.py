@@ -1,14 +1,15 @@
 from rest_framework import serializers
+from core.fieldsets import SparseFieldsMixin
 from .models import Route, Stop, Schedule, StopSchedule
 
-class StopSerializer(serializers.ModelSerializer):
+class StopSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Stop
         fields = ['id', 'name', 'latitude', 'longitude', 'order', 'scheduled_time', 
                   'average_wait_time', 'is_major_stop']
 
 
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     stops = StopSerializer(many=True, read_only=True)
     stops_count = serializers.SerializerMethodField()
 
@@ -21,7 +22,7 @@ class RouteSerializer(serializers.ModelSerializer):
         return obj.stops.count()
 
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     route_name = serializers.CharField(source='route.name', read_only=True)
     day_display = serializers.CharField(source='get_day_of_week_display', read_only=True)
 
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .geofence import geofence
+from .models import Route, Stop
+from .stop_index import stop_index
+
+
+@receiver(post_save, sender=Stop)
+@receiver(post_delete, sender=Stop)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_stop_index(sender, instance, **kwargs):
+    stop_index.invalidate()
+    geofence.invalidate()
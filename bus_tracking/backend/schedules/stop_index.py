@@ -0,0 +1,60 @@
+"""
+Spatial index of stops for the nearby-stops endpoint.
+
+Built lazily from the stops of active routes and dropped whenever a stop or
+route is saved or deleted in this process; ``STOP_INDEX_TTL`` bounds how long
+another process can serve a stale index.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from core.spatial import GridIndex
+
+
+class StopIndex:
+    def __init__(self):
+        self._grid = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._grid = None
+
+    def grid(self):
+        ttl = getattr(settings, 'STOP_INDEX_TTL', 300)
+        grid = self._grid
+        if grid is not None and time.monotonic() - self._built_at < ttl:
+            return grid
+        with self._lock:
+            if self._grid is None or time.monotonic() - self._built_at >= ttl:
+                self._grid, self._built_at = self._build(), time.monotonic()
+            return self._grid
+
+    def _build(self):
+        from .models import Stop
+
+        grid = GridIndex()
+        stops = Stop.objects.filter(route__is_active=True).values_list(
+            'id', 'name', 'route_id', 'route__name', 'latitude', 'longitude',
+            'scheduled_time', 'is_major_stop',
+        )
+        for pk, name, route_id, route_name, lat, lng, scheduled_time, is_major_stop in stops:
+            grid.put(pk, lat, lng, {
+                'id': pk,
+                'name': name,
+                'route_id': route_id,
+                'route_name': route_name,
+                'latitude': float(lat),
+                'longitude': float(lng),
+                'scheduled_time': scheduled_time.strftime('%H:%M') if scheduled_time else None,
+                'is_major_stop': is_major_stop,
+            })
+        return grid
+
+    def nearest(self, lat, lng, k=5, radius_km=2.0):
+        return self.grid().nearest(lat, lng, k, radius_km)
+
+
+stop_index = StopIndex()
@@ -285,7 +285,11 @@ class DriverLocationReporter {
             body: JSON.stringify(data)
         })
         .then(response => response.json())
-        .then(result => console.log('Location updated:', result))
+        .then(result => {
+            console.log('Location updated:', result);
+            // Ping as often as the server recommends
+            this.updateThreshold = result.next_interval ? result.next_interval * 1000 : GPS_UPDATE_INTERVAL;
+        })
         .catch(error => console.error('Error updating location:', error));
     }
 